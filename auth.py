@@ -1,7 +1,10 @@
 # auth.py
+import threading
+import time
+from collections import namedtuple, OrderedDict
 from datetime import timedelta
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, g, current_app
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, get_jwt, verify_jwt_in_request
 from models import db, User
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -29,7 +32,7 @@ def login():  # TESTED : OK;
     print(f"User Department: {user.department}")
 
     if user and user.check_password(password):
-        additional_claims = {"department": user.department}
+        additional_claims = {"department": user.department, "user_id": user.id}
         access_token = create_access_token(identity=user.email,
                                            additional_claims=additional_claims,
                                            expires_delta=timedelta(days=1))
@@ -77,6 +80,102 @@ def get_user_department():
     return jsonify({"msg": "User not found"}), 404
 
 
+# The logged-in user, as resolved by get_current_user
+UserIdentity = namedtuple('UserIdentity', ['id', 'email', 'department'])
+
+
+class IdentityCache:
+    """
+    Process-wide LRU cache of the user identities by email.
+
+    Entries expire after 'ttl' seconds, and are dropped explicitly with invalidate() when the user changes.
+    """
+
+    def __init__(self, max_size=1024, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # email -> (expiry time, UserIdentity)
+        self._lock = threading.Lock()
+
+    def get(self, email):
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(email, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(email)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, identity):
+        with self._lock:
+            self._entries[identity.email] = (time.monotonic() + self.ttl, identity)
+            self._entries.move_to_end(identity.email)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *emails):
+        with self._lock:
+            for email in emails:
+                self._entries.pop(email, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+identity_cache = IdentityCache()
+
+
+def get_current_user():
+    """
+    Get the identity of the logged-in user, without a database round trip in most cases.
+
+    The identity is resolved once per request, from the first of:
+    - the 'user_id' and 'department' claims of the token (issued by login),
+    - the process-wide identity cache (tokens issued before the 'user_id' claim),
+    - the users table, which fills the cache.
+
+    Configuration (app.config):
+        IDENTITY_CACHE_TTL (int): Lifetime of the cached identities, in seconds. Defaults to 300.
+        IDENTITY_CACHE_SIZE (int): Maximum number of cached identities. Defaults to 1024.
+
+    Returns:
+        UserIdentity: The user's id, email and department, or None if the user does not exist.
+    """
+    if 'current_user_identity' in g:
+        return g.current_user_identity
+
+    email = get_jwt_identity()
+    claims = get_jwt()
+    if claims.get('user_id') is not None:
+        identity = UserIdentity(claims['user_id'], email, claims.get('department'))
+    else:
+        identity_cache.ttl = current_app.config.get('IDENTITY_CACHE_TTL', identity_cache.ttl)
+        identity_cache.max_size = current_app.config.get('IDENTITY_CACHE_SIZE', identity_cache.max_size)
+        identity = identity_cache.get(email)
+        if identity is None:
+            user = User.query.filter_by(email=email).first()
+            identity = UserIdentity(user.id, user.email, user.department) if user else None
+            if identity:
+                identity_cache.put(identity)
+
+    g.current_user_identity = identity
+    return identity
+
+
+def invalidate_user_identity(*emails):
+    """Drop cached identities after a change of the users' email, department or password."""
+    identity_cache.invalidate(*emails)
+    g.pop('current_user_identity', None)
+
+
 # Decorator to check if user has the required role
 def requires_roles(*roles):  # @requires_roles('Admin', 'Manager', 'OtherRole')
     def decorator(fn):
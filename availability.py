@@ -0,0 +1,200 @@
+# availability.py
+"""
+Room availability engine.
+
+A reservation occupies its room from its start date (arrival) to its end date (departure) excluded, so a room
+can be booked again from the departure day of its previous guest. Two reservations of a room overlap when each
+starts before the other ends.
+
+On Postgres, the stays are indexed as date ranges: an exclusion constraint over (room_id, daterange(start_date,
+end_date)) rejects overlapping reservations, and its GiST index answers "which rooms are free from A to B" for
+the whole hotel in one query. On SQLite, triggers reject the overlapping reservations instead, and the free rooms
+are computed in memory from the rooms and the stays overlapping the window, loaded in one query
+(ReservationIntervals).
+
+Either way the overlap check runs in the database, within the INSERT or UPDATE of the reservation: writes cost
+no extra round trip, and an overlap surfaces as an IntegrityError (see is_overlap_error).
+"""
+
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date, datetime
+
+from sqlalchemy import event, exists, literal_column, func, text, DDL
+
+from models import db, Room, Reservation
+
+OVERLAP_CONSTRAINT = 'reservations_no_overlap'
+
+AVAILABILITY_DDL = {
+    'postgresql': [
+        "CREATE EXTENSION IF NOT EXISTS btree_gist",
+        "DO $$ BEGIN "
+        f"IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = '{OVERLAP_CONSTRAINT}') THEN "
+        f"ALTER TABLE reservations ADD CONSTRAINT {OVERLAP_CONSTRAINT} "
+        "EXCLUDE USING gist (room_id WITH =, daterange(start_date, end_date, '[)') WITH &&); "
+        "END IF; END $$",
+    ],
+    'sqlite': [
+        f"CREATE TRIGGER IF NOT EXISTS {OVERLAP_CONSTRAINT}_insert BEFORE INSERT ON reservations "
+        "WHEN EXISTS (SELECT 1 FROM reservations WHERE room_id = NEW.room_id "
+        "AND end_date > NEW.start_date AND start_date < NEW.end_date) "
+        f"BEGIN SELECT RAISE(ABORT, '{OVERLAP_CONSTRAINT}'); END",
+        f"CREATE TRIGGER IF NOT EXISTS {OVERLAP_CONSTRAINT}_update "
+        "BEFORE UPDATE OF room_id, start_date, end_date ON reservations "
+        "WHEN EXISTS (SELECT 1 FROM reservations WHERE room_id = NEW.room_id AND id != NEW.id "
+        "AND end_date > NEW.start_date AND start_date < NEW.end_date) "
+        f"BEGIN SELECT RAISE(ABORT, '{OVERLAP_CONSTRAINT}'); END",
+    ]
+}
+
+# New databases get the overlap checks with their tables
+for _dialect, _statements in AVAILABILITY_DDL.items():
+    for _statement in _statements:
+        event.listen(Reservation.__table__, 'after_create', DDL(_statement).execute_if(dialect=_dialect))
+
+
+def create_availability_constraints():
+    """
+    Install the overlap checks of the reservations on an existing database (the exclusion constraint on
+    Postgres, the triggers on SQLite).
+
+    The existing reservations must not overlap: the Postgres constraint can't be created otherwise (see
+    find_overlapping_reservations).
+    """
+    with db.engine.begin() as connection:
+        for statement in AVAILABILITY_DDL.get(db.engine.dialect.name, []):
+            connection.execute(text(statement))
+
+
+def find_overlapping_reservations():
+    """
+    Find the pairs of overlapping reservations of a room.
+
+    Returns:
+    list: (reservation ID, reservation ID) tuples.
+    """
+    other = db.aliased(Reservation)
+    return db.session.query(Reservation.id, other.id).join(other, db.and_(
+        other.room_id == Reservation.room_id,
+        other.id > Reservation.id,
+        other.end_date > Reservation.start_date,
+        other.start_date < Reservation.end_date
+    )).order_by(Reservation.id, other.id).all()
+
+
+def is_overlap_error(error):
+    """True if a database error was raised by the overlap check of the reservations."""
+    return OVERLAP_CONSTRAINT in str(getattr(error, 'orig', error))
+
+
+def stay_range(start_date, end_date):
+    """The Postgres date range of a stay, as indexed by the exclusion constraint."""
+    return func.daterange(start_date, end_date, literal_column("'[)'"))
+
+
+def parse_date(value):
+    """
+    Parse a date sent by the clients, either 'YYYY-MM-DD' or an ISO datetime (its date part is used).
+
+    Returns:
+    datetime.date: The date, or None if no value was given.
+
+    Raises:
+    ValueError: If the value isn't a date.
+    """
+    if value is None or isinstance(value, date) and not isinstance(value, datetime):
+        return value
+    if isinstance(value, datetime):
+        return value.date()
+    return date.fromisoformat(value[:10])
+
+
+class ReservationIntervals:
+    """
+    In-memory index of the stays of each room, sorted by start date.
+
+    Since the stays of a room don't overlap, they are also sorted by end date, and the stays overlapping a
+    window are found with a binary search.
+    """
+
+    def __init__(self, stays):
+        """
+        Parameters:
+        stays (iterable): (room ID, start date, end date) tuples.
+        """
+        self.starts = defaultdict(list)
+        self.ends = defaultdict(list)
+        for room_id, start_date, end_date in sorted(stays):
+            self.starts[room_id].append(start_date)
+            self.ends[room_id].append(end_date)
+
+    @classmethod
+    def load(cls, start_date, end_date):
+        """Load the stays overlapping a window, in one query."""
+        return cls(db.session.query(Reservation.room_id, Reservation.start_date, Reservation.end_date).filter(
+            Reservation.end_date > start_date,
+            Reservation.start_date < end_date
+        ))
+
+    def is_free(self, room_id, start_date, end_date):
+        """True if the room has no stay overlapping the window from start_date to end_date (excluded)."""
+        ends = self.ends.get(room_id)
+        if not ends:
+            return True
+        # The first stay ending after the window starts is the only candidate for an overlap
+        position = bisect_right(ends, start_date)
+        return position == len(ends) or self.starts[room_id][position] >= end_date
+
+
+def free_rooms_query(start_date, end_date, min_guests=None):
+    """
+    Query of the rooms free from start_date to end_date (excluded), on Postgres.
+
+    Parameters:
+    start_date (datetime.date): The arrival date.
+    end_date (datetime.date): The departure date.
+    min_guests (int, optional): Only the rooms for at least this many guests.
+    """
+    booked = exists().where(
+        Reservation.room_id == Room.id,
+        stay_range(Reservation.start_date, Reservation.end_date).op('&&')(stay_range(start_date, end_date))
+    )
+    query = Room.query.filter(~booked)
+    if min_guests is not None:
+        query = query.filter(Room.max_guests >= min_guests)
+    return query.order_by(Room.id)
+
+
+def free_rooms(start_date, end_date, min_guests=None):
+    """
+    The rooms free from start_date to end_date (excluded), for the whole hotel.
+
+    Parameters:
+    start_date (datetime.date): The arrival date.
+    end_date (datetime.date): The departure date.
+    min_guests (int, optional): Only the rooms for at least this many guests.
+
+    Returns:
+    list: The free rooms (Room), by ID.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        return free_rooms_query(start_date, end_date, min_guests).all()
+
+    # The rooms with the stays overlapping the window, in one query
+    rows = db.session.query(Room, Reservation.start_date, Reservation.end_date).outerjoin(Reservation, db.and_(
+        Reservation.room_id == Room.id,
+        Reservation.end_date > start_date,
+        Reservation.start_date < end_date
+    ))
+    if min_guests is not None:
+        rows = rows.filter(Room.max_guests >= min_guests)
+
+    rooms = {}
+    stays = []
+    for room, stay_start, stay_end in rows:
+        rooms[room.id] = room
+        if stay_start is not None:
+            stays.append((room.id, stay_start, stay_end))
+    intervals = ReservationIntervals(stays)
+    return [rooms[room_id] for room_id in sorted(rooms) if intervals.is_free(room_id, start_date, end_date)]
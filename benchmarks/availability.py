@@ -0,0 +1,120 @@
+# benchmarks/availability.py
+"""
+Benchmark of the room availability over 10 years of synthetic bookings.
+
+Seeds rooms booked back to back (stays of 1 to 10 nights, gaps of 0 to 5 nights) over 10 years, then answers
+"which rooms are free from A to B" for random windows with:
+- 'per room': one reservations query per room, as get_reservations_by_room_and_date_range;
+- 'engine': availability.free_rooms, one query for the whole hotel;
+and checks both agree. Then books random stays through the overlap check, and reports the time per write and the
+overlaps rejected.
+
+Usage:
+    python -m benchmarks.availability [--rooms 100] [--years 10] [--queries 200]
+"""
+
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+import availability  # noqa: F401  (installs the overlap checks with the tables)
+from benchmarks.common import create_benchmark_app, print_table
+from instrumentation import count_queries
+from models import db, Room, Guest, User, Reservation
+
+
+def seed(room_count, years, first_day):
+    rng = random.Random(room_count)
+    last_day = first_day + timedelta(days=365 * years)
+    db.session.execute(insert(User), [{'id': 6, 'name': 'Bench', 'surname': 'User', 'phone': '123456789',
+                                       'email': 'bench@example.com', 'department': 'Admin'}])
+    db.session.execute(insert(Guest), [{'id': 1, 'name': 'Guest', 'surname': 'One', 'phone': '987654321',
+                                        'email': 'guest@example.com'}])
+    db.session.execute(insert(Room), [{'id': i, 'room_name': f'Room {i}', 'max_guests': 2, 'number_of_beds': 1}
+                                      for i in range(1, room_count + 1)])
+    reservations = []
+    for room_id in range(1, room_count + 1):
+        day = first_day + timedelta(days=rng.randint(0, 5))
+        while day < last_day:
+            nights = rng.randint(1, 10)
+            reservations.append({'room_id': room_id, 'guest_id': 1, 'start_date': day,
+                                 'end_date': day + timedelta(days=nights)})
+            day += timedelta(days=nights + rng.randint(0, 5))
+    db.session.execute(insert(Reservation), reservations)
+    db.session.commit()
+    return len(reservations)
+
+
+def free_rooms_per_room(start_date, end_date):
+    """The previous way: the reservations of each room around the window, one query per room."""
+    free = []
+    for room in Room.query.order_by(Room.id):
+        reservations = Reservation.query.filter(
+            Reservation.start_date < end_date,
+            Reservation.end_date > start_date,
+            Reservation.room_id == room.id
+        ).all()
+        if not reservations:
+            free.append(room)
+    return free
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rooms', type=int, default=100)
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    app = create_benchmark_app()
+    first_day = date(2020, 1, 1)
+    rng = random.Random(0)
+    with app.app_context():
+        started = time.perf_counter()
+        reservation_count = seed(args.rooms, args.years, first_day)
+        print(f"{reservation_count} reservations seeded in {time.perf_counter() - started:.1f} s "
+              f"({db.engine.dialect.name})")
+
+        windows = []
+        for _ in range(args.queries):
+            start_date = first_day + timedelta(days=rng.randint(0, 365 * args.years - 30))
+            windows.append((start_date, start_date + timedelta(days=rng.randint(1, 14))))
+
+        rows = []
+        results = {}
+        for name, free_rooms in (('per room', free_rooms_per_room), ('engine', availability.free_rooms)):
+            db.session.expire_all()
+            with count_queries(db.engine) as stats:
+                results[name] = [[room.id for room in free_rooms(*window)] for window in windows]
+            rows.append((name, args.queries, f'{stats.queries / args.queries:.1f}',
+                         f'{stats.elapsed / args.queries * 1000:.2f}'))
+        print_table(('free rooms', 'windows', 'queries/window', 'ms/window'), rows)
+        if results['per room'] != results['engine']:
+            raise SystemExit("FAILED: the engine and the per room queries disagree")
+
+        # Random bookings through the overlap check
+        rejected = 0
+        started = time.perf_counter()
+        for start_date, end_date in windows:
+            try:
+                db.session.add(Reservation(room_id=rng.randint(1, args.rooms), guest_id=1,
+                                           start_date=start_date, end_date=end_date))
+                db.session.commit()
+            except IntegrityError as e:
+                db.session.rollback()
+                if not availability.is_overlap_error(e):
+                    raise
+                rejected += 1
+        elapsed = time.perf_counter() - started
+        print(f"{len(windows)} bookings: {rejected} overlaps rejected, {elapsed / len(windows) * 1000:.2f} ms/write")
+        if availability.find_overlapping_reservations():
+            raise SystemExit("FAILED: overlapping reservations were written")
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+# benchmarks/cleaning_scheduler.py
+"""
+Benchmark of the nightly cleaning scheduling: per-room loop vs set-based scheduler.
+
+Reports the number of database round trips and the wall time to schedule one day (or a planning horizon of
+several days) for 50, 500 and 5,000 rooms.
+
+Usage:
+    python -m benchmarks.cleaning_scheduler [--rooms 50 500 5000] [--days 1] [--skip-legacy-above 5000]
+"""
+
+import argparse
+import random
+from datetime import date, timedelta
+
+from sqlalchemy import insert
+
+import cleaning_management
+import cleaning_scheduler
+from benchmarks.common import create_benchmark_app, print_table
+from instrumentation import count_queries
+from models import db, Room, CleaningAction, CleaningSchedule, Reservation
+
+ACTIONS = [('Towels', 1), ('Linens', 3), ('Vacuum', 2), ('Bathroom', 1), ('Deep clean', 7)]
+
+
+def seed(room_count, today, history_days=14):
+    """Creates rooms, cleaning actions, reservations around today and a completed cleaning history."""
+    rng = random.Random(room_count)
+
+    db.session.execute(insert(CleaningAction), [
+        {'id': index + 1, 'action_name': name, 'frequency_days': frequency}
+        for index, (name, frequency) in enumerate(ACTIONS)
+    ])
+    db.session.execute(insert(Room), [
+        {'id': room_id, 'room_name': f'Room {room_id}', 'max_guests': 2, 'number_of_beds': 1}
+        for room_id in range(1, room_count + 1)
+    ])
+
+    reservations = []
+    history = []
+    for room_id in range(1, room_count + 1):
+        # One past stay, and a current stay for roughly 70% of the rooms
+        past_end = today - timedelta(days=rng.randint(1, 20))
+        reservations.append({'room_id': room_id, 'guest_id': 1, 'user_id': 1,
+                             'start_date': past_end - timedelta(days=rng.randint(1, 7)), 'end_date': past_end})
+        if rng.random() < 0.7:
+            start = today - timedelta(days=rng.randint(0, 5))
+            reservations.append({'room_id': room_id, 'guest_id': 1, 'user_id': 1,
+                                 'start_date': start, 'end_date': start + timedelta(days=rng.randint(0, 7))})
+
+        for days_ago in range(1, history_days + 1):
+            for action_id in range(1, len(ACTIONS) + 1):
+                if rng.random() < 0.3:
+                    history.append({'room_id': room_id, 'action_id': action_id,
+                                    'scheduled_date': today - timedelta(days=days_ago), 'status': 'completed'})
+
+    db.session.execute(insert(Reservation), reservations)
+    db.session.execute(insert(CleaningSchedule), history)
+    db.session.commit()
+
+
+def run_legacy(today, days):
+    for day in range(days):
+        for room in Room.query.all():
+            success, error = cleaning_management.schedule_room_cleaning_for(room.id, today + timedelta(days=day))
+            if error:
+                raise Exception(error['error'])
+
+
+def run_bulk(today, days):
+    cleaning_scheduler.schedule_cleaning_for_dates(today, days)
+
+
+def measure(room_count, days, run_legacy_path):
+    today = date.today()
+    results = {}
+    for name, runner in (('legacy', run_legacy), ('bulk', run_bulk)):
+        if name == 'legacy' and not run_legacy_path:
+            continue
+        app = create_benchmark_app()
+        with app.app_context():
+            seed(room_count, today)
+            with count_queries(db.engine) as stats:
+                runner(today, days)
+            tasks = CleaningSchedule.query.filter(CleaningSchedule.scheduled_date >= today).count()
+            results[name] = (stats, tasks)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rooms', type=int, nargs='+', default=[50, 500, 5000])
+    parser.add_argument('--days', type=int, default=1, help='Number of days to plan')
+    parser.add_argument('--skip-legacy-above', type=int, default=5000,
+                        help='Do not run the per-room loop above this number of rooms')
+    args = parser.parse_args()
+
+    rows = []
+    for room_count in args.rooms:
+        results = measure(room_count, args.days, room_count <= args.skip_legacy_above)
+        for name, (stats, tasks) in results.items():
+            rows.append((room_count, name, stats.queries, f'{stats.elapsed * 1000:.1f}', tasks))
+
+    print_table(('rooms', 'path', 'queries', 'wall ms', 'tasks'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+# benchmarks/common.py
+"""
+Shared helpers for the benchmark scripts.
+
+The benchmarks run against an in-memory SQLite database by default. Set BENCH_DATABASE_URI to run them against
+another database (e.g. a local Postgres).
+
+Run the scripts from the repository root, e.g. `python -m benchmarks.cleaning_scheduler`.
+"""
+
+import os
+
+from flask import Flask
+
+from models import db
+
+import logs  # noqa: F401  (registers the UserActionLog model)
+
+
+def create_benchmark_app():
+    """
+    Creates a Flask app bound to the benchmark database, with all tables created.
+
+    Returns:
+    Flask: The application. Push an app context before using it.
+    """
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('BENCH_DATABASE_URI', 'sqlite://')
+    app.config['JWT_SECRET_KEY'] = 'benchmark-jwt-secret-key-0123456789'
+    db.init_app(app)
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+    return app
+
+
+def print_table(headers, rows):
+    """Prints rows as a fixed-width table."""
+    widths = [max(len(str(value)) for value in column) for column in zip(headers, *rows)]
+    for line in [headers] + list(rows):
+        print('  '.join(str(value).rjust(width) for value, width in zip(line, widths)))
@@ -0,0 +1,82 @@
+# benchmarks/identity.py
+"""
+Benchmark of the resolution of the logged-in user: database lookup per request vs cached / token identity.
+
+Sends the same mutating requests (payments on a reservation) with:
+- 'lookup': a token without the 'user_id' claim and the identity cache disabled, i.e. one users query per
+  request, as every route did before;
+- 'cached': a token without the 'user_id' claim, resolved through the process-wide identity cache;
+- 'claim': a token issued by login, with the 'user_id' claim.
+
+Reports the database queries per request and the wall time.
+
+Usage:
+    python -m benchmarks.identity [--requests 500]
+"""
+
+import argparse
+from datetime import date, timedelta
+
+from flask_jwt_extended import JWTManager, create_access_token
+from sqlalchemy import insert
+
+import auth
+from benchmarks.common import create_benchmark_app, print_table
+from instrumentation import count_queries
+from menu_management import menu_management_blueprint
+from models import db, User, Room, Guest, Reservation
+
+
+def seed():
+    db.session.execute(insert(User), [{'id': 1, 'name': 'Bench', 'surname': 'User', 'phone': '123456789',
+                                       'email': 'bench@example.com', 'department': 'Reception'}])
+    db.session.execute(insert(Room), [{'id': 1, 'room_name': 'Room 1', 'max_guests': 2, 'number_of_beds': 1}])
+    db.session.execute(insert(Guest), [{'id': 1, 'name': 'Guest', 'surname': 'One', 'phone': '987654321',
+                                        'email': 'guest@example.com'}])
+    db.session.execute(insert(Reservation), [{'id': 1, 'room_id': 1, 'guest_id': 1, 'start_date': date.today(),
+                                              'end_date': date.today() + timedelta(days=3)}])
+    db.session.commit()
+
+
+def run(app, headers, request_count):
+    client = app.test_client()
+    with app.app_context():
+        engine = db.engine
+
+    # Outside of an app context: each request gets its own, as in production
+    with count_queries(engine) as stats:
+        for _ in range(request_count):
+            response = client.post('/menu/add_payment', headers=headers,
+                                   json={'reservation_id': 1, 'payment_amount': 10, 'payment_method': 'CASH'})
+            assert response.status_code == 201, response.get_json()
+    return stats.queries / request_count, stats.elapsed / request_count * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    app = create_benchmark_app()
+    JWTManager(app)
+    app.register_blueprint(menu_management_blueprint, url_prefix='/menu')
+
+    with app.app_context():
+        seed()
+        legacy_token = create_access_token(identity='bench@example.com',
+                                           additional_claims={'department': 'Reception'})
+        login_token = create_access_token(identity='bench@example.com',
+                                          additional_claims={'department': 'Reception', 'user_id': 1})
+
+    rows = []
+    for name, token, ttl in (('lookup', legacy_token, 0), ('cached', legacy_token, 300), ('claim', login_token, 300)):
+        app.config['IDENTITY_CACHE_TTL'] = ttl
+        auth.identity_cache.clear()
+        queries, wall_ms = run(app, {'Authorization': f'Bearer {token}'}, args.requests)
+        rows.append((name, args.requests, f'{queries:.2f}', f'{wall_ms:.2f}'))
+
+    print_table(('identity', 'requests', 'queries/request', 'ms/request'), rows)
+
+
+if __name__ == '__main__':
+    main()
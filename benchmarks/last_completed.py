@@ -0,0 +1,132 @@
+# benchmarks/last_completed.py
+"""
+Equivalence check and benchmark of the last-completion lookup of the cleaning tasks.
+
+Seeds a cleaning history with completed, pending and missing days, then answers random (room, action, date range)
+questions with:
+- 'per day': the previous was_task_performed, one query per day of the range;
+- 'last completed': cleaning_management.was_task_performed, one MAX() query;
+and checks both give the same answer for every question. Also checks cleaning_scheduler.get_last_completed_dates
+against get_last_completed_date for every (room, action) pair.
+
+Exits with a non-zero status on any mismatch.
+
+Usage:
+    python -m benchmarks.last_completed [--rooms 50] [--questions 2000]
+"""
+
+import argparse
+import random
+import sys
+from datetime import date, timedelta
+
+from sqlalchemy import insert
+
+import cleaning_management
+import cleaning_scheduler
+from benchmarks.common import create_benchmark_app, print_table
+from instrumentation import count_queries
+from models import db, Room, CleaningAction, CleaningSchedule
+
+ACTIONS = [('Towels', 1), ('Linens', 3), ('Vacuum', 2), ('Bathroom', 1), ('Deep clean', 7)]
+HISTORY_DAYS = 60
+
+
+def seed(room_count, today):
+    """Creates rooms, cleaning actions and a history where each task is completed, pending or absent."""
+    rng = random.Random(room_count)
+
+    db.session.execute(insert(CleaningAction), [
+        {'id': index + 1, 'action_name': name, 'frequency_days': frequency}
+        for index, (name, frequency) in enumerate(ACTIONS)
+    ])
+    db.session.execute(insert(Room), [
+        {'id': room_id, 'room_name': f'Room {room_id}', 'max_guests': 2, 'number_of_beds': 1}
+        for room_id in range(1, room_count + 1)
+    ])
+
+    history = []
+    for room_id in range(1, room_count + 1):
+        for days_ago in range(-5, HISTORY_DAYS):
+            for action_id in range(1, len(ACTIONS) + 1):
+                draw = rng.random()
+                if draw < 0.25:
+                    status = 'completed'
+                elif draw < 0.4:
+                    status = 'pending'
+                else:
+                    continue
+                history.append({'room_id': room_id, 'action_id': action_id,
+                                'scheduled_date': today - timedelta(days=days_ago), 'status': status})
+    db.session.execute(insert(CleaningSchedule), history)
+    db.session.commit()
+
+
+def was_task_performed_per_day(room_id, action_id, check_from_date, check_until_date):
+    """The previous was_task_performed: one query per day of the range."""
+    current_date = check_from_date
+    while current_date < check_until_date:
+        task_completed = CleaningSchedule.query.filter_by(
+            room_id=room_id,
+            action_id=action_id,
+            scheduled_date=current_date,
+            status='completed'
+        ).first()
+        if task_completed:
+            return True
+        current_date += timedelta(days=1)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rooms', type=int, default=50)
+    parser.add_argument('--questions', type=int, default=2000)
+    args = parser.parse_args()
+
+    today = date.today()
+    rng = random.Random(0)
+    app = create_benchmark_app()
+    mismatches = []
+
+    with app.app_context():
+        seed(args.rooms, today)
+
+        # Ranges of 0 to 20 days, some of them empty or reaching past the history
+        questions = []
+        for _ in range(args.questions):
+            check_from = today - timedelta(days=rng.randint(-5, HISTORY_DAYS + 5))
+            questions.append((rng.randint(1, args.rooms), rng.randint(1, len(ACTIONS)), check_from,
+                              check_from + timedelta(days=rng.randint(0, 20))))
+
+        answers = {}
+        rows = []
+        for name, function in (('per day', was_task_performed_per_day),
+                               ('last completed', cleaning_management.was_task_performed)):
+            with count_queries(db.engine) as stats:
+                answers[name] = [function(*question) for question in questions]
+            rows.append((name, stats.queries, f'{stats.elapsed * 1000:.1f}', sum(answers[name])))
+
+        for question, old, new in zip(questions, answers['per day'], answers['last completed']):
+            if old != new:
+                mismatches.append(f"was_task_performed{question}: per day {old}, last completed {new}")
+
+        # The preloaded map agrees with the single pair lookups
+        for before_date in (today - timedelta(days=HISTORY_DAYS // 2), today, today + timedelta(days=10)):
+            last_dates = cleaning_scheduler.get_last_completed_dates(before_date)
+            for room_id in range(1, args.rooms + 1):
+                for action_id in range(1, len(ACTIONS) + 1):
+                    single = cleaning_scheduler.get_last_completed_date(room_id, action_id, before_date)
+                    if last_dates.get((room_id, action_id)) != single:
+                        mismatches.append(f"get_last_completed_dates({before_date})[{room_id}, {action_id}]: "
+                                          f"{last_dates.get((room_id, action_id))}, single lookup {single}")
+
+    print_table(('path', 'queries', 'wall ms', 'performed'), rows)
+    if mismatches:
+        print(f"{len(mismatches)} MISMATCHES:\n  " + "\n  ".join(mismatches[:20]))
+        sys.exit(1)
+    print(f"OK: the {args.questions} answers match")
+
+
+if __name__ == '__main__':
+    main()
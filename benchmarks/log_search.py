@@ -0,0 +1,110 @@
+# benchmarks/log_search.py
+"""
+Benchmark of the log details search: LIKE '%...%' scan vs indexed search.
+
+Seeds synthetic audit log rows (1,000,000 by default), builds the search index (FTS5 trigram table on SQLite,
+pg_trgm GIN index on Postgres), then times a few typical front desk searches through both paths. Also checks
+that the indexed search keeps the same rows as logs.details_matches, the test of the archived entries (the
+guest names are written in mixed case, some of them after punctuation).
+
+Exits with a non-zero status on any mismatch.
+
+Usage:
+    python -m benchmarks.log_search [--rows 1000000] [--repeat 5]
+"""
+
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+import logs
+from benchmarks.common import create_benchmark_app, print_table
+from models import db
+
+SURNAMES = ['Papadopoulos', 'Nikolaidis', 'Smith', 'Johnson', 'Muller', 'Rossi', 'Dubois', 'Garcia', 'Ivanov',
+            'Kowalski', 'Jensen', 'Novak', 'Silva', 'Andersen', 'Horvat', 'Costa', 'Meyer', 'Fischer']
+NAMES = ['Maria', 'Eleni', 'John', 'Anna', 'Peter', 'Sofia', 'Nikos', 'Laura', 'Marco', 'Ivan', 'Lena', 'Paul']
+ITEMS = ['Beer', 'Wine', 'Coffee', 'Club sandwich', 'Greek salad', 'Water', 'Ouzo', 'Moussaka']
+
+
+def seed(row_count, batch_size=50000):
+    rng = random.Random(row_count)
+    started = datetime(2024, 1, 1)
+    rows = []
+    for index in range(row_count):
+        guest = f'{rng.choice(NAMES)} {rng.choice(SURNAMES)}{rng.randint(1, 500)}'
+        if index % 7 == 0:
+            guest = f'({guest.upper()})'
+        elif index % 11 == 0:
+            guest = f'{guest.lower()}/{rng.choice(SURNAMES)}'
+        if index % 3 == 0:
+            details = f'Reservation Id: {index} | Room: {rng.randint(1, 200)} | Guest: {guest} | Status: Pending'
+        else:
+            details = f'Entry: {index} | Room: {rng.randint(100, 300)} | Guest: {guest} | ' \
+                      f'Item: {rng.choice(ITEMS)} | Total: {rng.randint(2, 80)}.00'
+        rows.append({'user_id': rng.randint(0, 10), 'action': 'Add Order', 'details': details,
+                     'timestamp': started + timedelta(seconds=index * 30)})
+        if len(rows) == batch_size:
+            db.session.execute(insert(logs.UserActionLog.__table__), rows)
+            rows = []
+    if rows:
+        db.session.execute(insert(logs.UserActionLog.__table__), rows)
+    db.session.commit()
+
+
+def timed(query, repeat):
+    durations = []
+    count = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        count = query.count()
+        durations.append(time.perf_counter() - started)
+    return count, min(durations) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_benchmark_app()
+    with app.app_context():
+        started = time.perf_counter()
+        seed(args.rows)
+        print(f'seeded {args.rows} rows in {time.perf_counter() - started:.1f} s')
+
+        started = time.perf_counter()
+        logs.create_log_search_index()
+        print(f'built the search index in {time.perf_counter() - started:.1f} s')
+
+        all_details = db.session.query(logs.UserActionLog.id, logs.UserActionLog.details).all()
+        results = []
+        mismatches = []
+        for text, match in (('Kowalski42', 'substring'), ('Ouzo', 'substring'), ('kowal', 'prefix'),
+                            ('eleni SILVA', 'substring'), ('SILVA eleni', 'prefix'), ('ski4', 'prefix')):
+            scan = logs.UserActionLog.query.filter(logs.UserActionLog.details.like(f'%{text}%'))
+            indexed = logs.filter_logs_by_details(logs.UserActionLog.query, text, match)
+            scan_count, scan_ms = timed(scan, args.repeat)
+            indexed_count, indexed_ms = timed(indexed, args.repeat)
+            results.append((text, match, scan_count, f'{scan_ms:.1f}', indexed_count, f'{indexed_ms:.1f}'))
+
+            indexed_ids = {log_id for log_id, in indexed.with_entities(logs.UserActionLog.id)}
+            expected_ids = {log_id for log_id, details in all_details if logs.details_matches(details, text, match)}
+            if indexed_ids != expected_ids:
+                mismatches.append(f"{text!r} ({match}): {len(indexed_ids - expected_ids)} extra, "
+                                  f"{len(expected_ids - indexed_ids)} missing rows")
+
+        print_table(('search', 'match', 'LIKE rows', 'LIKE ms', 'indexed rows', 'indexed ms'), results)
+        if mismatches:
+            print("MISMATCH with details_matches:\n  " + "\n  ".join(mismatches))
+            sys.exit(1)
+        print("The indexed searches match details_matches")
+
+
+if __name__ == '__main__':
+    main()
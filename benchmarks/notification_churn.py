@@ -0,0 +1,111 @@
+# benchmarks/notification_churn.py
+"""
+Benchmark of the row churn of the arrival and departure notification jobs.
+
+Seeds reservations arriving and departing within 24 hours (half of the departures unpaid), then runs both jobs
+several times on a simulated clock, as scheduled: every half hour, with the sweeper of the expired notifications
+(delete_expired_notifications) run every minute in between. Reports the rows inserted, updated or swept per run in
+each table, and the statements sent by the jobs.
+
+For comparison, the previous jobs inserted one notification row per department and one audit log entry per
+notification on every run: the 'previous' column counts these rows for the same notifications.
+
+Usage:
+    python -m benchmarks.notification_churn [--reservations 200] [--runs 4]
+"""
+
+import argparse
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import insert
+
+import scheduled_jobs
+from benchmarks.common import create_benchmark_app, print_table
+from instrumentation import count_queries
+from logs import UserActionLog
+from models import db, Room, Guest, Reservation, ReservationFolio, AppNotification, NotificationTarget
+from notifications_management import delete_expired_notifications
+
+TABLES = (AppNotification, NotificationTarget, UserActionLog)
+CHECK_INTERVAL = 30  # Minutes between the runs of the jobs
+
+
+class SimulatedClock(datetime):
+    """The datetime of the jobs, whose now() is set by the benchmark."""
+    current = None
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls.current
+
+
+def seed(reservation_count):
+    tomorrow = date.today() + timedelta(days=1)
+    db.session.execute(insert(Room), [{'id': i, 'room_name': f'Room {i}', 'max_guests': 2, 'number_of_beds': 1}
+                                      for i in range(1, reservation_count + 1)])
+    db.session.execute(insert(Guest), [{'id': i, 'name': 'Guest', 'surname': str(i), 'phone': '123456789',
+                                        'email': f'guest{i}@example.com'} for i in range(1, reservation_count + 1)])
+    db.session.execute(insert(Reservation), [
+        {'id': i, 'room_id': i, 'guest_id': i, 'status': 'Checked-in',
+         # Even reservations arrive tomorrow, odd ones depart tomorrow
+         'start_date': tomorrow if i % 2 == 0 else tomorrow - timedelta(days=3),
+         'end_date': tomorrow + timedelta(days=3) if i % 2 == 0 else tomorrow}
+        for i in range(1, reservation_count + 1)
+    ])
+    db.session.execute(insert(ReservationFolio), [
+        {'reservation_id': i, 'total_charges': 50 if i % 4 == 1 else 0, 'total_payments': 0,
+         'unpaid_amount': 50 if i % 4 == 1 else 0}
+        for i in range(1, reservation_count + 1, 2)
+    ])
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reservations', type=int, default=200)
+    parser.add_argument('--runs', type=int, default=4)
+    args = parser.parse_args()
+
+    app = create_benchmark_app()
+    scheduled_jobs.scheduler.app = app
+    with app.app_context():
+        seed(args.reservations)
+        engine = db.engine
+
+    def table_counts():
+        with app.app_context():
+            return [model.query.count() for model in TABLES]
+
+    # Starts in the morning, so that the seeded arrivals and departures of tomorrow stay within 24 hours
+    SimulatedClock.current = datetime.combine(date.today(), time(8))
+    scheduled_jobs.datetime = SimulatedClock
+
+    rows = []
+    swept = 0  # By the sweeps since the previous run
+    for run in range(1, args.runs + 1):
+        before = table_counts()
+        with count_queries(engine) as stats:
+            # Each job returns the number of notifications it created or refreshed
+            upserted = scheduled_jobs.check_arrivals_create_notifications() + \
+                scheduled_jobs.check_departures_create_notifications()
+        notifications, targets, log_entries = [after - count for after, count in zip(table_counts(), before)]
+        refreshed = upserted - notifications
+        written = notifications + targets + log_entries + refreshed
+        previous = table_counts()[1] * 2  # One notification and one log entry per department
+        rows.append((run, swept, notifications, refreshed, targets, log_entries, written, stats.queries, previous))
+
+        # The sweeps until the next run, including the one at the same minute, run first
+        swept = 0
+        with app.app_context():
+            for minute in range(1, CHECK_INTERVAL + 1):
+                swept += delete_expired_notifications(now=SimulatedClock.current + timedelta(minutes=minute))
+        SimulatedClock.current += timedelta(minutes=CHECK_INTERVAL)
+
+    print_table(('run', 'swept before', 'inserted', 'refreshed', 'targets', 'log entries', 'rows written',
+                 'statements', 'previous'), rows)
+    with app.app_context():
+        print(f"{AppNotification.query.count()} notifications, {NotificationTarget.query.count()} targets stored")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+# benchmarks/notification_reads.py
+"""
+Load test of the notification reads: whole table vs department read vs conditional (ETag) read.
+
+Seeds notifications for every department, half of them expired, then sends the same polls with:
+- 'table': the previous /get_notifications, every notification of the table;
+- 'department': /get_notifications, the unexpired notifications of the caller's department;
+- 'etag': the same, with If-None-Match of the previous answer (304 Not Modified);
+- 'page': the first page of the department read, projected on the fields a notification badge shows.
+
+Reports the status, payload size, and median and p95 latency of each.
+
+Usage:
+    python -m benchmarks.notification_reads [--notifications 5000] [--requests 300]
+"""
+
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from flask import jsonify
+from flask_jwt_extended import JWTManager, create_access_token
+from sqlalchemy import insert
+from sqlalchemy.orm import selectinload
+
+from benchmarks.common import create_benchmark_app, print_table
+from models import db, AppNotification, NotificationTarget
+from notifications_management import notifications_management_blueprint, NOTIFICATION_DEPARTMENTS
+
+LEGACY_RULE = '/legacy_get_notifications'
+
+
+def legacy_get_notifications():
+    """The previous /get_notifications."""
+    notifications = AppNotification.query.options(selectinload(AppNotification.targets)).all()
+    return jsonify([notification.to_dict() for notification in notifications]), 200
+
+
+def seed(count):
+    now = datetime.now()
+    departments = list(NOTIFICATION_DEPARTMENTS.values())
+    db.session.execute(insert(AppNotification), [
+        {'id': i, 'title': f'Notification {i}', 'message': f'Room {i % 50} needs attention before the next arrival',
+         'priority': i % 4 - 1, 'expiry_date': now + timedelta(hours=-12 if i % 2 else 12)}
+        for i in range(1, count + 1)
+    ])
+    db.session.execute(insert(NotificationTarget), [
+        {'notification_id': i, 'department': departments[i % len(departments)]} for i in range(1, count + 1)
+    ])
+    db.session.commit()
+
+
+def run(client, path, headers, request_count):
+    latencies = []
+    for _ in range(request_count):
+        started = time.perf_counter()
+        response = client.get(path, headers=headers)
+        latencies.append((time.perf_counter() - started) * 1000)
+    p95 = statistics.quantiles(latencies, n=20)[-1]
+    return response.status_code, len(response.data), statistics.median(latencies), p95
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--notifications', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=300)
+    args = parser.parse_args()
+
+    app = create_benchmark_app()
+    JWTManager(app)
+    app.register_blueprint(notifications_management_blueprint, url_prefix='/notifications')
+    app.add_url_rule(LEGACY_RULE, view_func=legacy_get_notifications)
+
+    with app.app_context():
+        seed(args.notifications)
+        token = create_access_token(identity='bench@example.com',
+                                    additional_claims={'department': 'Reception', 'user_id': 1})
+
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    etag = client.get('/notifications/get_notifications', headers=headers).headers['ETag']
+
+    rows = []
+    for name, path, extra in (('table', LEGACY_RULE, {}),
+                              ('department', '/notifications/get_notifications', {}),
+                              ('etag', '/notifications/get_notifications', {'If-None-Match': etag}),
+                              ('page', '/notifications/get_notifications?limit=20&fields=id,title,priority', {})):
+        status, size, median, p95 = run(client, path, {**headers, **extra}, args.requests)
+        rows.append((name, status, size, f'{median:.2f}', f'{p95:.2f}'))
+
+    print_table(('read', 'status', 'bytes', 'median ms', 'p95 ms'), rows)
+
+
+if __name__ == '__main__':
+    main()
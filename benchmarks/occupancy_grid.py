@@ -0,0 +1,113 @@
+# benchmarks/occupancy_grid.py
+"""
+Benchmark of the front-desk calendar: three list calls vs the occupancy grid.
+
+Seeds rooms booked back to back around today, then loads a calendar view (60 days of 200 rooms by default) with:
+- 'lists': get_reservations_by_date_range, get_rooms and get_guests_by_ids, which the calendar combined
+  client-side;
+- 'grid (cold)': /reservations/occupancy_grid with an empty cache;
+- 'grid (cached)': the same, from the cache;
+- 'grid (304)': the same, with If-None-Match of the previous answer.
+
+Reports the payload size and the median latency of each.
+
+Usage:
+    python -m benchmarks.occupancy_grid [--rooms 200] [--days 60] [--requests 50]
+"""
+
+import argparse
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from flask_jwt_extended import JWTManager, create_access_token
+from sqlalchemy import insert
+
+import occupancy_grid
+from benchmarks.common import create_benchmark_app, print_table
+from guest_management import guest_management_blueprint
+from models import db, Room, Guest, Reservation
+from reservations_management import reservations_management_blueprint
+from room_management import room_management_blueprint
+
+
+def seed(room_count, first_day, last_day):
+    rng = random.Random(room_count)
+    db.session.execute(insert(Room), [{'id': i, 'room_name': f'Room {i}', 'max_guests': 2, 'number_of_beds': 1}
+                                      for i in range(1, room_count + 1)])
+    reservations = []
+    for room_id in range(1, room_count + 1):
+        day = first_day + timedelta(days=rng.randint(0, 5))
+        while day < last_day:
+            nights = rng.randint(1, 10)
+            reservations.append({'room_id': room_id, 'guest_id': len(reservations) + 1, 'start_date': day,
+                                 'end_date': day + timedelta(days=nights), 'status': 'Pending'})
+            day += timedelta(days=nights + rng.randint(0, 3))
+    db.session.execute(insert(Guest), [{'id': i, 'name': 'Guest', 'surname': str(i), 'phone': '123456789',
+                                        'email': f'guest{i}@example.com'} for i in range(1, len(reservations) + 1)])
+    db.session.execute(insert(Reservation), reservations)
+    db.session.commit()
+
+
+def timed(request_count, load):
+    latencies = []
+    for _ in range(request_count):
+        started = time.perf_counter()
+        size = load()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return size, statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rooms', type=int, default=200)
+    parser.add_argument('--days', type=int, default=60)
+    parser.add_argument('--requests', type=int, default=50)
+    args = parser.parse_args()
+
+    app = create_benchmark_app()
+    JWTManager(app)
+    app.register_blueprint(reservations_management_blueprint, url_prefix='/reservations')
+    app.register_blueprint(room_management_blueprint, url_prefix='/rooms')
+    app.register_blueprint(guest_management_blueprint, url_prefix='/guests')
+
+    start_date = date.today()
+    end_date = start_date + timedelta(days=args.days)
+    with app.app_context():
+        seed(args.rooms, start_date - timedelta(days=30), end_date + timedelta(days=30))
+        token = create_access_token(identity='bench@example.com',
+                                    additional_claims={'department': 'Reception', 'user_id': 1})
+
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    grid_path = f'/reservations/occupancy_grid?start_date={start_date}&end_date={end_date}'
+
+    def load_lists():
+        reservations = client.get(f'/reservations/get_reservations_by_date_range?start_date={start_date}'
+                                  f'&end_date={end_date}', headers=headers)
+        rooms = client.get('/rooms/get_rooms', headers=headers)
+        guest_ids = sorted({reservation['guest_id'] for reservation in reservations.get_json()})
+        guests = client.post('/guests/get_guests_by_ids', headers=headers, json={'guest_ids': guest_ids})
+        return len(reservations.data) + len(rooms.data) + len(guests.data)
+
+    def load_grid(extra_headers=None, clear=False):
+        def load():
+            if clear:
+                occupancy_grid.grid_cache.clear()
+            return len(client.get(grid_path, headers={**headers, **(extra_headers or {})}).data)
+        return load
+
+    etag = client.get(grid_path, headers=headers).headers['ETag']
+    rows = []
+    for name, load in (('lists', load_lists), ('grid (cold)', load_grid(clear=True)),
+                       ('grid (cached)', load_grid()), ('grid (304)', load_grid({'If-None-Match': etag}))):
+        size, median = timed(args.requests, load)
+        rows.append((name, size, f'{median:.2f}'))
+
+    print(f"{args.rooms} rooms × {args.days} days")
+    print_table(('calendar', 'bytes', 'median ms'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+# benchmarks/query_plans.py
+"""
+Query plan regression suite of the hot read endpoints.
+
+Seeds the benchmark database at production scale (5 years of a 200 rooms hotel by default: reservations, status
+changes, balance entries, cleaning schedule, audit log), then calls each endpoint and checks that:
+1. every query it sends reads the large tables through an index: no 'SCAN <table>' in the SQLite
+   EXPLAIN QUERY PLAN, no 'Seq Scan' in the Postgres EXPLAIN (run against BENCH_DATABASE_URI);
+2. its median latency is within --tolerance times the one recorded in the baseline file, if given.
+
+Exits with a non-zero status if a check fails, so it can gate a build. --record writes the latencies of this
+run as the new baseline.
+
+Usage:
+    python -m benchmarks.query_plans [--scale 1.0] [--requests 20] [--baseline FILE] [--record FILE]
+"""
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from flask_jwt_extended import JWTManager, create_access_token
+from sqlalchemy import event, insert, text
+
+import availability  # noqa: F401  (installs the overlap checks with the tables)
+from benchmarks.common import create_benchmark_app, print_table
+from cleaning_management import cleaning_management_blueprint
+from logs import UserActionLog, logging_blueprint
+from menu_management import menu_management_blueprint
+from models import db, User, Room, Guest, Reservation, ReservationStatusChange, Balance, CleaningAction, \
+    CleaningSchedule, MenuCategory, MenuItem
+from notifications_management import notifications_management_blueprint
+from reservations_management import reservations_management_blueprint
+
+# Tables large enough in production that a full scan is a regression
+LARGE_TABLES = ('reservations', 'reservation_status_changes', 'balance', 'cleaning_schedule', 'user_actions_log',
+                'notifications')
+
+TODAY = date.today()
+WINDOW = (TODAY.isoformat(), (TODAY + timedelta(days=14)).isoformat())
+
+ENDPOINTS = [
+    ('reservations by date range', f'/reservations/get_reservations_by_date_range?start_date={WINDOW[0]}'
+                                   f'&end_date={WINDOW[1]}'),
+    ('reservations by room and date range', f'/reservations/get_reservations_by_room_and_date_range?room_id=7'
+                                            f'&start_date={WINDOW[0]}&end_date={WINDOW[1]}'),
+    ('guest reservations', '/reservations/get_guest_reservations/42'),
+    ('reservation status changes', '/reservations/get_reservation_status_changes/42'),
+    ('availability', f'/reservations/availability?start_date={WINDOW[0]}&end_date={WINDOW[1]}'),
+    ('occupancy grid', f'/reservations/occupancy_grid?start_date={WINDOW[0]}&days=60'),
+    ('cleaning schedule by date range', f'/cleaning_management/get_cleaning_schedule/date_range'
+                                        f'?start_date={WINDOW[0]}&end_date={WINDOW[1]}'),
+    ('room cleaning schedule by date range', f'/cleaning_management/get_room_cleaning_schedule_by_date?room_id=7'
+                                             f'&start_date={WINDOW[0]}&end_date={WINDOW[1]}'),
+    ('cleaning schedule of reservations', f'/cleaning_management/get_cleaning_schedule_for_reservations_date_range'
+                                          f'?start_date={WINDOW[0]}&end_date={WINDOW[1]}'),
+    ('balance entries of a reservation', '/menu/get_balance_entries/42'),
+    ('logs page', '/logging/get_logs?limit=50&order=desc'),
+    ('logs by date range', f'/logging/date_range/{WINDOW[0]}/{WINDOW[1]}?limit=50'),
+    ('logs of a user', '/logging/user/3?limit=50&order=desc'),
+    ('logs of a user by date range', f'/logging/user/3/date_range/{WINDOW[0]}/{WINDOW[1]}?limit=50'),
+    ('logs of an action', '/logging/action/Reservation%20Add?limit=50&order=desc'),
+    ('logs of a reservation', '/logging/reservation/42'),
+    ('notifications', '/notifications/get_notifications'),
+]
+
+
+def seed(scale):
+    """Seed 5 years of a hotel of 200 * scale rooms. Returns the row counts by table."""
+    rng = random.Random(0)
+    room_count = max(int(200 * scale), 10)
+    first_day = TODAY - timedelta(days=4 * 365)
+    last_day = TODAY + timedelta(days=365)
+
+    db.session.execute(insert(User), [{'id': i, 'name': 'User', 'surname': str(i), 'phone': f'555{i:04}',
+                                       'email': f'user{i}@example.com', 'department': 'Admin'}
+                                      for i in range(1, 21)])
+    db.session.execute(insert(Room), [{'id': i, 'room_name': f'Room {i}', 'max_guests': 2, 'number_of_beds': 1}
+                                      for i in range(1, room_count + 1)])
+    db.session.execute(insert(MenuCategory), [{'id': 1, 'name': 'Bar'}])
+    db.session.execute(insert(MenuItem), [{'id': 1, 'name': 'Coffee', 'category_id': 1, 'price': 3}])
+    db.session.execute(insert(CleaningAction), [{'id': i, 'action_name': name, 'frequency_days': frequency}
+                                                for i, (name, frequency) in
+                                                enumerate((('Towels', 1), ('Linens', 3), ('Vacuum', 2)), 1)])
+
+    reservations = []
+    for room_id in range(1, room_count + 1):
+        day = first_day + timedelta(days=rng.randint(0, 5))
+        while day < last_day:
+            nights = rng.randint(1, 10)
+            reservations.append({'id': len(reservations) + 1, 'room_id': room_id, 'guest_id': len(reservations) + 1,
+                                 'start_date': day, 'end_date': day + timedelta(days=nights),
+                                 'status': 'Checked-out' if day < TODAY else 'Pending', 'user_id': 1})
+            day += timedelta(days=nights + rng.randint(0, 3))
+    db.session.execute(insert(Guest), [{'id': r['id'], 'name': 'Guest', 'surname': str(r['id']),
+                                        'phone': f"{r['id']:09}", 'email': f"guest{r['id']}@example.com"}
+                                       for r in reservations])
+    db.session.execute(insert(Reservation), reservations)
+
+    db.session.execute(insert(ReservationStatusChange), [
+        {'reservation_id': r['id'], 'status': status, 'user_id': 1,
+         'timestamp': datetime.combine(r['start_date'], datetime.min.time())}
+        for r in reservations for status in ('Pending', 'Checked-in', 'Checked-out')
+    ])
+    db.session.execute(insert(Balance), [
+        {'reservation_id': r['id'], 'menu_item_id': 1, 'amount': 3, 'number_of_items': 1,
+         'transaction_timestamp': datetime.combine(r['start_date'], datetime.min.time()) + timedelta(hours=hour)}
+        for r in reservations for hour in range(0, 24 * (r['end_date'] - r['start_date']).days, 12)
+    ])
+
+    schedule = []
+    day = first_day
+    while day < TODAY + timedelta(days=30):
+        schedule.extend({'room_id': room_id, 'action_id': action_id, 'scheduled_date': day,
+                         'status': 'completed' if day < TODAY else 'pending'}
+                        for room_id in range(1, room_count + 1) for action_id in (1, 2, 3)
+                        if (day.toordinal() + room_id) % action_id == 0)
+        day += timedelta(days=1)
+    db.session.execute(insert(CleaningSchedule), schedule)
+
+    actions = ['Reservation Add', 'Reservation Status-Change', 'Create Balance Entry', 'Cleaning Task Completed']
+    started = datetime.combine(first_day, datetime.min.time())
+    log_count = len(reservations) * 10
+    step = (datetime.now() - started) / log_count
+    for offset in range(0, log_count, 50000):
+        db.session.execute(insert(UserActionLog), [
+            {'user_id': rng.randint(1, 20), 'action': actions[i % len(actions)], 'details': f'Entry {i}',
+             'timestamp': started + step * i, 'reservation_id': i % len(reservations) + 1}
+            for i in range(offset, min(offset + 50000, log_count))
+        ])
+    db.session.commit()
+
+    if db.engine.dialect.name in ('sqlite', 'postgresql'):
+        db.session.execute(text('ANALYZE'))
+        db.session.commit()
+    return {'reservations': len(reservations), 'balance': db.session.query(Balance).count(),
+            'cleaning_schedule': len(schedule), 'user_actions_log': log_count}
+
+
+def full_scans(connection, statement, parameters):
+    """The large tables read without an index by a statement."""
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        plan = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+        scans = set()
+        for row in plan:
+            words = row[-1].split()
+            if words[:1] == ['SCAN'] and 'USING' not in words and words[1] in LARGE_TABLES:
+                scans.add(words[1])
+        return scans
+    if dialect == 'postgresql':
+        plan = connection.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + statement, parameters).scalar()
+
+        def walk(node):
+            if node.get('Node Type') == 'Seq Scan' and node.get('Relation Name') in LARGE_TABLES:
+                yield node['Relation Name']
+            for child in node.get('Plans', []):
+                yield from walk(child)
+
+        return set(walk(plan[0]['Plan']))
+    return set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=float, default=1.0)
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--baseline', help='JSON file of the recorded median latencies to compare with')
+    parser.add_argument('--record', help='Write the median latencies of this run to this JSON file')
+    parser.add_argument('--tolerance', type=float, default=2.0,
+                        help='Maximum ratio of a median latency to its baseline (default 2.0)')
+    args = parser.parse_args()
+
+    app = create_benchmark_app()
+    JWTManager(app)
+    for blueprint, prefix in ((reservations_management_blueprint, '/reservations'),
+                              (cleaning_management_blueprint, '/cleaning_management'),
+                              (menu_management_blueprint, '/menu'), (logging_blueprint, '/logging'),
+                              (notifications_management_blueprint, '/notifications')):
+        app.register_blueprint(blueprint, url_prefix=prefix)
+
+    with app.app_context():
+        started = time.perf_counter()
+        counts = seed(args.scale)
+        print(f"Seeded {counts} in {time.perf_counter() - started:.1f} s ({db.engine.dialect.name})")
+        token = create_access_token(identity='user1@example.com', additional_claims={'department': 'Admin',
+                                                                                    'user_id': 1})
+        engine = db.engine
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    failures = []
+    rows = []
+    latencies = {}
+    for name, path in ENDPOINTS:
+        statements.clear()
+        event.listen(engine, 'before_cursor_execute', capture)
+        response = client.get(path, headers=headers)
+        event.remove(engine, 'before_cursor_execute', capture)
+        if response.status_code not in (200, 404):
+            failures.append(f"{name}: status {response.status_code}")
+
+        with engine.connect() as connection:
+            scans = set().union(*[full_scans(connection, statement, parameters)
+                                  for statement, parameters in statements])
+        if scans:
+            failures.append(f"{name}: full scan of {', '.join(sorted(scans))}")
+
+        timings = []
+        for _ in range(args.requests):
+            request_started = time.perf_counter()
+            client.get(path, headers=headers)
+            timings.append((time.perf_counter() - request_started) * 1000)
+        latencies[name] = median = statistics.median(timings)
+
+        verdict = 'ok'
+        if name in baseline and median > baseline[name] * args.tolerance:
+            verdict = f'slower (baseline {baseline[name]:.2f} ms)'
+            failures.append(f"{name}: {median:.2f} ms, baseline {baseline[name]:.2f} ms")
+        rows.append((name, len(statements), ', '.join(sorted(scans)) or '-', f'{median:.2f}',
+                     'FULL SCAN' if scans else verdict))
+
+    print_table(('endpoint', 'queries', 'full scans', 'median ms', 'check'), rows)
+
+    if args.record:
+        with open(args.record, 'w') as file:
+            json.dump(latencies, file, indent=2, sort_keys=True)
+        print(f"Latencies recorded in {args.record}")
+
+    if failures:
+        print("FAILED:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
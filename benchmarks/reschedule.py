@@ -0,0 +1,91 @@
+# benchmarks/reschedule.py
+"""
+Regression benchmark of the future task rescheduling: probe loop vs in-memory engine.
+
+Seeds a room carrying a year of daily future tasks for one cleaning action, then reschedules them after a
+completion with the previous implementation (one query per candidate date) and with the current one.
+Reports round trips and wall time, and checks both produce the same schedule.
+
+Usage:
+    python -m benchmarks.reschedule [--tasks 365] [--frequency 1]
+"""
+
+import argparse
+from datetime import date, timedelta
+
+from sqlalchemy import insert
+
+import cleaning_scheduler
+from benchmarks.common import create_benchmark_app, print_table
+from instrumentation import count_queries
+from models import db, Room, CleaningAction, CleaningSchedule
+
+
+def seed(task_count, frequency_days, today):
+    db.session.execute(insert(Room), [{'id': 1, 'room_name': 'Room 1', 'max_guests': 2, 'number_of_beds': 1}])
+    db.session.execute(insert(CleaningAction), [{'id': 1, 'action_name': 'Towels', 'frequency_days': frequency_days}])
+    db.session.execute(insert(CleaningSchedule), [
+        {'room_id': 1, 'action_id': 1, 'scheduled_date': today + timedelta(days=day), 'status': 'pending'}
+        for day in range(1, task_count + 1)
+    ])
+    db.session.commit()
+
+
+def run_legacy(completed_date, frequency_days):
+    """The previous implementation: one query per probed date, one ORM update per task."""
+    future_tasks = CleaningSchedule.query.filter(
+        CleaningSchedule.room_id == 1,
+        CleaningSchedule.action_id == 1,
+        CleaningSchedule.scheduled_date > completed_date
+    ).order_by(CleaningSchedule.scheduled_date).all()
+
+    new_scheduled_date = completed_date
+    for task in future_tasks:
+        new_date = new_scheduled_date
+        while True:
+            new_date += timedelta(days=frequency_days)
+            existing_task = CleaningSchedule.query.filter(
+                CleaningSchedule.room_id == 1,
+                CleaningSchedule.action_id == 1,
+                CleaningSchedule.scheduled_date == new_date
+            ).first()
+            if not existing_task:
+                break
+        new_scheduled_date = new_date
+        if new_scheduled_date != task.scheduled_date:
+            task.scheduled_date = new_scheduled_date
+        else:
+            db.session.delete(task)
+
+    db.session.commit()
+
+
+def run_engine(completed_date, frequency_days):
+    cleaning_scheduler.reschedule_future_tasks(1, 1, completed_date, frequency_days)
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=365)
+    parser.add_argument('--frequency', type=int, default=1)
+    args = parser.parse_args()
+
+    today = date.today()
+    rows = []
+    schedules = []
+    for name, runner in (('legacy', run_legacy), ('engine', run_engine)):
+        app = create_benchmark_app()
+        with app.app_context():
+            seed(args.tasks, args.frequency, today)
+            with count_queries(db.engine) as stats:
+                runner(today, args.frequency)
+            schedules.append(sorted(task.scheduled_date for task in CleaningSchedule.query.all()))
+            rows.append((args.tasks, name, stats.queries, f'{stats.elapsed * 1000:.1f}'))
+
+    print_table(('tasks', 'path', 'queries', 'wall ms'), rows)
+    print('same schedule:', schedules[0] == schedules[1])
+
+
+if __name__ == '__main__':
+    main()
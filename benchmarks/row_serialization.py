@@ -0,0 +1,131 @@
+# benchmarks/row_serialization.py
+"""
+Microbenchmark of the serialization of the read endpoints: ORM hydration and to_dict vs Core rows and the
+compiled serializers of serialization.py.
+
+Seeds 100k rows of each of Reservation, Balance and UserActionLog, then serializes all of them to a JSON
+response body with:
+- 'orm + json': Model.query.all(), to_dict() per instance, Flask's default (stdlib json) provider;
+- 'core + json': serialization.select_dicts (select() of the columns, compiled row serializer), the same provider;
+- 'core + orjson': the same rows, encoded by serialization.OrjsonProvider (when orjson is installed);
+and checks that the paths produce the same dicts. Reports the time to fetch and serialize the rows, to encode
+them, and the total, as the median of the runs.
+
+Usage:
+    python -m benchmarks.row_serialization [--rows 100000] [--runs 3]
+"""
+
+import argparse
+import statistics
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import insert
+
+import serialization
+from benchmarks.common import create_benchmark_app, print_table
+from logs import UserActionLog
+from models import db, Room, Guest, User, Reservation, Balance, MenuCategory, MenuItem
+
+
+def seed(count):
+    started = datetime(2020, 1, 1, 8)
+    db.session.execute(insert(User), [{'id': 6, 'name': 'Bench', 'surname': 'User', 'phone': '123456789',
+                                       'email': 'bench@example.com', 'department': 'Admin'}])
+    db.session.execute(insert(Room), [{'id': i, 'room_name': f'Room {i}', 'max_guests': 2, 'number_of_beds': 1}
+                                      for i in range(1, 201)])
+    db.session.execute(insert(Guest), [{'id': 1, 'name': 'Guest', 'surname': 'One', 'phone': '987654321',
+                                        'email': 'guest@example.com'}])
+    db.session.execute(insert(MenuCategory), [{'id': 1, 'name': 'Bar'}])
+    db.session.execute(insert(MenuItem), [{'id': 1, 'name': 'Coffee', 'category_id': 1, 'price': Decimal('3.50')}])
+
+    # Back to back stays of 3 nights in 200 rooms, every 10th without a due amount
+    db.session.execute(insert(Reservation), [
+        {'id': i, 'room_id': i % 200 + 1, 'guest_id': 1, 'user_id': 6,
+         'start_date': date(2020, 1, 1) + timedelta(days=3 * (i // 200)),
+         'end_date': date(2020, 1, 1) + timedelta(days=3 * (i // 200) + 3),
+         'due_amount': None if i % 10 == 0 else Decimal(i % 500) + Decimal('0.25'), 'status': 'Checked-out'}
+        for i in range(1, count + 1)
+    ])
+    db.session.execute(insert(Balance), [
+        {'id': i, 'reservation_id': i % count + 1, 'menu_item_id': 1, 'amount': Decimal('3.50') * (i % 4 + 1),
+         'number_of_items': i % 4 + 1, 'transaction_timestamp': started + timedelta(minutes=7 * i)}
+        for i in range(1, count + 1)
+    ])
+    db.session.execute(insert(UserActionLog), [
+        {'id': i, 'user_id': 6, 'action': 'Reservation Status-Change',
+         'details': f'Reservation {i % count + 1} changed to Checked-out', 'timestamp': started + timedelta(minutes=i),
+         'entity_type': 'reservation', 'entity_id': i % count + 1, 'reservation_id': i % count + 1,
+         'payload': {'status': 'Checked-out'} if i % 2 else None}
+        for i in range(1, count + 1)
+    ])
+    db.session.commit()
+
+
+def measure(fetch, encode, runs):
+    """Median (fetch and serialize, encode) times in ms over the runs, and the serialized rows of the last run."""
+    fetch_times, encode_times = [], []
+    for _ in range(runs):
+        db.session.expunge_all()
+        started = time.perf_counter()
+        rows = fetch()
+        fetched = time.perf_counter()
+        encode(rows)
+        encoded = time.perf_counter()
+        fetch_times.append((fetched - started) * 1000)
+        encode_times.append((encoded - fetched) * 1000)
+    return statistics.median(fetch_times), statistics.median(encode_times), rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    app = create_benchmark_app()
+    stdlib_json = DefaultJSONProvider(app)
+    orjson_json = serialization.OrjsonProvider(app) if serialization.orjson is not None else None
+
+    table_rows = []
+    mismatches = []
+    with app.app_context():
+        seed(args.rows)
+
+        for model in (Reservation, Balance, UserActionLog):
+            def orm_rows():
+                return [instance.to_dict() for instance in model.query.all()]
+
+            def core_rows():
+                return serialization.select_dicts(model)
+
+            paths = [('orm + json', orm_rows, stdlib_json), ('core + json', core_rows, stdlib_json)]
+            if orjson_json is not None:
+                paths.append(('core + orjson', core_rows, orjson_json))
+
+            baseline_total = None
+            baseline_rows = None
+            for name, fetch, provider in paths:
+                fetch_ms, encode_ms, rows = measure(fetch, provider.dumps, args.runs)
+                total = fetch_ms + encode_ms
+                if baseline_rows is None:
+                    baseline_total, baseline_rows = total, rows
+                elif rows != baseline_rows:
+                    mismatches.append(f"{model.__name__}: {name}")
+                table_rows.append((model.__name__, name, f'{fetch_ms:.0f}', f'{encode_ms:.0f}', f'{total:.0f}',
+                                   f'{baseline_total / total:.1f}x'))
+
+    print(f"{args.rows} rows per model, median of {args.runs} runs")
+    print_table(('model', 'path', 'fetch + serialize ms', 'encode ms', 'total ms', 'speedup'), table_rows)
+    if serialization.orjson is None:
+        print("orjson is not installed: the orjson path was skipped")
+    if mismatches:
+        print("MISMATCH with to_dict: " + ', '.join(mismatches))
+        raise SystemExit(1)
+    print("The serialized rows match to_dict")
+
+
+if __name__ == '__main__':
+    main()
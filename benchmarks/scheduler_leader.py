@@ -0,0 +1,156 @@
+# benchmarks/scheduler_leader.py
+"""
+Multi-process check of the scheduler leader election.
+
+Starts several worker processes with PMS_RUN_SCHEDULER on the same database, each scheduling a probe job every
+second, and checks from the job_runs table that:
+1. exactly one process runs the jobs;
+2. after the leader is killed, exactly one of the remaining processes takes over;
+3. a leader releasing the lock (SchedulerLeadership.release) hands it over at once, and on Postgres leaves no
+   advisory lock behind in the connection pool.
+
+Runs against a temporary SQLite file (file lock) by default, or BENCH_DATABASE_URI (e.g. a local Postgres,
+advisory lock). Exits with a non-zero status if a check fails.
+
+Usage:
+    python -m benchmarks.scheduler_leader [--workers 4] [--seconds 4]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from flask import Flask
+from sqlalchemy import text
+
+from models import db, JobRun
+from scheduled_jobs import SchedulerLeadership
+
+# Lock key of the handover check, not to contend with a running scheduler
+HANDOVER_LOCK_KEY = 0x504D53_48414E44
+
+CHILD = '''
+import sys, time
+import app, scheduled_jobs
+application = app.create_app({
+    'SQLALCHEMY_DATABASE_URI': sys.argv[1], 'JWT_SECRET_KEY': 'scheduler-leader-benchmark-secret-key',
+    'PMS_RUN_SCHEDULER': True, 'SCHEDULER_LOCK_FILE': sys.argv[2], 'SCHEDULER_LEADER_CHECK_SECONDS': 0.5,
+    'AUDIT_LOG_ASYNC': False
+})
+scheduled_jobs.scheduler.add_job(id='probe', func=scheduled_jobs.recorded_job('probe')(lambda: 1),
+                                 trigger='interval', seconds=1)
+while True:
+    time.sleep(1)
+'''
+
+
+def probe_runners(app, since):
+    """The pids which ran the probe job since 'since'."""
+    with app.app_context():
+        rows = db.session.query(JobRun.pid).filter(JobRun.job_id == 'probe', JobRun.started_at >= since)
+        return {pid for pid, in rows}
+
+
+def wait_for_probe(app, since, timeout=60):
+    """Wait until the probe job ran after 'since'. Returns False on timeout."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if probe_runners(app, since):
+            return True
+        time.sleep(0.2)
+    return False
+
+
+def check_handover(app, lock_file):
+    """Two candidates in this process: the second takes the lock only once the first released it."""
+    app.config.update(SCHEDULER_LOCK_FILE=lock_file, SCHEDULER_LOCK_KEY=HANDOVER_LOCK_KEY)
+    first, second = SchedulerLeadership(app), SchedulerLeadership(app)
+    failures = []
+    if not first.try_acquire():
+        failures.append("the first candidate could not take the free lock")
+    elif second.try_acquire():
+        failures.append("the second candidate took the lock held by the first")
+    first.release()
+    if not second.try_acquire():
+        failures.append("the lock was not released")
+    second.release()
+
+    if first.uses_advisory_lock():
+        with app.app_context():
+            held = db.session.execute(text(
+                "SELECT count(*) FROM pg_locks WHERE locktype = 'advisory' "
+                "AND ((classid::bigint << 32) | objid::bigint) = :key"
+            ), {'key': HANDOVER_LOCK_KEY}).scalar()
+        if held:
+            failures.append(f"{held} advisory lock(s) left after the release")
+    print("handover on release: " + ("ok" if not failures else "; ".join(failures)))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_uri = os.environ.get('BENCH_DATABASE_URI', f"sqlite:///{os.path.join(directory, 'leader.db')}")
+        lock_file = os.path.join(directory, 'scheduler.lock')
+
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            JobRun.query.filter_by(job_id='probe').delete()
+            db.session.commit()
+
+        env = {**os.environ, 'PYTHONPATH': os.getcwd()}
+        workers = [subprocess.Popen([sys.executable, '-c', CHILD, database_uri, lock_file], env=env,
+                                    stdout=subprocess.DEVNULL)
+                   for _ in range(args.workers)]
+        failures = []
+        try:
+            # Once the workers are up and the jobs running, watch for a while
+            started = datetime.now()
+            wait_for_probe(app, started)
+            time.sleep(args.seconds)
+            leaders = probe_runners(app, started)
+            print(f"{args.workers} workers, probe run by: {sorted(leaders)}")
+            if len(leaders) != 1:
+                failures.append(f"expected one leader, got {sorted(leaders)}")
+            else:
+                leader = leaders.pop()
+                for worker in workers:
+                    if worker.pid == leader:
+                        worker.kill()
+                        worker.wait()
+
+                killed_at = datetime.now()
+                wait_for_probe(app, killed_at)
+                takeover = (datetime.now() - killed_at).total_seconds()
+                time.sleep(args.seconds)
+                successors = probe_runners(app, killed_at)
+                print(f"leader {leader} killed, probe then run by: {sorted(successors)} "
+                      f"(taken over in {takeover:.1f} s)")
+                if len(successors) != 1 or leader in successors:
+                    failures.append(f"expected one new leader, got {sorted(successors)}")
+        finally:
+            for worker in workers:
+                worker.kill()
+                worker.wait()
+
+        failures += check_handover(app, os.path.join(directory, 'handover.lock'))
+
+    if failures:
+        print("FAILED:", '; '.join(failures))
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+# benchmarks/startup.py
+"""
+Benchmark of the application startup: time from `import app` to the first answered request.
+
+Each run starts a fresh Python process which imports the app module, creates the application and answers one
+request, with the secrets resolved from:
+- 'env': environment variables (DATABASE_URL, JWT_SECRET_KEY);
+- 'file': a secrets file (PMS_SECRETS_FILE);
+- 'cache': the local cache of the AWS secret (PMS_SECRETS_CACHE).
+
+Reports the median of each phase, and the number of threads running after the first request (no scheduler
+threads unless PMS_RUN_SCHEDULER is set).
+
+Usage:
+    python -m benchmarks.startup [--runs 5]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.common import print_table
+
+CHILD = '''
+import json, threading, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app()
+created = time.perf_counter()
+from models import db
+with application.app_context():
+    db.create_all()
+ready = time.perf_counter()
+response = application.test_client().get('/logging/actions')
+answered = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({'import': imported - started, 'create_app': created - imported,
+                  'first_request': answered - ready, 'total': answered - started - (ready - created),
+                  'threads': threading.active_count()}))
+'''
+
+SECRET = {'JWT_SECRET_KEY': 'startup-benchmark-jwt-secret-key-0123', 'FLASK_SECRET_KEY': 'startup-benchmark',
+          'database_url': 'sqlite://'}
+
+
+def run_child(env):
+    output = subprocess.run([sys.executable, '-c', CHILD], env=env, capture_output=True, text=True,
+                            cwd=os.getcwd(), check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    base_env = {name: value for name, value in os.environ.items()
+                if name not in ('DATABASE_URL', 'JWT_SECRET_KEY', 'PMS_SECRETS_FILE', 'PMS_SECRETS_CACHE',
+                                'PMS_RUN_SCHEDULER')}
+    base_env['PYTHONPATH'] = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as directory:
+        secrets_file = os.path.join(directory, 'secrets.json')
+        with open(secrets_file, 'w') as file:
+            json.dump(SECRET, file)
+
+        sources = {
+            'env': {'DATABASE_URL': SECRET['database_url'], 'JWT_SECRET_KEY': SECRET['JWT_SECRET_KEY']},
+            'file': {'PMS_SECRETS_FILE': secrets_file},
+            'cache': {'PMS_SECRETS_CACHE': secrets_file},
+        }
+
+        rows = []
+        for name, env in sources.items():
+            runs = [run_child({**base_env, **env}) for _ in range(args.runs)]
+            medians = {phase: statistics.median(run[phase] for run in runs) * 1000
+                       for phase in ('import', 'create_app', 'first_request', 'total')}
+            rows.append((name, *[f'{medians[phase]:.1f}' for phase in medians], runs[-1]['threads']))
+
+    print_table(('secrets', 'import ms', 'create_app ms', 'first request ms', 'total ms', 'threads'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,13 +6,15 @@ It includes routes for retrieving cleaning schedules, managing cleaning tasks, a
 from flask import jsonify, request, Blueprint
 from datetime import datetime, timedelta
 
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
+from sqlalchemy.orm import joinedload
 
+import cleaning_scheduler
 import logs
-import room_management
-from auth import requires_roles
-from models import db, CleaningSchedule, CleaningAction, Room, Reservation, \
-    User  # Assuming these are your SQLAlchemy models
+from auth import requires_roles, get_current_user
+from models import db, CleaningSchedule, CleaningAction, Room, Reservation  # Assuming these are your SQLAlchemy models
+from pagination import model_list_response
+from serialization import select_dicts
 
 cleaning_management_blueprint = Blueprint('cleaning_management', __name__)
 
@@ -27,15 +29,19 @@ def get_cleaning_schedule():
     This route handles a GET request to fetch all entries in the CleaningSchedule database.
     It's used to obtain a comprehensive view of all scheduled cleaning tasks.
 
+    The list can be paginated ('limit' / 'cursor'), projected ('fields'), sorted ('sort=scheduled_date'),
+    streamed ('format=ndjson') and filtered on room_id, action_id, status and scheduled_date
+    (see pagination.model_list_response).
+
     Returns:
     Flask Response: A JSON list of all cleaning schedules, each converted to a dictionary.
     """
-
-    # Query the database to retrieve all cleaning schedule entries
-    schedule = CleaningSchedule.query.all()
-
-    # Convert each schedule entry to a dictionary and return them as a JSON list
-    return jsonify([entry.to_dict() for entry in schedule]), 200
+    return model_list_response(
+        CleaningSchedule,
+        filters=(CleaningSchedule.room_id, CleaningSchedule.action_id, CleaningSchedule.status,
+                 CleaningSchedule.scheduled_date),
+        sorts=(CleaningSchedule.scheduled_date,)
+    )
 
 
 @cleaning_management_blueprint.route('/get_cleaning_schedule/room/<int:room_id>', methods=['GET'])
@@ -80,11 +86,11 @@ def get_date_range_cleaning_schedule():
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
 
-    # Query the database for cleaning schedules within the specified date range
-    schedule = CleaningSchedule.query.filter(CleaningSchedule.scheduled_date.between(start_date, end_date)).all()
+    # Select the cleaning schedules within the specified date range, serialized without loading the entries
+    schedule = select_dicts(CleaningSchedule, CleaningSchedule.scheduled_date.between(start_date, end_date))
 
-    # Convert the schedule entries to dictionaries and return them as JSON
-    return jsonify([entry.to_dict() for entry in schedule]), 200
+    # Return the schedule entries as JSON
+    return jsonify(schedule), 200
 
 
 @cleaning_management_blueprint.route('/get_cleaning_schedule/room/<int:room_id>/date_range', methods=['GET'])
@@ -108,14 +114,15 @@ def get_room_date_range_cleaning_schedule(room_id):
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
 
-    # Query the database for cleaning schedules for the specified room in the date range
-    schedule = CleaningSchedule.query.filter(
+    # Select the cleaning schedules for the specified room in the date range, serialized without loading them
+    schedule = select_dicts(
+        CleaningSchedule,
         CleaningSchedule.room_id == room_id,
         CleaningSchedule.scheduled_date.between(start_date, end_date)
-    ).all()
+    )
 
-    # Convert the schedule entries to dictionaries and return them as JSON
-    return jsonify([entry.to_dict() for entry in schedule]), 200
+    # Return the schedule entries as JSON
+    return jsonify(schedule), 200
 
 
 def get_room_today_cleaning_schedule(room_id):
@@ -172,6 +179,10 @@ def get_cleaning_schedule_for_reservations_date_range():
 
     This route processes a GET request to fetch cleaning schedules for rooms that have reservations
     starting or ending between 'start_date' and 'end_date', as specified in the query parameters.
+    The schedules of all rooms are fetched with a single query and grouped by room.
+
+    With 'include_names=true', each entry also carries its 'action_name' and 'room_name' (eager-loaded in the
+    same query), so clients don't need to look up each cleaning action separately.
 
     Returns:
     Flask Response: A JSON object mapping room IDs to their respective cleaning schedules,
@@ -181,6 +192,7 @@ def get_cleaning_schedule_for_reservations_date_range():
     # Retrieve start and end dates from query parameters
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
+    include_names = request.args.get('include_names', 'false').lower() in ('1', 'true', 'yes')
 
     # Ensure both start and end dates are provided
     if not start_date or not end_date:
@@ -191,23 +203,30 @@ def get_cleaning_schedule_for_reservations_date_range():
         start_date = datetime.strptime(start_date, '%Y-%m-%d')
         end_date = datetime.strptime(end_date, '%Y-%m-%d')
 
-        # Get reservations that either start or end within the specified date range
-        reservations = Reservation.query.filter(
+        # Get the rooms of the reservations that either start or end within the specified date range
+        room_ids = [room_id for room_id, in db.session.query(Reservation.room_id).filter(
             Reservation.start_date <= end_date,
-            Reservation.end_date >= start_date
-        ).all()
-
-        # Extract unique room IDs from these reservations
-        room_ids = {reservation.room_id for reservation in reservations}
-
-        # Fetch cleaning schedules for each room within the date range
-        room_schedules = {}
-        for room_id in room_ids:
-            schedule = CleaningSchedule.query.filter(
-                CleaningSchedule.room_id == room_id,
-                CleaningSchedule.scheduled_date.between(start_date, end_date)
-            ).all()
-            room_schedules[room_id] = [entry.to_dict() for entry in schedule]
+            Reservation.end_date >= start_date,
+            Reservation.room_id.isnot(None)
+        ).distinct()]
+
+        # Fetch the cleaning schedules of all these rooms within the date range in one query
+        room_schedules = {room_id: [] for room_id in room_ids}
+        schedule_query = CleaningSchedule.query.filter(
+            CleaningSchedule.room_id.in_(room_ids),
+            CleaningSchedule.scheduled_date.between(start_date, end_date)
+        ).order_by(CleaningSchedule.room_id, CleaningSchedule.scheduled_date, CleaningSchedule.id)
+        if include_names:
+            schedule_query = schedule_query.options(joinedload(CleaningSchedule.action),
+                                                    joinedload(CleaningSchedule.room))
+
+        # Group the schedules by room
+        for entry in schedule_query:
+            entry_dict = entry.to_dict()
+            if include_names:
+                entry_dict['action_name'] = entry.action.action_name
+                entry_dict['room_name'] = entry.room.room_name
+            room_schedules[entry.room_id].append(entry_dict)
 
         # Return the compiled cleaning schedules as JSON
         return jsonify(room_schedules), 200
@@ -264,7 +283,7 @@ def schedule_room_cleaning():
 
     This route handles a POST request with JSON data containing room_id, start_date, and optionally the number of days
     for which the cleaning should be scheduled. It schedules cleaning tasks for the specified room starting from the
-    given start_date and continuing for the specified number of days.
+    given start_date and continuing for the specified number of days, in one planning pass.
 
     Returns:
     Flask Response: A success message if scheduling is successful, or an error message in case of failure.
@@ -284,13 +303,13 @@ def schedule_room_cleaning():
         # Convert the start date from string to datetime object
         start_date = datetime.strptime(start_date, '%Y-%m-%d')
 
-        # Fetch the room details and schedule cleaning
-        room = room_management.get_room(room_id)
-        success, error = schedule_room_cleaning_for(room.id, start_date)  # Removed 'days' parameter
+        # Fetch the room details
+        room = Room.query.get(room_id)
+        if not room:
+            return jsonify({"error": "Room not found"}), 404
 
-        # Handle any errors during scheduling
-        if error:
-            raise Exception(error['error'])
+        # Schedule cleaning for the room over the requested number of days
+        cleaning_scheduler.schedule_cleaning_for_dates(start_date, int(days), room_ids=[room.id])
 
         # Return a success message
         return jsonify({"message": "Cleaning scheduled successfully for room"}), 200
@@ -312,7 +331,8 @@ def schedule_cleaning():
     Flask route to schedule cleaning for all rooms starting from a given date.
 
     This route processes a POST request to schedule cleaning tasks for every room in the database starting from a
-    specified start date. The data for the start date is provided in the JSON payload of the request.
+    specified start date. The data for the start date, and optionally the number of days to plan (default 1),
+    is provided in the JSON payload of the request.
 
     Returns:
     Flask Response: A success message if scheduling is successful for all rooms, or an error message in case of failure.
@@ -321,6 +341,7 @@ def schedule_cleaning():
     # Extract start date from the JSON payload of the request
     data = request.get_json()
     start_date = data.get('start_date')
+    days = data.get('days', 1)  # Default to the start date only
 
     # Validate the presence of a start date
     if not start_date:
@@ -330,16 +351,10 @@ def schedule_cleaning():
         # Convert the start date from string to datetime object
         start_date = datetime.strptime(start_date, '%Y-%m-%d')
 
-        # Fetch all rooms from the database
-        rooms = Room.query.all()
+        # Schedule cleaning for all rooms in one pass
+        cleaning_scheduler.schedule_cleaning_for_dates(start_date, int(days))
 
-        # Schedule cleaning for each room starting from the start date
-        for room in rooms:
-            success, error = schedule_room_cleaning_for(room.id, start_date)
-            if error:
-                raise Exception(error['error'])
-
-        log_cleaning_for_day_scheduled(start_date)
+        log_cleaning_for_day_scheduled(start_date.date(), int(days))
 
         # Return a success message
         return jsonify({"message": "Cleaning scheduled successfully for all rooms"}), 200
@@ -354,36 +369,38 @@ def schedule_cleaning():
         return jsonify({"error": str(e)}), 500
 
 
-def schedule_cleaning_internal():
+def schedule_cleaning_internal(days=1):
     """
-    Internal function to schedule cleaning for all rooms starting from a given date.
+    Internal function to schedule cleaning for all rooms starting from today.
+
+    This function schedules cleaning tasks for every room in the database for today and the following days,
+    using the set-based scheduler.
 
-    This function schedules cleaning tasks for every room in the database starting from a specified start date.
+    Parameters:
+    days (int): The number of days to plan, starting from today. Defaults to 1.
+
+    Returns:
+    int: The number of tasks scheduled.
 
-    Returns: None
+    Raises:
+    Exception: Any error of the scheduling, after the database rollback, so that the scheduled job records a
+    failed run (see scheduled_jobs.recorded_job).
     """
     try:
-        # Convert the start date from string to datetime object
         start_date = datetime.today().date()
-        # Fetch all rooms from the database
-        rooms = Room.query.all()
 
-        # Schedule cleaning for each room starting from the start date
-        for room in rooms:
-            success, error = schedule_room_cleaning_for(room.id, start_date)
-            if error:
-                raise Exception(error['error'])
+        # Schedule cleaning for all rooms in one pass
+        scheduled = cleaning_scheduler.schedule_cleaning_for_dates(start_date, days)
 
-        log_cleaning_for_day_scheduled(start_date)
+        log_cleaning_for_day_scheduled(start_date, days)
         print("Cleaning scheduled successfully for all rooms for date: ", start_date)
+        return scheduled
 
-    except ValueError:
-        # Handle invalid date format error
-        print("Invalid date format. Please use YYYY-MM-DD")
     except Exception as e:
-        # Handle other exceptions and perform a database rollback
+        # Perform a database rollback, then let the caller record the failure
         db.session.rollback()
         print(e)
+        raise
 
 
 def schedule_room_cleaning_for(room_id, date_to_schedule):
@@ -491,45 +508,31 @@ def was_task_performed(room_id, action_id, check_from_date, check_until_date):
     """
     Checks whether a specific cleaning task was performed for a room between two dates.
 
-    This function iterates over each day from the last checkout date to a specified 'check until' date.
-    It checks if a cleaning task identified by the action_id was completed for the specified room.
+    This function looks up the last date the cleaning task identified by the action_id was completed for the
+    specified room before 'check until' date (a single indexed query), and checks that it isn't older than
+    'check from' date.
 
     Parameters:
     room_id (int): The identifier of the room.
     action_id (int): The identifier of the cleaning action to check.
-    last_checkout_date (datetime.date): The starting date to check from (usually the last checkout date).
-    check_until_date (datetime.date): The ending date to check until.
+    check_from_date (datetime.date): The starting date to check from (usually the last checkout date), inclusive.
+    check_until_date (datetime.date): The ending date to check until, exclusive.
 
     Returns:
     bool: True if the task was completed at least once between the specified dates, False otherwise.
     """
 
-    # Convert last_checkout_date and check_until_date to date objects if they are datetime instances
+    # Convert check_from_date and check_until_date to date objects if they are datetime instances
     if isinstance(check_from_date, datetime):
         check_from_date = check_from_date.date()
     if isinstance(check_until_date, datetime):
         check_until_date = check_until_date.date()
 
-    # Iterate through each day within the specified date range
-    current_date = check_from_date
-    while current_date < check_until_date:
-        # Check if the task was completed on the current date
-        task_completed = CleaningSchedule.query.filter_by(
-            room_id=room_id,
-            action_id=action_id,
-            scheduled_date=current_date,
-            status='completed'
-        ).first()
-
-        # If the task was found to be completed, return True
-        if task_completed:
-            return True
-
-        # Move to the next day and continue checking
-        current_date += timedelta(days=1)
+    # Last completion of the task before the end of the range
+    last_completed = cleaning_scheduler.get_last_completed_date(room_id, action_id, check_until_date)
 
-    # Return False if the task was not completed on any day in the specified range
-    return False
+    # The task was performed in the range if its last completion isn't older than the start of the range
+    return last_completed is not None and last_completed >= check_from_date
 
 
 def get_last_checkout_date_before(room_id, given_date):
@@ -584,8 +587,7 @@ def change_task_status(schedule_id):
     Returns:
     Flask Response: A JSON response indicating the success or failure of the operation.
     """
-    current_user_email = get_jwt_identity()  # Get the user's email from the token
-    user = User.query.filter_by(email=current_user_email).first()
+    user = get_current_user()  # The user's ID and department, from the token
 
     # Extract data from the request's JSON payload
     data = request.get_json()
@@ -612,7 +614,7 @@ def change_task_status(schedule_id):
 
         # Commit the changes to the database
         db.session.commit()
-        log_cleaning_action_performed(user.id, schedule_id, task_status)
+        log_cleaning_action_performed(user.id, task, task_status)
         # Return a success message
         return jsonify({"message": "Task marked as completed and future tasks rescheduled"}), 200
 
@@ -638,24 +640,8 @@ def reschedule_future_tasks_helper(room_id, action_id, completed_date):
         if not action:
             return jsonify({"error": "Cleaning action not found"}), 404
 
-        frequency_days = action.frequency_days
-
-        # Fetch all future tasks for the same room and action
-        future_tasks = CleaningSchedule.query.filter(
-            CleaningSchedule.room_id == room_id,
-            CleaningSchedule.action_id == action_id,
-            CleaningSchedule.scheduled_date > completed_date
-        ).order_by(CleaningSchedule.scheduled_date).all()
-
-        # Reschedule each future task
-        new_scheduled_date = completed_date
-        for task in future_tasks:
-            new_scheduled_date = _find_next_available_date(new_scheduled_date, frequency_days, room_id, action_id)
-            if new_scheduled_date != task.scheduled_date:
-                task.scheduled_date = new_scheduled_date
-            else:
-                # If the task is the same for the same room on the same date, remove it
-                db.session.delete(task)
+        # Reschedule all future tasks for the same room and action in memory, and apply them in bulk
+        cleaning_scheduler.reschedule_future_tasks(room_id, action_id, completed_date, action.frequency_days)
 
         db.session.commit()
         return {"message": "Future tasks rescheduled successfully"}, 200
@@ -682,21 +668,6 @@ def reschedule_future_tasks():
     return jsonify(message), status_code
 
 
-def _find_next_available_date(start_date, frequency_days, room_id, action_id):
-    """Find the next available date for scheduling, skipping dates with conflicts."""
-    new_date = start_date
-    while True:
-        new_date += timedelta(days=frequency_days)
-        existing_task = CleaningSchedule.query.filter(
-            CleaningSchedule.room_id == room_id,
-            CleaningSchedule.action_id == action_id,
-            CleaningSchedule.scheduled_date == new_date
-        ).first()
-        if not existing_task:
-            break
-    return new_date
-
-
 @cleaning_management_blueprint.route('/get_cleaning_action/<int:action_id>', methods=['GET'])
 @jwt_required()
 @requires_roles('Admin', 'Manager', 'Reception', 'Cleaning')
@@ -757,8 +728,7 @@ def create_cleaning_action():
         JSON response with an error message and a 400 status code if data is missing.
         JSON response with an error message and a 500 status code on server error.
     """
-    current_user_email = get_jwt_identity()  # Get the user's email from the token
-    user = User.query.filter_by(email=current_user_email).first()
+    user = get_current_user()  # The user's ID and department, from the token
 
     data = request.get_json()
     action_name = data.get('action_name')
@@ -772,7 +742,7 @@ def create_cleaning_action():
     try:
         db.session.add(new_action)
         db.session.commit()
-        log_cleaning_action_modified(user.id, new_action.id, "Create new cleaning action")
+        log_cleaning_action_modified(user.id, new_action, "Create new cleaning action")
         return jsonify(new_action.to_dict()), 201
     except Exception as e:
         db.session.rollback()
@@ -794,8 +764,7 @@ def remove_cleaning_action(action_id):
         JSON response with an error message and a 404 status code if the action is not found.
         JSON response with an error message and a 500 status code on server error.
     """
-    current_user_email = get_jwt_identity()  # Get the user's email from the token
-    user = User.query.filter_by(email=current_user_email).first()
+    user = get_current_user()  # The user's ID and department, from the token
 
     action = CleaningAction.query.get(action_id)
     if action:
@@ -803,7 +772,7 @@ def remove_cleaning_action(action_id):
             CleaningSchedule.query.filter_by(action_id=action_id).delete()
             db.session.delete(action)
             db.session.commit()
-            log_cleaning_action_modified(user.id, action.id, "Delete cleaning action")
+            log_cleaning_action_modified(user.id, action, "Delete cleaning action")
             return jsonify({"msg": "Action removed"}), 200
         except Exception as e:
             db.session.rollback()
@@ -828,8 +797,7 @@ def modify_cleaning_action(action_id):
         JSON response with an error message and a 404 status code if the action is not found.
         JSON response with an error message and a 500 status code on server error.
     """
-    current_user_email = get_jwt_identity()  # Get the user's email from the token
-    user = User.query.filter_by(email=current_user_email).first()
+    user = get_current_user()  # The user's ID and department, from the token
 
     action = CleaningAction.query.get(action_id)
     if action:
@@ -844,7 +812,7 @@ def modify_cleaning_action(action_id):
 
         try:
             db.session.commit()
-            log_cleaning_action_modified(user.id, action.id, "Modify cleaning action")
+            log_cleaning_action_modified(user.id, action, "Modify cleaning action")
             return jsonify(action.to_dict()), 200
         except Exception as e:
             db.session.rollback()
@@ -853,64 +821,73 @@ def modify_cleaning_action(action_id):
         return jsonify({"msg": "Action not found"}), 404
 
 
-def log_cleaning_action_performed(user_id, schedule_id, action_status):
+def log_cleaning_action_performed(user_id, task, action_status):
     """
     Log cleaning action performed.
 
     Args:
         user_id (int): The ID of the user involved in the action.
-        action_id (int): The ID of the cleaning action performed.
+        task (CleaningSchedule): The cleaning task performed.
 
     Logs the details of the action along with user information.
 
     Example of logged details:
-    "Action: Linens | Room: 103
+    "Task: 5012 | Action: Linens | Room: 103 | Date: 2020-11-01
     :param action_status: Pending/Completed
     :param user_id: The ID of the user involved in the action.
-    :param schedule_id: The ID of the cleaning action performed.
+    :param task: The cleaning task performed.
     """
-    schedule = CleaningSchedule.query.get(schedule_id)
-    action = CleaningAction.query.get(schedule.action_id)
+    action = db.session.get(CleaningAction, task.action_id)
+    room = db.session.get(Room, task.room_id)
     log_action = "Cleaning Action Status: " + action_status
-    room = Room.query.get(schedule.room_id)
-    details = f"Action: {action.action_name} | Room: {room.room_name}"
-    logs.log_action(user_id, log_action, details)
+    details = f"Task: {task.id} | Action: {action.action_name if action else task.action_id} | " \
+              f"Room: {room.room_name if room else task.room_id} | Date: {task.scheduled_date}"
+    logs.log_action(user_id, log_action, details, entity_type='cleaning_schedule', entity_id=task.id,
+                    room_id=task.room_id,
+                    payload={'action_id': task.action_id, 'scheduled_date': task.scheduled_date,
+                             'status': action_status})
 
 
-def log_cleaning_for_day_scheduled(date):
+def log_cleaning_for_day_scheduled(date, days=1):
     """
     Log cleaning action scheduled for a day.
 
     Args:
         date (date): The date of the scheduled cleaning action.
+        days (int): The number of days planned from that date.
 
     Logs the details of the action along with the date it's scheduled for.
 
     Example of logged details:
-    "Date: 2020-11-01
+    "Date: 2020-11-01 | Days: 7
     :param date: The date of the cleanings scheduled.
+    :param days: The number of days planned (only logged when greater than 1).
     """
     log_action = "Auto Scheduled Cleaning for Day"
     details = f"Date: {date}"
-    logs.log_action(0, log_action, details)
+    if days > 1:
+        details += f" | Days: {days}"
+    logs.log_action(0, log_action, details, payload={'date': date, 'days': days})
 
 
-def log_cleaning_action_modified(user_id, action_id, action):
+def log_cleaning_action_modified(user_id, cleaning_action, action):
     """
     Log cleaning action modified.
 
     Args:
         user_id (int): The ID of the user involved in the action.
-        action_id (int): The ID of the cleaning action performed.
+        cleaning_action (CleaningAction): The cleaning action created, modified or deleted.
 
     Logs the details of the action along with user information.
 
     Example of logged details:
-    "Action: Linens | Room: 103
+    "Action: 2 : Linens | Frequency: 3
     :param action: Type of modification
     :param user_id: The ID of the user involved in the action.
-    :param action_id: The ID of the cleaning action performed.
+    :param cleaning_action: The cleaning action created, modified or deleted.
     """
-    cleaning_action = CleaningAction.query.get(action_id)
-    details = f"Action: {action_id} : {cleaning_action.action_name} | Frequency: {cleaning_action.frequency_days}"
-    logs.log_action(user_id, action, details)
+    details = f"Action: {cleaning_action.id} : {cleaning_action.action_name} | " \
+              f"Frequency: {cleaning_action.frequency_days}"
+    logs.log_action(user_id, action, details, entity_type='cleaning_action', entity_id=cleaning_action.id,
+                    payload={'action_name': cleaning_action.action_name,
+                             'frequency_days': cleaning_action.frequency_days})
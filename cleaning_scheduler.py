@@ -0,0 +1,315 @@
+# cleaning_scheduler.py
+"""
+Set-based cleaning scheduler.
+
+Plans the cleaning tasks of every room from a handful of set queries (rooms, cleaning actions, reservations,
+last checkouts and last completed tasks) and writes the plan in a single transaction, instead of scheduling
+the rooms one by one.
+
+The plan can cover several days (a planning horizon): the "last performed" state of each (room, action) is
+carried forward day by day in memory, assuming that a task planned for a day is performed on that day.
+
+Rescheduling the future tasks of a (room, action) after a completion works the same way: the occupied dates are
+loaded once, the new dates are computed in memory and applied with one bulk UPDATE and one bulk DELETE.
+"""
+
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, func, insert, update
+
+from models import db, CleaningSchedule, CleaningAction, Room, Reservation
+
+
+def schedule_cleaning_for_dates(start_date, days=1, room_ids=None):
+    """
+    Schedules the cleaning tasks of all rooms (or of the given rooms) for 'days' days from a start date.
+
+    The rules are the same as `cleaning_management.schedule_room_cleaning_for`:
+    - on a checkout day every cleaning action is scheduled;
+    - on a vacant day or a check-in day, an action is scheduled unless it was completed since the last checkout;
+    - on an occupied day, an action is scheduled on its frequency or if it wasn't completed during the last period.
+
+    The plan is written as one batched upsert, committed in a single transaction: the pending tasks of the
+    planned dates are replaced with one bulk delete and one multi-row insert, while completed tasks are kept
+    (a planned task that is already completed isn't created again).
+
+    Parameters:
+    start_date (datetime.date): The first date for which cleaning tasks need to be scheduled.
+    days (int): The number of days to plan. Defaults to 1.
+    room_ids (list, optional): Restrict the scheduling to these rooms. Defaults to all rooms.
+
+    Returns:
+    int: The number of cleaning tasks created.
+    """
+
+    # Convert datetime to date if necessary
+    if isinstance(start_date, datetime):
+        start_date = start_date.date()
+    end_date = start_date + timedelta(days=days - 1)
+
+    try:
+        # Tasks already completed in the window are kept, and count as performed when planning
+        completed_query = db.session.query(
+            CleaningSchedule.room_id, CleaningSchedule.action_id, CleaningSchedule.scheduled_date
+        ).filter(
+            CleaningSchedule.status == 'completed',
+            CleaningSchedule.scheduled_date.between(start_date, end_date)
+        )
+        if room_ids is not None:
+            completed_query = completed_query.filter(CleaningSchedule.room_id.in_(room_ids))
+        completed_in_window = set(completed_query)
+
+        plan = build_cleaning_plan(start_date, days, room_ids, completed_in_window)
+        new_tasks = [task for task in plan
+                     if (task['room_id'], task['action_id'], task['scheduled_date']) not in completed_in_window]
+
+        # Replace the pending tasks of the window with the new plan
+        delete_query = CleaningSchedule.query.filter(
+            CleaningSchedule.scheduled_date.between(start_date, end_date),
+            CleaningSchedule.status != 'completed'
+        )
+        if room_ids is not None:
+            delete_query = delete_query.filter(CleaningSchedule.room_id.in_(room_ids))
+        delete_query.delete(synchronize_session=False)
+
+        if new_tasks:
+            db.session.execute(insert(CleaningSchedule), new_tasks)
+
+        db.session.commit()
+        return len(new_tasks)
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def build_cleaning_plan(start_date, days=1, room_ids=None, completed_in_window=()):
+    """
+    Computes the cleaning tasks of 'days' days from a start date in memory.
+
+    Parameters:
+    start_date (datetime.date): The first date to plan.
+    days (int): The number of days to plan. Defaults to 1.
+    room_ids (list, optional): Restrict the plan to these rooms. Defaults to all rooms.
+    completed_in_window (set, optional): (room_id, action_id, scheduled_date) of the tasks already completed
+    in the planned window.
+
+    Returns:
+    list: One dict per task, with the CleaningSchedule column values (room_id, action_id, scheduled_date, status).
+    """
+
+    end_date = start_date + timedelta(days=days - 1)
+
+    # Rooms and cleaning actions
+    rooms_query = db.session.query(Room.id)
+    if room_ids is not None:
+        rooms_query = rooms_query.filter(Room.id.in_(room_ids))
+    rooms = [room_id for room_id, in rooms_query.order_by(Room.id)]
+
+    actions = db.session.query(CleaningAction.id, CleaningAction.frequency_days).order_by(CleaningAction.id).all()
+
+    if not rooms or not actions:
+        return []
+
+    # Reservations overlapping the window, by room
+    room_reservations = defaultdict(list)
+    reservations_query = db.session.query(Reservation.room_id, Reservation.start_date, Reservation.end_date).filter(
+        Reservation.start_date <= end_date,
+        Reservation.end_date >= start_date
+    )
+    if room_ids is not None:
+        reservations_query = reservations_query.filter(Reservation.room_id.in_(room_ids))
+    for room_id, reservation_start, reservation_end in reservations_query:
+        room_reservations[room_id].append((reservation_start, reservation_end))
+
+    # Last checkout before the window, by room
+    checkouts_query = db.session.query(Reservation.room_id, func.max(Reservation.end_date)).filter(
+        Reservation.end_date < start_date
+    )
+    if room_ids is not None:
+        checkouts_query = checkouts_query.filter(Reservation.room_id.in_(room_ids))
+    last_checkouts = dict(checkouts_query.group_by(Reservation.room_id).all())
+
+    # Last completed task before the window, by (room, action). Carried forward day by day below.
+    last_performed = get_last_completed_dates(start_date, room_ids)
+
+    plan = []
+    for day in range(days):
+        date_to_schedule = start_date + timedelta(days=day)
+
+        for room_id in rooms:
+            reservations = room_reservations.get(room_id, ())
+            current_reservation = _current_reservation(reservations, date_to_schedule)
+
+            # Last checkout before the date, defaulting to 7 days before (first reservation of a room)
+            checkouts = [end for _, end in reservations if end < date_to_schedule]
+            if last_checkouts.get(room_id):
+                checkouts.append(last_checkouts[room_id])
+            last_checkout = max(checkouts) if checkouts else date_to_schedule - timedelta(days=7)
+
+            for action_id, frequency_days in actions:
+                key = (room_id, action_id)
+                if _is_task_due(date_to_schedule, current_reservation, last_checkout, frequency_days,
+                                last_performed.get(key)):
+                    plan.append({
+                        'room_id': room_id,
+                        'action_id': action_id,
+                        'scheduled_date': date_to_schedule,
+                        'status': 'pending'
+                    })
+                    last_performed[key] = date_to_schedule
+                elif (room_id, action_id, date_to_schedule) in completed_in_window:
+                    last_performed[key] = date_to_schedule
+
+    return plan
+
+
+def reschedule_future_tasks(room_id, action_id, completed_date, frequency_days):
+    """
+    Reschedules the future tasks of a cleaning action in a room after it was completed.
+
+    Each future task, in date order, is moved to the first date that is a multiple of the action's frequency after
+    the previous one (starting from the completion date) and isn't already taken by another task of the same room
+    and action. The occupied dates are loaded with one query and the new dates are computed in memory.
+
+    The changes are added to the current transaction (one bulk UPDATE and one bulk DELETE); the caller commits.
+
+    Parameters:
+    room_id (int): The identifier of the room.
+    action_id (int): The identifier of the cleaning action.
+    completed_date (datetime.date): The date the action was completed.
+    frequency_days (int): The frequency of the action in days.
+
+    Returns:
+    tuple: The number of tasks moved and the number of tasks removed.
+    """
+
+    if not frequency_days or frequency_days < 1:
+        raise ValueError("The cleaning action frequency must be at least 1 day")
+
+    # Every task of the room and action, past and future
+    tasks = db.session.query(CleaningSchedule.id, CleaningSchedule.scheduled_date).filter(
+        CleaningSchedule.room_id == room_id,
+        CleaningSchedule.action_id == action_id
+    ).all()
+
+    occupied_dates = Counter(scheduled_date for _, scheduled_date in tasks)
+    future_tasks = sorted((scheduled_date, task_id) for task_id, scheduled_date in tasks
+                          if scheduled_date > completed_date)
+
+    new_dates = {}
+    removed_task_ids = []
+    new_scheduled_date = completed_date
+    for scheduled_date, task_id in future_tasks:
+        new_scheduled_date = _next_available_date(new_scheduled_date, frequency_days, occupied_dates)
+
+        # The task leaves its date, freeing it for the following tasks
+        occupied_dates[scheduled_date] -= 1
+        if new_scheduled_date != scheduled_date:
+            occupied_dates[new_scheduled_date] += 1
+            new_dates[task_id] = new_scheduled_date
+        else:
+            # If the task is the same for the same room on the same date, remove it
+            removed_task_ids.append(task_id)
+
+    if new_dates:
+        db.session.execute(
+            update(CleaningSchedule)
+            .where(CleaningSchedule.id.in_(new_dates))
+            .values(scheduled_date=case(new_dates, value=CleaningSchedule.id))
+            .execution_options(synchronize_session=False)
+        )
+    if removed_task_ids:
+        CleaningSchedule.query.filter(CleaningSchedule.id.in_(removed_task_ids)).delete(synchronize_session=False)
+
+    return len(new_dates), len(removed_task_ids)
+
+
+def _next_available_date(start_date, frequency_days, occupied_dates):
+    """Find the next date every 'frequency_days' after start_date that isn't occupied."""
+    new_date = start_date + timedelta(days=frequency_days)
+    while occupied_dates[new_date] > 0:
+        new_date += timedelta(days=frequency_days)
+    return new_date
+
+
+def _current_reservation(reservations, date_to_schedule):
+    """Pick the room's reservation including the date, as a (start_date, end_date) tuple, or None."""
+    current_reservation = None
+    for reservation_start, reservation_end in reservations:
+        if reservation_start <= date_to_schedule <= reservation_end:
+            # A same-day turnover is treated as a checkout, so the room gets a full cleaning
+            if current_reservation is None or reservation_end == date_to_schedule:
+                current_reservation = (reservation_start, reservation_end)
+    return current_reservation
+
+
+def get_last_completed_dates(before_date, room_ids=None):
+    """
+    Retrieves the last date each cleaning action was completed in each room, before a given date.
+
+    Answered with one grouped query served by the (room_id, action_id, status, scheduled_date) index.
+
+    Parameters:
+    before_date (datetime.date): Only completions scheduled strictly before this date are considered.
+    room_ids (list, optional): Restrict the lookup to these rooms. Defaults to all rooms.
+
+    Returns:
+    dict: Maps (room_id, action_id) to the last completed scheduled_date. Pairs never completed are absent.
+    """
+    completed_query = db.session.query(
+        CleaningSchedule.room_id, CleaningSchedule.action_id, func.max(CleaningSchedule.scheduled_date)
+    ).filter(
+        CleaningSchedule.status == 'completed',
+        CleaningSchedule.scheduled_date < before_date
+    )
+    if room_ids is not None:
+        completed_query = completed_query.filter(CleaningSchedule.room_id.in_(room_ids))
+
+    return {
+        (room_id, action_id): last_date
+        for room_id, action_id, last_date in completed_query.group_by(CleaningSchedule.room_id,
+                                                                      CleaningSchedule.action_id)
+    }
+
+
+def get_last_completed_date(room_id, action_id, before_date):
+    """
+    Retrieves the last date a cleaning action was completed in a room, before a given date.
+
+    Parameters:
+    room_id (int): The identifier of the room.
+    action_id (int): The identifier of the cleaning action.
+    before_date (datetime.date): Only completions scheduled strictly before this date are considered.
+
+    Returns:
+    datetime.date, None: The last completed scheduled_date, or None if the action was never completed.
+    """
+    return db.session.query(func.max(CleaningSchedule.scheduled_date)).filter(
+        CleaningSchedule.room_id == room_id,
+        CleaningSchedule.action_id == action_id,
+        CleaningSchedule.status == 'completed',
+        CleaningSchedule.scheduled_date < before_date
+    ).scalar()
+
+
+def _is_task_due(date_to_schedule, current_reservation, last_checkout, frequency_days, performed_on):
+    """Decide whether an action is due in a room, given the room's reservation and the action's last completion."""
+
+    # Checkout day: full cleaning
+    if current_reservation and current_reservation[1] == date_to_schedule:
+        return True
+
+    # Vacant room or check-in day: due unless completed since the last checkout
+    if not current_reservation or date_to_schedule == current_reservation[0]:
+        return not _performed_between(performed_on, last_checkout, date_to_schedule)
+
+    # Occupied room: due on its frequency, or if it wasn't completed during the last period
+    days_since_check_in = (date_to_schedule - current_reservation[0]).days
+    return days_since_check_in % frequency_days == 0 or not _performed_between(
+        performed_on, date_to_schedule - timedelta(days=frequency_days), date_to_schedule)
+
+
+def _performed_between(performed_on, check_from_date, check_until_date):
+    """True if the last completion date falls in [check_from_date, check_until_date)."""
+    return performed_on is not None and check_from_date <= performed_on < check_until_date
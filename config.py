@@ -1,2 +1,117 @@
 # config.py
+"""
+Application configuration, resolved when the application is created (not at import time).
 
+The secrets (JWT and Flask secret keys, database credentials) are read from the first available source:
+1. Environment variables: DATABASE_URL (or the DB_USERNAME, DB_PASSWORD, DB_HOST, DB_PORT and DB_NAME parts),
+   JWT_SECRET_KEY and FLASK_SECRET_KEY.
+2. A JSON file named by PMS_SECRETS_FILE, with the keys of the AWS secret.
+3. The local cache of the AWS secret (PMS_SECRETS_CACHE, '.secrets_cache.json' by default), if younger than
+   PMS_SECRETS_CACHE_TTL seconds (86400 by default).
+4. AWS Secrets Manager (getSecret.get_secret), whose answer is then written to the local cache.
+
+Other settings:
+    PMS_RUN_SCHEDULER (bool): Run the background jobs in this process. Defaults to false; see scheduled_jobs.
+    NOTIFICATION_BUS_LISTEN_NOTIFY (bool): Deliver the notifications to the streams of every process through
+        Postgres LISTEN/NOTIFY. Defaults to false; see notification_bus.
+    JSON_PROVIDER (str): 'orjson' (if installed) or 'stdlib', the encoder of the JSON responses. Defaults to
+        'orjson'; see serialization.
+"""
+
+import json
+import os
+import time
+
+SECRETS_CACHE_FILE = '.secrets_cache.json'
+SECRETS_CACHE_TTL = 24 * 3600
+DEFAULT_DB_NAME = 'postgres'
+
+
+def env_flag(name, default=False):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def load_secret():
+    """
+    Get the application secret from the first available source (see the module documentation).
+
+    Returns:
+        dict: The secret, with the keys of the AWS secret ('JWT_SECRET_KEY', 'FLASK_SECRET_KEY', 'username',
+            'password', 'host', 'port'), or 'database_url' in place of the database credentials.
+    """
+    secret = secret_from_environment()
+    if secret:
+        return secret
+
+    secrets_file = os.environ.get('PMS_SECRETS_FILE')
+    if secrets_file:
+        with open(secrets_file) as file:
+            return json.load(file)
+
+    cache_file = os.environ.get('PMS_SECRETS_CACHE', SECRETS_CACHE_FILE)
+    cache_ttl = int(os.environ.get('PMS_SECRETS_CACHE_TTL', SECRETS_CACHE_TTL))
+    if os.path.exists(cache_file) and time.time() - os.path.getmtime(cache_file) < cache_ttl:
+        with open(cache_file) as file:
+            return json.load(file)
+
+    from getSecret import get_secret  # boto3 is only imported when the secret comes from AWS
+    secret = get_secret()
+    write_secret_cache(cache_file, secret)
+    return secret
+
+
+def secret_from_environment():
+    """The secret from the environment variables, or None if they do not define it."""
+    if not os.environ.get('JWT_SECRET_KEY'):
+        return None
+    if not os.environ.get('DATABASE_URL') and not os.environ.get('DB_HOST'):
+        return None
+
+    database_url = os.environ.get('DATABASE_URL') or \
+        f"postgresql://{os.environ.get('DB_USERNAME')}:{os.environ.get('DB_PASSWORD')}@{os.environ['DB_HOST']}:" \
+        f"{os.environ.get('DB_PORT', 5432)}/{os.environ.get('DB_NAME', DEFAULT_DB_NAME)}"
+
+    return {
+        'JWT_SECRET_KEY': os.environ['JWT_SECRET_KEY'],
+        'FLASK_SECRET_KEY': os.environ.get('FLASK_SECRET_KEY', os.environ['JWT_SECRET_KEY']),
+        'database_url': database_url
+    }
+
+
+def write_secret_cache(cache_file, secret):
+    """Write the secret to the local cache file, readable by the current user only."""
+    try:
+        descriptor = os.open(cache_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(descriptor, 'w') as file:
+            json.dump(secret, file)
+    except OSError as e:
+        print("Could not write the secrets cache:", e)
+
+
+def build_config(secret=None):
+    """
+    Build the Flask configuration.
+
+    Args:
+        secret (dict): The application secret. Loaded with load_secret() if not given.
+
+    Returns:
+        dict: The configuration values, to update app.config with.
+    """
+    if secret is None:
+        secret = load_secret()
+
+    database_url = secret.get('database_url') or \
+        f"postgresql://{secret['username']}:{secret['password']}@{secret['host']}:{secret['port']}/{DEFAULT_DB_NAME}"
+
+    return {
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'JWT_SECRET_KEY': secret['JWT_SECRET_KEY'],
+        'SECRET_KEY': secret['FLASK_SECRET_KEY'],
+        'PMS_RUN_SCHEDULER': env_flag('PMS_RUN_SCHEDULER'),
+        'NOTIFICATION_BUS_LISTEN_NOTIFY': env_flag('NOTIFICATION_BUS_LISTEN_NOTIFY'),
+        'JSON_PROVIDER': os.environ.get('JSON_PROVIDER', 'orjson')
+    }
@@ -1,9 +1,10 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 
 import logs
-from auth import requires_roles
-from models import db, Guest, User  # Ensure Guest model is imported from your models.py
+from auth import requires_roles, get_current_user
+from models import db, Guest  # Ensure Guest model is imported from your models.py
+from pagination import model_list_response
 
 guest_management_blueprint = Blueprint('guest_management', __name__)
 
@@ -12,8 +13,7 @@ guest_management_blueprint = Blueprint('guest_management', __name__)
 @jwt_required()
 @requires_roles('Admin', 'Manager', 'Reception')
 def add_guest():
-    current_user_email = get_jwt_identity()  # Get the user's email from the token
-    user = User.query.filter_by(email=current_user_email).first()
+    user = get_current_user()  # The user's ID and department, from the token
 
     data = request.get_json()
     new_guest = Guest(
@@ -37,8 +37,7 @@ def add_guest():
 @jwt_required()
 @requires_roles('Admin', 'Manager', 'Reception')
 def delete_guest(guest_id):
-    current_user_email = get_jwt_identity()  # Get the user's email from the token
-    user = User.query.filter_by(email=current_user_email).first()
+    user = get_current_user()  # The user's ID and department, from the token
 
     guest = Guest.query.get(guest_id)
     if guest:
@@ -58,8 +57,7 @@ def delete_guest(guest_id):
 @jwt_required()
 @requires_roles('Admin', 'Manager', 'Reception')
 def modify_guest(guest_id):
-    current_user_email = get_jwt_identity()  # Get the user's email from the token
-    user = User.query.filter_by(email=current_user_email).first()
+    user = get_current_user()  # The user's ID and department, from the token
 
     guest = Guest.query.get(guest_id)
     if not guest:
@@ -96,8 +94,9 @@ def get_guest(guest_id):
 @jwt_required()
 @requires_roles('Admin', 'Manager', 'Reception', 'Bar')
 def get_guests():
-    guests = Guest.query.all()
-    return jsonify([guest.to_dict() for guest in guests]), 200
+    # Paginated, projected, filtered and sorted on request; see pagination.model_list_response
+    return model_list_response(Guest, filters=(Guest.surname, Guest.email, Guest.phone),
+                               sorts=(Guest.surname, Guest.name))
 
 
 @guest_management_blueprint.route('/get_guests_by_ids', methods=['POST'])
@@ -135,6 +134,6 @@ def log_guest(guest, user_id, action):
               f"Phone: {guest.phone} | " \
               f"Email: {guest.email}"
 
-    logs.log_action(user_id, action, details)
+    logs.log_action(user_id, action, details, entity_type='guest', entity_id=guest.id, guest_id=guest.id)
 
 
@@ -0,0 +1,57 @@
+# instrumentation.py
+"""
+Lightweight database instrumentation.
+
+Counts the statements sent to the database while a block of code runs, so scheduled jobs and benchmark scripts
+can report how many round trips they cost.
+"""
+
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+
+class QueryStats:
+    """
+    Statement counter and wall-clock timer for a block of code.
+
+    Attributes:
+    queries (int): Number of statements executed on the engine.
+    elapsed (float): Wall time spent inside the block, in seconds.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.elapsed = 0.0
+
+    def to_dict(self):
+        return {
+            'queries': self.queries,
+            'elapsed_ms': round(self.elapsed * 1000, 2)
+        }
+
+
+@contextmanager
+def count_queries(engine):
+    """
+    Context manager counting the statements executed on 'engine' while the block runs.
+
+    Parameters:
+    engine (sqlalchemy.engine.Engine): The engine to listen on (usually db.engine).
+
+    Yields:
+    QueryStats: The counter, filled in as statements are executed.
+    """
+    stats = QueryStats()
+
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stats.queries += 1
+
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    started = time.perf_counter()
+    try:
+        yield stats
+    finally:
+        stats.elapsed = time.perf_counter() - started
+        event.remove(engine, 'before_cursor_execute', _before_cursor_execute)
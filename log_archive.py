@@ -0,0 +1,140 @@
+# log_archive.py
+"""
+Retention of the audit log.
+
+Entries older than the retention period are moved out of user_actions_log into compressed, append-only archive
+files on local disk, one per month of their timestamp: <AUDIT_LOG_ARCHIVE_DIR>/user_actions_log-YYYY-MM.ndjson.gz,
+one JSON object per line (UserActionLog.to_dict). Every archiving run appends a new gzip member to the files,
+which readers see as a single stream.
+
+Configuration (app.config):
+    AUDIT_LOG_RETENTION_DAYS (int): Age, in days, after which entries are archived. Defaults to 90.
+    AUDIT_LOG_ARCHIVE_DIR (str): Directory of the archive files. Defaults to 'log_archive'.
+"""
+
+import gzip
+import json
+import os
+import re
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+import logs
+from models import db
+
+DEFAULT_RETENTION_DAYS = 90
+DEFAULT_ARCHIVE_DIR = 'log_archive'
+ARCHIVE_FILE = re.compile(r'^user_actions_log-(\d{4})-(\d{2})\.ndjson\.gz$')
+
+
+def archive_dir():
+    return current_app.config.get('AUDIT_LOG_ARCHIVE_DIR', DEFAULT_ARCHIVE_DIR)
+
+
+def archive_path(year, month):
+    return os.path.join(archive_dir(), f'user_actions_log-{year:04d}-{month:02d}.ndjson.gz')
+
+
+def archived_months():
+    """The (year, month) of the existing archive files, in chronological order."""
+    if not os.path.isdir(archive_dir()):
+        return []
+    months = [ARCHIVE_FILE.match(name) for name in os.listdir(archive_dir())]
+    return sorted((int(match.group(1)), int(match.group(2))) for match in months if match)
+
+
+def archive_old_logs(retention_days=None, batch_size=10000):
+    """
+    Move the audit log entries older than the retention period to the archive files.
+
+    Each batch is appended (and synced) to the archive files before it is deleted from the table, so an
+    interrupted run never loses entries; at worst some are archived again by the next run, which the readers ignore.
+
+    Args:
+        retention_days (int): Age of the entries to archive, in days. Defaults to AUDIT_LOG_RETENTION_DAYS.
+        batch_size (int): Number of entries moved per transaction.
+
+    Returns:
+        int: The number of entries archived.
+    """
+    if retention_days is None:
+        retention_days = current_app.config.get('AUDIT_LOG_RETENTION_DAYS', DEFAULT_RETENTION_DAYS)
+    cutoff = datetime.now() - timedelta(days=retention_days)
+    os.makedirs(archive_dir(), exist_ok=True)
+
+    archived = 0
+    while True:
+        entries = logs.UserActionLog.query.filter(logs.UserActionLog.timestamp < cutoff) \
+            .order_by(logs.UserActionLog.id).limit(batch_size).all()
+        if not entries:
+            return archived
+
+        by_month = {}
+        for entry in entries:
+            by_month.setdefault((entry.timestamp.year, entry.timestamp.month), []).append(entry)
+
+        for (year, month), month_entries in by_month.items():
+            with open(archive_path(year, month), 'ab') as file:
+                with gzip.GzipFile(fileobj=file, mode='ab') as archive:
+                    for entry in month_entries:
+                        archive.write((json.dumps(entry.to_dict(), default=str) + '\n').encode())
+                file.flush()
+                os.fsync(file.fileno())
+
+        logs.UserActionLog.query.filter(logs.UserActionLog.id.in_([entry.id for entry in entries])) \
+            .delete(synchronize_session=False)
+        db.session.commit()
+        archived += len(entries)
+
+
+def read_archived_logs(start_date=None, end_date=None, matches=None, after=None, descending=False):
+    """
+    Read the archived audit log entries, in (timestamp, id) order.
+
+    Args:
+        start_date (datetime), end_date (datetime): Only the entries in this range (inclusive), if given.
+        matches (callable): Only the entries (dicts) for which it returns True, if given.
+        after (tuple): Only the entries whose (timestamp, id) come after these values in the reading order.
+        descending (bool): Read from the newest entry to the oldest.
+
+    Only the files of the months overlapping the range (and the cursor) are opened. Each is read whole, so
+    the memory used is that of one month of entries.
+
+    Yields:
+        dict: The archived entries, as UserActionLog.to_dict.
+    """
+    low, high = start_date, end_date
+    if after is not None and after[0] is not None:
+        if descending:
+            high = min(high, after[0]) if high else after[0]
+        else:
+            low = max(low, after[0]) if low else after[0]
+
+    months = archived_months()
+    if low:
+        months = [month for month in months if month >= (low.year, low.month)]
+    if high:
+        months = [month for month in months if month <= (high.year, high.month)]
+
+    for year, month in (reversed(months) if descending else months):
+        entries = {}
+        with gzip.open(archive_path(year, month), 'rt') as archive:
+            for line in archive:
+                entry = json.loads(line)
+                entries[entry['id']] = entry  # An entry archived twice is read once
+
+        keyed = []
+        for entry in entries.values():
+            key = (datetime.fromisoformat(entry['timestamp']), entry['id'])
+            if (start_date and key[0] < start_date) or (end_date and key[0] > end_date):
+                continue
+            if after is not None and (key >= after if descending else key <= after):
+                continue
+            if matches is None or matches(entry):
+                keyed.append((key, entry))
+
+        keyed.sort(key=lambda item: item[0], reverse=descending)
+        for key, entry in keyed:
+            yield entry
+
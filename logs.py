@@ -1,9 +1,21 @@
+import atexit
+import json
+import queue
+import re
+import threading
+import time
+
+import click
 import pytz
 from flask import Blueprint, jsonify, request
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from models import db, Reservation, Balance, User  # Import the Reservation model from models.py
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, insert, text, select, literal_column, table, update, inspect, bindparam
+
+import log_archive
+from pagination import list_response
+from serialization import model_serializer
 
 logging_blueprint = Blueprint('logging', __name__)
 
@@ -16,11 +28,33 @@ class UserActionLog(db.Model):
     details = db.Column(db.Text, nullable=True, default=None)
     timestamp = db.Column(db.DateTime, default=datetime.now())
 
-    def __init__(self, user_id, action, details=None):
+    # Entity the action was performed on, and the reservation / room / guest it concerns (no foreign keys:
+    # the log outlives the entities). 'payload' holds the logged values as JSON.
+    entity_type = db.Column(db.String(50), nullable=True)
+    entity_id = db.Column(db.Integer, nullable=True)
+    room_id = db.Column(db.Integer, nullable=True)
+    reservation_id = db.Column(db.Integer, nullable=True)
+    guest_id = db.Column(db.Integer, nullable=True)
+    payload = db.Column(db.JSON, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_user_actions_log_entity', 'entity_type', 'entity_id', 'timestamp'),
+        db.Index('ix_user_actions_log_reservation', 'reservation_id', 'timestamp'),
+        db.Index('ix_user_actions_log_room', 'room_id', 'timestamp'),
+        db.Index('ix_user_actions_log_guest', 'guest_id', 'timestamp'),
+        # Serve the listings in keyset order (timestamp, id): all logs and date ranges, by user, by action
+        db.Index('ix_user_actions_log_timestamp', 'timestamp', 'id'),
+        db.Index('ix_user_actions_log_user_timestamp', 'user_id', 'timestamp', 'id'),
+        db.Index('ix_user_actions_log_action_timestamp', 'action', 'timestamp', 'id'),
+    )
+
+    def __init__(self, user_id, action, details=None, **entity):
         self.user_id = user_id
         self.action = action
         self.details = details
         self.timestamp = datetime.now(pytz.timezone('Europe/Athens'))
+        for column, value in entity.items():
+            setattr(self, column, value)
 
     def to_dict(self):
         """Convert the UserActionLog object to a dictionary."""
@@ -29,17 +63,358 @@ class UserActionLog(db.Model):
             'user_id': self.user_id,
             'action': self.action,
             'details': self.details,
-            'timestamp': self.timestamp.isoformat() if self.timestamp else None
+            'timestamp': self.timestamp.isoformat() if self.timestamp else None,
+            'entity_type': self.entity_type,
+            'entity_id': self.entity_id,
+            'room_id': self.room_id,
+            'reservation_id': self.reservation_id,
+            'guest_id': self.guest_id,
+            'payload': self.payload
+        }
+
+
+# Columns of the entity a log entry refers to, see UserActionLog
+ENTITY_COLUMNS = ('entity_type', 'entity_id', 'room_id', 'reservation_id', 'guest_id', 'payload')
+
+
+def log_entry_entity(entity_type=None, entity_id=None, room_id=None, reservation_id=None, guest_id=None,
+                     payload=None):
+    """
+    Build the entity columns of a log entry.
+
+    Args:
+        entity_type (str): The kind of entity the action was performed on, e.g. 'reservation', 'balance'.
+        entity_id (int): The ID of that entity.
+        room_id (int), reservation_id (int), guest_id (int): The room, reservation and guest concerned, if any.
+        payload (dict): The logged values. Dates and decimals are stored as strings.
+
+    Returns:
+        dict: The values of the ENTITY_COLUMNS.
+    """
+    if payload is not None:
+        payload = json.loads(json.dumps(payload, default=str))
+    return {
+        'entity_type': entity_type,
+        'entity_id': entity_id,
+        'room_id': room_id,
+        'reservation_id': reservation_id,
+        'guest_id': guest_id,
+        'payload': payload
+    }
+
+
+class AuditLogWriter:
+    """
+    Background writer for the audit log.
+
+    Log entries are put on a bounded in-process queue and a flusher thread writes them in batches, with a single
+    multi-row INSERT every 'flush_interval_ms' or every 'batch_size' entries, whichever comes first.
+    Entries are dropped (and counted) when the queue is full, so logging never blocks a request.
+    """
+
+    def __init__(self, app, max_queue_size=10000, flush_interval_ms=500, batch_size=500):
+        self.app = app
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = batch_size
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self._lock = threading.Lock()  # Serializes writes between the flusher thread and explicit flushes
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the flusher thread and write the entries still queued."""
+        self._stopping.set()
+        if self._thread:
+            self._thread.join(timeout=max(self.flush_interval * 2, 1))
+        self.flush()
+
+    def enqueue(self, entry):
+        """Queue a log entry (a dict of UserActionLog column values). Returns False if it was dropped."""
+        try:
+            self.queue.put_nowait(entry)
+            self.enqueued += 1
+            return True
+        except queue.Full:
+            self.dropped += 1
+            print("Audit log queue full, dropping entry:", entry['action'])
+            return False
+
+    def flush(self):
+        """Write every queued entry now."""
+        while True:
+            batch = self._take(block=False)
+            if not batch:
+                return
+            self._write(batch)
+
+    def stats(self):
+        return {
+            'queue_depth': self.queue.qsize(),
+            'queue_capacity': self.queue.maxsize,
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'batches': self.batches
         }
 
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._take(block=True)
+            if batch:
+                self._write(batch)
+
+    def _take(self, block):
+        """Take up to batch_size entries, waiting at most flush_interval for them when blocking."""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                if block:
+                    batch.append(self.queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                else:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        with self._lock:
+            try:
+                with self.app.app_context():
+                    with db.engine.begin() as connection:
+                        connection.execute(insert(UserActionLog.__table__), batch)
+                self.written += len(batch)
+                self.batches += 1
+            except Exception as e:
+                self.failed += len(batch)
+                print("Failed to write audit log batch:", e)
+
+
+# Background writer, when enabled with init_audit_log_writer(). Otherwise log_action writes synchronously.
+audit_log_writer = None
+
+
+def init_audit_log_writer(app):
+    """
+    Start the background audit log writer for the application.
+
+    Configuration (app.config):
+        AUDIT_LOG_ASYNC (bool): Enable the background writer. Defaults to True. When False (e.g. in tests),
+            log_action keeps writing each entry synchronously.
+        AUDIT_LOG_QUEUE_SIZE (int): Maximum number of queued entries. Defaults to 10000.
+        AUDIT_LOG_FLUSH_INTERVAL_MS (int): Maximum delay before queued entries are written. Defaults to 500.
+        AUDIT_LOG_BATCH_SIZE (int): Maximum number of entries per INSERT. Defaults to 500.
+
+    The queued entries are flushed when the process exits.
+    """
+    global audit_log_writer
+
+    if not app.config.get('AUDIT_LOG_ASYNC', True) or audit_log_writer is not None:
+        return audit_log_writer
+
+    audit_log_writer = AuditLogWriter(
+        app,
+        max_queue_size=app.config.get('AUDIT_LOG_QUEUE_SIZE', 10000),
+        flush_interval_ms=app.config.get('AUDIT_LOG_FLUSH_INTERVAL_MS', 500),
+        batch_size=app.config.get('AUDIT_LOG_BATCH_SIZE', 500)
+    )
+    audit_log_writer.start()
+    atexit.register(shutdown_audit_log_writer)  # Flush on shutdown
+    return audit_log_writer
+
+
+def shutdown_audit_log_writer():
+    """Flush and stop the background audit log writer; log_action goes back to synchronous writes."""
+    global audit_log_writer
+
+    writer, audit_log_writer = audit_log_writer, None
+    if writer is not None:
+        writer.stop()
+
+
+# Full-text index of the log details on SQLite: an FTS5 table with the trigram tokenizer, kept in sync with
+# user_actions_log by triggers. On Postgres, a pg_trgm GIN index on the details column plays the same role.
+LOG_SEARCH_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS user_actions_log_fts USING fts5("
+    "details, content='user_actions_log', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS user_actions_log_fts_insert AFTER INSERT ON user_actions_log BEGIN "
+    "INSERT INTO user_actions_log_fts(rowid, details) VALUES (new.id, new.details); END",
+    "CREATE TRIGGER IF NOT EXISTS user_actions_log_fts_delete AFTER DELETE ON user_actions_log BEGIN "
+    "INSERT INTO user_actions_log_fts(user_actions_log_fts, rowid, details) VALUES ('delete', old.id, old.details); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS user_actions_log_fts_update AFTER UPDATE OF details ON user_actions_log BEGIN "
+    "INSERT INTO user_actions_log_fts(user_actions_log_fts, rowid, details) VALUES ('delete', old.id, old.details); "
+    "INSERT INTO user_actions_log_fts(rowid, details) VALUES (new.id, new.details); END",
+    "INSERT INTO user_actions_log_fts(user_actions_log_fts) VALUES ('rebuild')",
+]
+
+# Whether the SQLite full-text index exists, by database URL
+_log_search_fts = {}
+
+
+def create_log_search_index(concurrently=False):
+    """
+    Create the index serving the details search.
+
+    On Postgres, a pg_trgm GIN index on user_actions_log.details, which serves LIKE '%...%' and word-prefix
+    regex searches. On SQLite, an FTS5 trigram table filled from the existing logs and kept in sync by triggers.
+
+    Args:
+        concurrently (bool): On Postgres, build the index with CREATE INDEX CONCURRENTLY, outside of a
+            transaction, so the log stays writable meanwhile.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        create_index = 'CREATE INDEX CONCURRENTLY IF NOT EXISTS' if concurrently else 'CREATE INDEX IF NOT EXISTS'
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+            connection.execute(text(
+                f'{create_index} ix_user_actions_log_details_trgm ON user_actions_log USING gin (details gin_trgm_ops)'
+            ))
+    elif db.engine.dialect.name == 'sqlite':
+        with db.engine.begin() as connection:
+            for statement in LOG_SEARCH_FTS_DDL:
+                connection.execute(text(statement))
+        _log_search_fts[str(db.engine.url)] = True
+
+
+def _has_log_search_fts():
+    """True if the SQLite full-text index of the log details exists."""
+    if db.engine.dialect.name != 'sqlite':
+        return False
+
+    url = str(db.engine.url)
+    if url not in _log_search_fts:
+        _log_search_fts[url] = db.session.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE name = 'user_actions_log_fts'"
+        )).first() is not None
+    return _log_search_fts[url]
+
+
+def details_prefix_pattern(term):
+    """
+    The regex of a 'prefix' details search term: a word starting with the term, whatever its case.
+
+    The same pattern is run by Postgres (~, where (?i) is an embedded option), by SQLite (REGEXP, the Python re
+    function installed by SQLAlchemy's pysqlite dialect) and by details_matches, so the three agree on the word
+    boundaries (start of the text or any non-word character, punctuation included) and on the case.
+    """
+    return r'(?i)(^|\W)' + term
+
+
+def filter_logs_by_details(query, details, match='substring'):
+    """
+    Filter a log query on its details.
+
+    Args:
+        query (Query): The UserActionLog query to filter.
+        details (str): The text searched for.
+        match (str): 'substring' (default) keeps the logs whose details contain the text, in any case (ILIKE
+            '%text%', with the wildcards of the text taken literally). 'prefix' keeps the logs with a word
+            starting with each word of the text, in any case (see details_prefix_pattern).
+
+    details_matches implements the same definitions, for the archived entries.
+
+    On Postgres, both are served by the pg_trgm index. On SQLite, the candidate logs are first looked up in the
+    FTS5 trigram index (for terms of 3 characters or more, the trigram length).
+    """
+    terms = set(re.findall(r'\w+', details)) if match == 'prefix' else set()
+
+    use_fts = _has_log_search_fts()
+    for pattern in [f'%{term}%' for term in terms] or [f'%{details}%']:
+        if use_fts and len(pattern) >= 5:
+            query = query.filter(UserActionLog.id.in_(
+                select(literal_column('rowid')).select_from(table('user_actions_log_fts'))
+                .where(literal_column('details').like(pattern))
+            ))
+
+    if not terms:
+        return query.filter(UserActionLog.details.icontains(details, autoescape=True))
+
+    for term in terms:
+        query = query.filter(UserActionLog.details.regexp_match(details_prefix_pattern(term)))
+    return query
+
+
+def details_matches(entry_details, details, match='substring'):
+    """
+    The filter_logs_by_details test, for a log entry read outside of the database (e.g. from the archive): the
+    same definitions of the 'substring' and 'prefix' matches, in Python.
+    """
+    entry_details = entry_details or ''
+    terms = re.findall(r'\w+', details) if match == 'prefix' else []
+    if terms:
+        return all(re.search(details_prefix_pattern(term), entry_details) for term in terms)
+    return details.lower() in entry_details.lower()
+
+
+# Keyset of the log listings: chronological, ties broken by ID
+LOG_KEY_COLUMNS = (UserActionLog.timestamp, UserActionLog.id)
+
+
+def log_list_response(query, archived=None):
+    """
+    The list_response of a log listing, whose rows are selected as columns and serialized like
+    UserActionLog.to_dict (see serialization.py).
+    """
+    serializer = model_serializer(UserActionLog)
+    return list_response(query.with_entities(*serializer.columns), LOG_KEY_COLUMNS, serializer, archived)
+
+
+def log_entry_values(user_id, action, details=None, **entity):
+    """
+    Build the column values of a log entry, for the batched INSERTs (see AuditLogWriter, and
+    notifications_management.upsert_notifications).
+
+    Args:
+        As log_action.
+
+    Returns:
+        dict: The values of the user_actions_log columns.
+    """
+    return {
+        'user_id': user_id,
+        'action': action,
+        'details': details,
+        'timestamp': datetime.now(pytz.timezone('Europe/Athens')),
+        **log_entry_entity(**entity)
+    }
+
+
+def log_action(user_id, action, details=None, **entity):
+    """
+    Write an audit log entry.
+
+    Args:
+        user_id (int): The ID of the user performing the action (0 for the SYSTEM user).
+        action (str): The action performed.
+        details (str): Human readable details of the action.
+        **entity: The entity the action concerns, see log_entry_entity (entity_type, entity_id, room_id,
+            reservation_id, guest_id, payload).
+    """
+    # Queue the entry for the background writer, if running
+    if audit_log_writer is not None:
+        audit_log_writer.enqueue(log_entry_values(user_id, action, details, **entity))
+        return
+
+    entity = log_entry_entity(**entity)
 
-def log_action(user_id, action, details=None):
     # Create a new log entry using the UserActionLog model
     new_log = UserActionLog(
         user_id=user_id,
         # user_id=6,  # TODO: Remove this hard-coded value
         action=action,
         details=details,
+        **entity
     )
 
     # Add the new log entry to the database and commit the changes
@@ -52,28 +427,86 @@ def log_action(user_id, action, details=None):
         print("Failed to log action:", e)
 
 
+@logging_blueprint.route('/writer_stats', methods=['GET'])
+def get_writer_stats():
+    """Metrics of the background audit log writer (queue depth, written, dropped and failed entries)."""
+    if audit_log_writer is None:
+        return jsonify({'async': False}), 200
+    return jsonify({'async': True, **audit_log_writer.stats()}), 200
+
+
+def archived_logs(start_date=None, end_date=None, matches=None, **columns):
+    """
+    The archived source of a log listing (see pagination.list_response): the archived entries in the date
+    range whose columns have the given values, and for which matches returns True.
+
+    Reading the archive opens and decompresses its monthly files, so it is only merged in when the listing is
+    date-bounded (only the files of the months in the range are opened, see log_archive.read_archived_logs)
+    or when the request asks for it with 'include_archived=true'. Returns None otherwise.
+    """
+    include_archived = request.args.get('include_archived', 'false').lower() in ('1', 'true', 'yes')
+    if not (start_date or end_date) and not include_archived:
+        return None
+
+    def entry_matches(entry):
+        if any(entry.get(column) != value for column, value in columns.items()):
+            return False
+        return matches is None or matches(entry)
+
+    def archived(after, descending):
+        return log_archive.read_archived_logs(start_date, end_date, entry_matches, after, descending)
+
+    return archived
+
+
+def filtered_log_list_response(**columns):
+    """The log_list_response of the entries whose columns have the given values (and archived, see archived_logs)."""
+    return log_list_response(UserActionLog.query.filter_by(**columns), archived_logs(**columns))
+
+
+# The log listings below accept 'limit' / 'cursor' (keyset pagination on timestamp, id), 'order=desc' and
+# 'format=ndjson' (streaming); see pagination.list_response. Without them they return the full JSON list.
+# With a date range or 'include_archived=true', they include the archived entries (see log_archive.py), which
+# come before the ones of the table.
 @logging_blueprint.route('/get_logs', methods=['GET'])
 def get_all_logs():
-    logs = UserActionLog.query.all()
-    return jsonify([log.to_dict() for log in logs]), 200
+    return filtered_log_list_response()
 
 
 @logging_blueprint.route('/user/<int:user_id>', methods=['GET'])
 def get_logs_for_user(user_id):
-    logs = UserActionLog.query.filter_by(user_id=user_id).all()
-    return jsonify([log.to_dict() for log in logs]), 200
+    return filtered_log_list_response(user_id=user_id)
 
 
 @logging_blueprint.route('/action/<string:action>', methods=['GET'])
 def get_logs_for_action(action):
-    logs = UserActionLog.query.filter_by(action=action).all()
-    return jsonify([log.to_dict() for log in logs]), 200
+    return filtered_log_list_response(action=action)
 
 
 @logging_blueprint.route('/user/<int:user_id>/action/<string:action>', methods=['GET'])
 def get_logs_for_user_and_action(user_id, action):
-    logs = UserActionLog.query.filter_by(user_id=user_id, action=action).all()
-    return jsonify([log.to_dict() for log in logs]), 200
+    return filtered_log_list_response(user_id=user_id, action=action)
+
+
+# Logs of one entity, or concerning one reservation, room or guest: index lookups on the entity columns
+@logging_blueprint.route('/entity/<string:entity_type>/<int:entity_id>', methods=['GET'])
+def get_logs_for_entity(entity_type, entity_id):
+    return filtered_log_list_response(entity_type=entity_type, entity_id=entity_id)
+
+
+@logging_blueprint.route('/reservation/<int:reservation_id>', methods=['GET'])
+def get_logs_for_reservation(reservation_id):
+    return filtered_log_list_response(reservation_id=reservation_id)
+
+
+@logging_blueprint.route('/room/<int:room_id>', methods=['GET'])
+def get_logs_for_room(room_id):
+    return filtered_log_list_response(room_id=room_id)
+
+
+@logging_blueprint.route('/guest/<int:guest_id>', methods=['GET'])
+def get_logs_for_guest(guest_id):
+    return filtered_log_list_response(guest_id=guest_id)
 
 
 @logging_blueprint.route('/actions', methods=['GET'])
@@ -91,8 +524,8 @@ def get_logs_for_date_range(start_date, end_date):
     end_date = datetime.strptime(end_date, '%Y-%m-%d')
 
     # Get the logs for the date range
-    logs = UserActionLog.query.filter(UserActionLog.timestamp >= start_date, UserActionLog.timestamp <= end_date).all()
-    return jsonify([log.to_dict() for log in logs]), 200
+    query = UserActionLog.query.filter(UserActionLog.timestamp >= start_date, UserActionLog.timestamp <= end_date)
+    return log_list_response(query, archived_logs(start_date, end_date))
 
 
 # Get logs for user and date range
@@ -103,9 +536,9 @@ def get_logs_for_user_and_date_range(user_id, start_date, end_date):
     end_date = datetime.strptime(end_date, '%Y-%m-%d')
 
     # Get the logs for the date range
-    logs = UserActionLog.query.filter(UserActionLog.timestamp >= start_date, UserActionLog.timestamp <= end_date,
-                                      UserActionLog.user_id == user_id).all()
-    return jsonify([log.to_dict() for log in logs]), 200
+    query = UserActionLog.query.filter(UserActionLog.timestamp >= start_date, UserActionLog.timestamp <= end_date,
+                                       UserActionLog.user_id == user_id)
+    return log_list_response(query, archived_logs(start_date, end_date, user_id=user_id))
 
 
 @logging_blueprint.route('/search_logs', methods=['GET'])
@@ -116,6 +549,14 @@ def search_logs():
     action = request.args.get('action')
     user_id = request.args.get('user_id', type=int)
     details = request.args.get('details')
+    details_match = request.args.get('details_match', 'substring')  # 'substring' or 'prefix'
+    entity_filters = {
+        'entity_type': request.args.get('entity_type'),
+        'entity_id': request.args.get('entity_id', type=int),
+        'room_id': request.args.get('room_id', type=int),
+        'reservation_id': request.args.get('reservation_id', type=int),
+        'guest_id': request.args.get('guest_id', type=int)
+    }
 
     # Convert dates to datetime objects
     if start_date:
@@ -138,16 +579,115 @@ def search_logs():
     if user_id == 0:
         query = query.filter(UserActionLog.user_id == user_id)
 
-
-
+    for column, value in entity_filters.items():
+        if value is not None:
+            query = query.filter(getattr(UserActionLog, column) == value)
 
     if details:
-        query = query.filter(UserActionLog.details.like(f'%{details}%'))
-
-    # Execute the query
-    logs = query.all()
+        query = filter_logs_by_details(query, details, details_match)
+
+    # The same filters, over the archived entries
+    def archived_entry_matches(entry):
+        if action and action != 'All Actions' and entry['action'] != action:
+            return False
+        if user_id is not None and user_id >= 0 and entry['user_id'] != user_id:
+            return False
+        if any(value is not None and entry.get(column) != value for column, value in entity_filters.items()):
+            return False
+        return not details or details_matches(entry['details'], details, details_match)
+
+    archived = archived_logs(start_date if end_date else None, end_date if start_date else None,
+                             archived_entry_matches)
+
+    # Execute the query over the hot table and the archive: full list, keyset-paginated page or NDJSON stream
+    return log_list_response(query, archived)
+
+
+# Entity columns of the entries written before they existed, read back from the details strings
+# (pattern, entity type, columns filled by each group of the pattern)
+LEGACY_DETAILS_ENTITIES = [
+    (re.compile(r'^Reservation Id: (\d+) \| Room: (\d+)'), 'reservation',
+     (('entity_id', 'reservation_id'), ('room_id',))),
+    (re.compile(r'^Entry: (\d+) \| Reservation: (\d+)'), 'balance', (('entity_id',), ('reservation_id',))),
+    (re.compile(r'^Action: (\d+) :'), 'cleaning_action', (('entity_id',),)),
+]
+LEGACY_ACTION_ENTITIES = [('Notification', 'notification'), ('Guest', 'guest'), ('MenuItem', 'menu_item'),
+                          ('User', 'user')]
+LEGACY_ID = re.compile(r'^ID: (\d+) \|')
+
+
+# Columns filled from the details of the legacy entries (all but the payload)
+LEGACY_ENTITY_COLUMNS = ENTITY_COLUMNS[:-1]
+
+
+def legacy_log_entity(action, details):
+    """Parse the entity columns of a log entry written before they existed. Returns None if not recognized."""
+    for pattern, entity_type, group_columns in LEGACY_DETAILS_ENTITIES:
+        match = pattern.match(details or '')
+        if match:
+            entity = {'entity_type': entity_type}
+            for columns, value in zip(group_columns, match.groups()):
+                entity.update(dict.fromkeys(columns, int(value)))
+            return entity
+
+    match = LEGACY_ID.match(details or '')
+    if match:
+        for keyword, entity_type in LEGACY_ACTION_ENTITIES:
+            if keyword in action:
+                entity = {'entity_type': entity_type, 'entity_id': int(match.group(1))}
+                if entity_type == 'guest':
+                    entity['guest_id'] = entity['entity_id']
+                return entity
+    return None
+
+
+def upgrade_log_entity_columns(batch_size=10000):
+    """
+    Add the entity columns and their indexes to an existing user_actions_log table, then fill them for the
+    entries written before, from their details.
+
+    Returns:
+        int: The number of entries filled.
+    """
+    log_table = UserActionLog.__table__
+    existing = {column['name'] for column in inspect(db.engine).get_columns(log_table.name)}
+    with db.engine.begin() as connection:
+        for name in ENTITY_COLUMNS:
+            if name not in existing:
+                column_type = log_table.c[name].type.compile(dialect=db.engine.dialect)
+                connection.execute(text(f'ALTER TABLE {log_table.name} ADD COLUMN {name} {column_type}'))
+        for index in log_table.indexes:
+            index.create(connection, checkfirst=True)
+
+    filled = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(UserActionLog.id, UserActionLog.action, UserActionLog.details)
+            .where(UserActionLog.id > last_id, UserActionLog.entity_type.is_(None))
+            .order_by(UserActionLog.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        # One executemany UPDATE per batch, whose parameter sets all have the same keys
+        updates = []
+        for row in rows:
+            entity = legacy_log_entity(row.action, row.details)
+            if entity:
+                updates.append({'log_id': row.id, **dict.fromkeys(LEGACY_ENTITY_COLUMNS), **entity})
+        if updates:
+            db.session.execute(update(log_table).where(log_table.c.id == bindparam('log_id')), updates)
+            filled += len(updates)
+        db.session.commit()
+    return filled
 
-    # Convert logs to a JSON serializable format
-    logs_list = [log.to_dict() for log in logs]  # Ensure you have a to_dict method in your UserActionLog model
 
-    return jsonify(logs_list), 200
+@logging_blueprint.cli.command('archive')
+@click.option('--retention-days', type=int, default=None,
+              help='Archive the entries older than this (defaults to AUDIT_LOG_RETENTION_DAYS)')
+def archive_command(retention_days):
+    """Move the audit log entries older than the retention period to the archive files."""
+    archived = log_archive.archive_old_logs(retention_days)
+    click.echo(f"{archived} log entries archived")
@@ -8,11 +8,14 @@ allowing only authorized personnel (like Admin and Manager) to make changes to t
 """
 
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity  # Will be used later
+from flask_jwt_extended import jwt_required
 
 import logs
-from auth import requires_roles  # Will be used later
-from models import db, MenuCategory, MenuItem, Balance, Reservation, Room, User, Guest
+from auth import requires_roles, get_current_user  # Will be used later
+from reservations_management import update_reservation_folio
+from models import db, MenuCategory, MenuItem, Balance, Reservation, Room, Guest
+from pagination import model_list_response
+from serialization import select_dicts
 
 menu_management_blueprint = Blueprint('menu_management', __name__)
 
@@ -32,8 +35,7 @@ def create_category():
         - JSON response with error message and status code 400 if category name is missing.
         - JSON response with error message and status code 500 on server error.
     """
-    current_user_email = get_jwt_identity()  # Get the user's email from the token
-    user = User.query.filter_by(email=current_user_email).first()
+    user = get_current_user()  # The user's ID and department, from the token
 
     data = request.get_json()
     name = data.get('name')
@@ -73,8 +75,7 @@ def remove_category(category_id):
         - JSON response with error message and status code 404 if category is not found.
         - JSON response with error message and status code 500 on server error.
     """
-    current_user_email = get_jwt_identity()  # Get the user's email from the token
-    user = User.query.filter_by(email=current_user_email).first()
+    user = get_current_user()  # The user's ID and department, from the token
 
     category = MenuCategory.query.get(category_id)
     if category:
@@ -108,8 +109,7 @@ def modify_category(category_id):
         - JSON response with error message and status code 404 if the category is not found.
         - JSON response with error message and status code 500 on server error.
     """
-    current_user_email = get_jwt_identity()  # Get the user's email from the token
-    user = User.query.filter_by(email=current_user_email).first()
+    user = get_current_user()  # The user's ID and department, from the token
 
     category = MenuCategory.query.get(category_id)
     if category:
@@ -162,8 +162,7 @@ def create_item():
         - JSON response with error message and status code 400 if required data is missing.
         - JSON response with error message and status code 500 on server error.
     """
-    current_user_email = get_jwt_identity()  # Get the user's email from the token
-    user = User.query.filter_by(email=current_user_email).first()
+    user = get_current_user()  # The user's ID and department, from the token
 
     data = request.get_json()
     name = data.get('name')
@@ -205,8 +204,7 @@ def remove_item(item_id):
         - JSON response with error message and status code 404 if item is not found.
         - JSON response with error message and status code 500 on server error.
     """
-    current_user_email = get_jwt_identity()  # Get the user's email from the token
-    user = User.query.filter_by(email=current_user_email).first()
+    user = get_current_user()  # The user's ID and department, from the token
 
     item = MenuItem.query.get(item_id)
     if item:
@@ -242,8 +240,7 @@ def modify_item(item_id):
         - JSON response with error message and status code 500 on server error.
     """
 
-    current_user_email = get_jwt_identity()  # Get the user's email from the token
-    user = User.query.filter_by(email=current_user_email).first()
+    user = get_current_user()  # The user's ID and department, from the token
 
     item = MenuItem.query.get(item_id)
     if item:
@@ -352,8 +349,7 @@ def create_balance_entry():
         - JSON response with error message and status code 500 on server error.
     """
 
-    current_user_email = get_jwt_identity()  # Get the user's email from the token
-    user = User.query.filter_by(email=current_user_email).first()
+    user = get_current_user()  # The user's ID and department, from the token
 
     data = request.get_json()
     reservation_id = data.get('reservation_id')
@@ -374,6 +370,8 @@ def create_balance_entry():
 
     try:
         db.session.add(new_balance_entry)
+        db.session.flush()
+        update_reservation_folio(reservation_id, menu_item_id, amount)  # Same transaction as the entry
         db.session.commit()
         print("new_balance_entry.id: ", new_balance_entry.id)
         # Determine the action type
@@ -398,12 +396,15 @@ def get_balance_entries():
     This endpoint handles GET requests to fetch all balance entries.
     It is typically used for administrative and management purposes.
 
+    Accepts the list parameters of pagination.model_list_response: 'limit' / 'cursor', 'fields', 'format=ndjson',
+    and filters on reservation_id, menu_item_id and transaction_timestamp (e.g. 'transaction_timestamp_from').
+
     Returns:
         - JSON response with a list of balance entries and status code 200 on success.
-        - JSON response with error message and status code 500 on server error.
+        - JSON response with error message and status code 400 on an invalid list parameter.
     """
-    balance_entries = Balance.query.all()
-    return jsonify([entry.to_dict() for entry in balance_entries]), 200
+    return model_list_response(Balance, filters=(Balance.reservation_id, Balance.menu_item_id,
+                                                 Balance.transaction_timestamp))
 
 
 @menu_management_blueprint.route('/get_balance_entries/<int:reservation_id>', methods=['GET'])
@@ -422,9 +423,9 @@ def get_balance_entries_for_reservation(reservation_id):
         - JSON response with a list of balance entries for the reservation and status code 200 on success.
         - JSON response with error message and status code 404 if no entries are found for the reservation.
     """
-    balance_entries = Balance.query.filter_by(reservation_id=reservation_id).all()
+    balance_entries = select_dicts(Balance, Balance.reservation_id == reservation_id)
     if balance_entries:
-        return jsonify([entry.to_dict() for entry in balance_entries]), 200
+        return jsonify(balance_entries), 200
     else:
         return jsonify({"msg": "No balance entries found for the given reservation ID"}), 404
 
@@ -447,13 +448,14 @@ def remove_balance_entry(balance_entry_id):
         - JSON response with error message and status code 500 on server error.
     """
 
-    current_user_email = get_jwt_identity()  # Get the user's email from the token
-    user = User.query.filter_by(email=current_user_email).first()
+    user = get_current_user()  # The user's ID and department, from the token
 
     balance_entry = Balance.query.get(balance_entry_id)
     if balance_entry:
         try:
             db.session.delete(balance_entry)
+            db.session.flush()
+            update_reservation_folio(balance_entry.reservation_id, balance_entry.menu_item_id, -balance_entry.amount)
             db.session.commit()
 
             # Determine the action type
@@ -487,11 +489,13 @@ def modify_balance_entry(balance_entry_id):
         - JSON response with error message and status code 500 on server error.
     """
 
-    current_user_email = get_jwt_identity()  # Get the user's email from the token
-    user = User.query.filter_by(email=current_user_email).first()
+    user = get_current_user()  # The user's ID and department, from the token
 
     balance_entry = Balance.query.get(balance_entry_id)
     if balance_entry:
+        # Values before the change, to take them out of the folio
+        previous_entry = (balance_entry.reservation_id, balance_entry.menu_item_id, balance_entry.amount)
+
         data = request.get_json()
         reservation_id = data.get('reservation_id')
         menu_item_id = data.get('menu_item_id')
@@ -505,6 +509,9 @@ def modify_balance_entry(balance_entry_id):
             balance_entry.amount = amount
 
         try:
+            db.session.flush()
+            update_reservation_folio(previous_entry[0], previous_entry[1], -previous_entry[2])
+            update_reservation_folio(balance_entry.reservation_id, balance_entry.menu_item_id, balance_entry.amount)
             db.session.commit()
             # Determine the action type
             action = "Modify"
@@ -536,8 +543,7 @@ def add_payment():
         - JSON response with error message and status code 400 if required data is missing or invalid.
         - JSON response with error message and status code 500 on server error.
     """
-    current_user_email = get_jwt_identity()  # Get the user's email from the token
-    user = User.query.filter_by(email=current_user_email).first()
+    user = get_current_user()  # The user's ID and department, from the token
 
     data = request.get_json()
     reservation_id = data.get('reservation_id')
@@ -563,6 +569,8 @@ def add_payment():
         new_balance_entry = Balance(reservation_id=reservation_id, menu_item_id=menu_item_id, amount=payment_amount)
 
         db.session.add(new_balance_entry)
+        db.session.flush()
+        update_reservation_folio(reservation_id, menu_item_id, payment_amount)  # Same transaction as the entry
         db.session.commit()
 
         # Determine the action type
@@ -580,49 +588,61 @@ def add_payment():
 
 
 def log_balance_entry(balance_entry, user_id, action):
-    menu_item = MenuItem.query.get(balance_entry.menu_item_id)
-    reservation = Reservation.query.get(balance_entry.reservation_id)
-    room = Room.query.get(reservation.room_id)
-    guest = Guest.query.get(reservation.guest_id)
+    # Names of the room, guest and item, and the entity columns of the reservation, in one query
+    names = db.session.query(
+        Reservation.room_id, Reservation.guest_id, Room.room_name, Guest.name, Guest.surname, MenuItem.name
+    ).outerjoin(Room, Room.id == Reservation.room_id) \
+        .outerjoin(Guest, Guest.id == Reservation.guest_id) \
+        .outerjoin(MenuItem, MenuItem.id == balance_entry.menu_item_id) \
+        .filter(Reservation.id == balance_entry.reservation_id).first()
+    room_id, guest_id, room_name, guest_name, guest_surname, item_name = names or (None,) * 6
     details = ""
+    entity = {'entity_type': 'balance', 'entity_id': balance_entry.id, 'reservation_id': balance_entry.reservation_id,
+              'room_id': room_id, 'guest_id': guest_id}
 
-    if menu_item.id > 0:
+    if balance_entry.menu_item_id > 0:
         action += " Order"
+        price = balance_entry.amount / balance_entry.number_of_items
         details = f"Entry: {balance_entry.id} | " \
-                  f"Reservation: {reservation.id} | " \
-                  f"Room: {room.room_name} | " \
-                  f"Guest: {guest.name} {guest.surname} | " \
-                  f"Item: {menu_item.name} | " \
+                  f"Reservation: {balance_entry.reservation_id} | " \
+                  f"Room: {room_name} | " \
+                  f"Guest: {guest_name} {guest_surname} | " \
+                  f"Item: {item_name} | " \
                   f"Quantity: {balance_entry.number_of_items} | " \
-                  f"Price: {balance_entry.amount / balance_entry.number_of_items} | " \
+                  f"Price: {price} | " \
                   f"Total: {balance_entry.amount}"
+        entity['payload'] = {'menu_item_id': balance_entry.menu_item_id, 'quantity': balance_entry.number_of_items,
+                             'price': price, 'total': balance_entry.amount}
 
     else:
-        payment_method = "Cash" if menu_item.id == 0 else "Card"
+        payment_method = "Cash" if balance_entry.menu_item_id == 0 else "Card"
 
         action += " Payment"
         details = f"Entry: {balance_entry.id} | " \
-                  f"Reservation: {reservation.id} | " \
-                  f"Room: {room.room_name} | " \
-                  f"Guest: {guest.name} {guest.surname} | " \
+                  f"Reservation: {balance_entry.reservation_id} | " \
+                  f"Room: {room_name} | " \
+                  f"Guest: {guest_name} {guest_surname} | " \
                   f"Payment Method: {payment_method} | " \
                   f"Paid: {balance_entry.amount}"
+        entity['payload'] = {'payment_method': payment_method, 'paid': balance_entry.amount}
 
-    logs.log_action(user_id, action, details)
+    logs.log_action(user_id, action, details, **entity)
 
 
 def log_item(menu_item, user_id, action):
-    category = MenuCategory.query.get(menu_item.category_id)
+    category = db.session.get(MenuCategory, menu_item.category_id)
     details = f"ID: {menu_item.id} | " \
               f"Item: {menu_item.name} | " \
               f"Price: {menu_item.price} | " \
-              f"Category: {category.name} | " \
+              f"Category: {category.name if category else menu_item.category_id} | " \
               f"Description: {menu_item.description}"
 
-    logs.log_action(user_id, action, details)
+    logs.log_action(user_id, action, details, entity_type='menu_item', entity_id=menu_item.id,
+                    payload={'name': menu_item.name, 'price': menu_item.price, 'category_id': menu_item.category_id})
 
 
 def log_category(category, user_id, action):
     details = f"Category: {category.name}"
 
-    logs.log_action(user_id, action, details)
+    logs.log_action(user_id, action, details, entity_type='menu_category', entity_id=category.id,
+                    payload={'name': category.name})
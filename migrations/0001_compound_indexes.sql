@@ -0,0 +1,29 @@
+-- Compound indexes of the date range, per-entity and listing queries (see the __table_args__ of models.py
+-- and logs.py). Portable between Postgres and SQLite; idempotent.
+
+-- Reservations: per room around dates (and the SQLite overlap checks), date ranges and departures,
+-- arrivals, per guest
+CREATE INDEX IF NOT EXISTS ix_reservations_room_end_start ON reservations (room_id, end_date, start_date);
+CREATE INDEX IF NOT EXISTS ix_reservations_end_start ON reservations (end_date, start_date);
+CREATE INDEX IF NOT EXISTS ix_reservations_start_date ON reservations (start_date);
+CREATE INDEX IF NOT EXISTS ix_reservations_guest_id ON reservations (guest_id);
+
+CREATE INDEX IF NOT EXISTS ix_reservation_status_changes_reservation
+    ON reservation_status_changes (reservation_id, timestamp);
+
+-- Balance entries of a reservation, and the folio aggregates
+CREATE INDEX IF NOT EXISTS ix_balance_reservation_timestamp ON balance (reservation_id, transaction_timestamp);
+
+-- Cleaning schedule: last completed task per (room, action), date ranges for all rooms or one room
+CREATE INDEX IF NOT EXISTS ix_cleaning_schedule_room_action_status_date
+    ON cleaning_schedule (room_id, action_id, status, scheduled_date);
+CREATE INDEX IF NOT EXISTS ix_cleaning_schedule_date_status ON cleaning_schedule (scheduled_date, status);
+CREATE INDEX IF NOT EXISTS ix_cleaning_schedule_room_date ON cleaning_schedule (room_id, scheduled_date);
+
+-- Audit log listings in keyset order (timestamp, id): all logs and date ranges, by user, by action
+CREATE INDEX IF NOT EXISTS ix_user_actions_log_timestamp ON user_actions_log (timestamp, id);
+CREATE INDEX IF NOT EXISTS ix_user_actions_log_user_timestamp ON user_actions_log (user_id, timestamp, id);
+CREATE INDEX IF NOT EXISTS ix_user_actions_log_action_timestamp ON user_actions_log (action, timestamp, id);
+
+-- Notification expiry sweep and unexpired reads
+CREATE INDEX IF NOT EXISTS ix_notifications_expiry_date ON notifications (expiry_date);
@@ -0,0 +1,28 @@
+-- Tables added after the first releases: the running balance totals of the reservations (see
+-- models.ReservationFolio) and the history of the scheduled jobs (see models.JobRun). Idempotent.
+-- The folios are then backfilled from the balance entries by 0003_reservation_folios_backfill.py.
+
+CREATE TABLE IF NOT EXISTS reservation_folio (
+    reservation_id INTEGER NOT NULL,
+    total_charges NUMERIC(10, 2) NOT NULL,
+    total_payments NUMERIC(10, 2) NOT NULL,
+    unpaid_amount NUMERIC(10, 2) NOT NULL,
+    updated_at DATETIME,
+    PRIMARY KEY (reservation_id),
+    FOREIGN KEY (reservation_id) REFERENCES reservations (id)
+);
+
+CREATE TABLE IF NOT EXISTS job_runs (
+    id INTEGER NOT NULL,
+    job_id VARCHAR(100) NOT NULL,
+    started_at DATETIME NOT NULL,
+    finished_at DATETIME NOT NULL,
+    duration_ms INTEGER NOT NULL,
+    rows_affected INTEGER,
+    status VARCHAR(20) NOT NULL,
+    error TEXT,
+    host VARCHAR(255),
+    pid INTEGER,
+    PRIMARY KEY (id)
+);
+CREATE INDEX IF NOT EXISTS ix_job_runs_job_started ON job_runs (job_id, started_at);
@@ -0,0 +1,10 @@
+# migrations/0003_reservation_folios_backfill.py
+"""Backfill the reservation folios of 0002 from the balance entries."""
+
+from reservations_management import rebuild_reservation_folios
+
+
+def upgrade(concurrently):
+    # Folios missing (new table) or out of date are rebuilt from the balance entries
+    drift = rebuild_reservation_folios()
+    return f"{len(drift)} reservation folio(s) backfilled"
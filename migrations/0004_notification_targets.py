@@ -0,0 +1,12 @@
+# migrations/0004_notification_targets.py
+"""
+Notification keys and targets: add the kind, reservation_id, window_start and updated_at columns of the
+notifications, create the notification_targets table and move the department of each notification there.
+"""
+
+from notifications_management import upgrade_notification_targets
+
+
+def upgrade(concurrently):
+    created = upgrade_notification_targets()
+    return f"{created} existing targets created"
@@ -0,0 +1,9 @@
+# migrations/0005_log_entity_columns.py
+"""Entity columns of the audit log, with their indexes, filled from the details of the existing entries."""
+
+from logs import upgrade_log_entity_columns
+
+
+def upgrade(concurrently):
+    filled = upgrade_log_entity_columns()
+    return f"{filled} existing logs filled"
@@ -0,0 +1,9 @@
+# migrations/0006_log_search_index.py
+"""Index of the log details search: pg_trgm GIN index on Postgres, FTS5 trigram table on SQLite."""
+
+from logs import create_log_search_index
+
+
+def upgrade(concurrently):
+    create_log_search_index(concurrently)
+    return "log search index ready"
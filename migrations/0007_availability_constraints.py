@@ -0,0 +1,19 @@
+# migrations/0007_availability_constraints.py
+"""
+Overlap checks of the reservations: the exclusion constraint on Postgres, the triggers on SQLite.
+
+The existing reservations must not overlap: the Postgres constraint can't be created otherwise, so the migration
+stops and lists them instead, to be fixed before it is applied again.
+"""
+
+from availability import create_availability_constraints, find_overlapping_reservations
+from migrations import MigrationError
+
+
+def upgrade(concurrently):
+    overlaps = find_overlapping_reservations()
+    if overlaps:
+        pairs = ', '.join(f"{first_id} and {second_id}" for first_id, second_id in overlaps)
+        raise MigrationError(f"{len(overlaps)} overlapping pair(s) of reservations, fix them first: {pairs}")
+    create_availability_constraints()
+    return "availability constraints ready"
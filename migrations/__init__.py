@@ -0,0 +1,138 @@
+# migrations/__init__.py
+"""
+Migrations of the existing databases: the numbered files of this directory, applied in order with
+`flask apply-migrations`, the single upgrade path of a deployed database.
+
+- NNNN_name.sql: SQL statements. A file named NNNN_name.<dialect>.sql (e.g. .postgresql.sql, .sqlite.sql) only
+  applies to that database, for the DDL that isn't portable (column types, auto-increment keys).
+- NNNN_name.py: a module whose upgrade(concurrently) function makes the changes that plain SQL can't (columns
+  added only if missing, backfills, dialect-specific indexes), and returns a summary of what it did.
+
+Each migration applied is recorded in the schema_migrations table (SchemaMigration) and skipped afterwards. The
+migrations are idempotent all the same (IF NOT EXISTS, checks of the existing columns), so a database upgraded
+before the record existed, or created by db.create_all() with the current schema, simply has them recorded on
+its first run.
+"""
+
+import glob
+import importlib
+import os
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import insert, select, text
+
+from models import db, SchemaMigration
+
+MIGRATIONS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class MigrationError(Exception):
+    """A migration failed, or its preconditions don't hold; it isn't recorded and the next ones aren't applied."""
+
+
+def migration_name(path):
+    """The name of a migration file, as recorded: without its dialect and extension (e.g. 0002_folio_and_job_runs)."""
+    return os.path.basename(path).split('.')[0]
+
+
+def migration_files(dialect):
+    """The .sql and .py files of the migration set that apply to a database dialect, in order."""
+    files = []
+    paths = glob.glob(os.path.join(MIGRATIONS_DIR, '[0-9]*.sql')) + glob.glob(os.path.join(MIGRATIONS_DIR, '[0-9]*.py'))
+    for path in sorted(paths, key=os.path.basename):
+        parts = os.path.basename(path).split('.')
+        if len(parts) == 2 or parts[1] == dialect:
+            files.append(path)
+    return files
+
+
+def migration_statements(path):
+    """The statements of a migration file, without the comments."""
+    with open(path) as file:
+        sql = ''.join(line for line in file if not line.lstrip().startswith('--'))
+    return [statement.strip() for statement in sql.split(';') if statement.strip()]
+
+
+def applied_migrations():
+    """The names of the migrations recorded as applied (creates the record table of an older database)."""
+    SchemaMigration.__table__.create(db.engine, checkfirst=True)
+    with db.engine.connect() as connection:
+        return set(connection.execute(select(SchemaMigration.name)).scalars())
+
+
+def record_migration(connection, name):
+    connection.execute(insert(SchemaMigration).values(name=name, applied_at=datetime.now()))
+
+
+def apply_sql_migration(path, concurrently):
+    """Execute the statements of a .sql migration and record it. Returns its summary."""
+    statements = migration_statements(path)
+    if concurrently:
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            for statement in statements:
+                connection.execute(text(statement.replace('CREATE INDEX IF NOT EXISTS',
+                                                          'CREATE INDEX CONCURRENTLY IF NOT EXISTS')))
+            record_migration(connection, migration_name(path))
+    else:
+        with db.engine.begin() as connection:  # The statements and the record, in one transaction
+            for statement in statements:
+                connection.execute(text(statement))
+            record_migration(connection, migration_name(path))
+    return f"{len(statements)} statements"
+
+
+def apply_python_migration(path, concurrently):
+    """Run the upgrade function of a .py migration and record it. Returns its summary."""
+    module = importlib.import_module(f'{__name__}.{migration_name(path)}')
+    summary = module.upgrade(concurrently)
+    with db.engine.begin() as connection:
+        record_migration(connection, migration_name(path))
+    return summary
+
+
+def apply_migrations(concurrently=False):
+    """
+    Apply the migrations of the set not applied yet to the database, in order.
+
+    Args:
+        concurrently (bool): On Postgres, build the indexes with CREATE INDEX CONCURRENTLY, outside of a
+            transaction, so the tables stay writable meanwhile.
+
+    Returns:
+        list: The names of the migrations applied.
+
+    Raises:
+        MigrationError: If a migration fails. The migrations applied before it stay recorded.
+    """
+    concurrently = concurrently and db.engine.dialect.name == 'postgresql'
+    applied = applied_migrations()
+    newly_applied = []
+    for path in migration_files(db.engine.dialect.name):
+        name = migration_name(path)
+        if name in applied:
+            continue
+        try:
+            if path.endswith('.py'):
+                summary = apply_python_migration(path, concurrently)
+            else:
+                summary = apply_sql_migration(path, concurrently)
+        except Exception as e:
+            db.session.rollback()
+            raise MigrationError(f"{os.path.basename(path)}: {e}") from e
+        newly_applied.append(name)
+        print(f"Applied {os.path.basename(path)} ({summary})")
+    return newly_applied
+
+
+@click.command('apply-migrations')
+@click.option('--concurrently', is_flag=True, help='Build the Postgres indexes without blocking the writes.')
+@with_appcontext
+def apply_migrations_command(concurrently):
+    """Apply the migrations of the migrations directory not applied yet."""
+    try:
+        applied = apply_migrations(concurrently)
+    except MigrationError as e:
+        raise click.ClickException(f"Migration failed: {e}")
+    click.echo(f"{len(applied)} migration(s) applied" if applied else "The database is up to date")
@@ -56,6 +56,16 @@ class Guest(db.Model):
 
 class Reservation(db.Model):
     __tablename__ = 'reservations'
+    __table_args__ = (
+        # Serves the reservations of a room around dates, and the overlap checks on SQLite (see availability.py)
+        db.Index('ix_reservations_room_end_start', 'room_id', 'end_date', 'start_date'),
+        # Serve the date range listings, the occupancy grid and the departures (end date ranges), the arrivals
+        # (start date ranges) and the reservations of a guest
+        db.Index('ix_reservations_end_start', 'end_date', 'start_date'),
+        db.Index('ix_reservations_start_date', 'start_date'),
+        db.Index('ix_reservations_guest_id', 'guest_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     channel_manager_id = db.Column(db.String(255), unique=True, nullable=True)
     start_date = db.Column(db.Date, nullable=False)
@@ -83,6 +93,10 @@ class Reservation(db.Model):
 
 class ReservationStatusChange(db.Model):
     __tablename__ = 'reservation_status_changes'
+    __table_args__ = (
+        db.Index('ix_reservation_status_changes_reservation', 'reservation_id', 'timestamp'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     reservation_id = db.Column(db.Integer, db.ForeignKey('reservations.id'))
     status = db.Column(db.String(50))
@@ -177,6 +191,10 @@ class MenuItem(db.Model):
 
 class Balance(db.Model):
     __tablename__ = 'balance'
+    __table_args__ = (
+        # Serves the balance entries of a reservation, and the folio aggregates
+        db.Index('ix_balance_reservation_timestamp', 'reservation_id', 'transaction_timestamp'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     reservation_id = db.Column(db.Integer, db.ForeignKey('reservations.id'), nullable=False)
@@ -200,6 +218,29 @@ class Balance(db.Model):
         }
 
 
+class ReservationFolio(db.Model):
+    """
+    Running balance totals of a reservation, kept in sync with its Balance entries within the same transaction.
+    Can be rebuilt from the Balance table (see reservations_management.rebuild_reservation_folios).
+    """
+    __tablename__ = 'reservation_folio'
+
+    reservation_id = db.Column(db.Integer, db.ForeignKey('reservations.id'), primary_key=True)
+    total_charges = db.Column(db.Numeric(10, 2), nullable=False, default=0)
+    total_payments = db.Column(db.Numeric(10, 2), nullable=False, default=0)  # Payments are negative amounts
+    unpaid_amount = db.Column(db.Numeric(10, 2), nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'reservation_id': self.reservation_id,
+            'total_charges': str(self.total_charges),
+            'total_payments': str(self.total_payments),
+            'unpaid_amount': str(self.unpaid_amount),
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+
 class CleaningAction(db.Model):
     __tablename__ = 'cleaning_actions'
 
@@ -217,6 +258,13 @@ class CleaningAction(db.Model):
 
 class CleaningSchedule(db.Model):
     __tablename__ = 'cleaning_schedule'
+    __table_args__ = (
+        # Serves the "last completed date per (room, action)" lookups of the cleaning scheduler
+        db.Index('ix_cleaning_schedule_room_action_status_date', 'room_id', 'action_id', 'status', 'scheduled_date'),
+        # Serve the schedule of a date range (for all rooms, or for one room)
+        db.Index('ix_cleaning_schedule_date_status', 'scheduled_date', 'status'),
+        db.Index('ix_cleaning_schedule_room_date', 'room_id', 'scheduled_date'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     room_id = db.Column(db.Integer, db.ForeignKey('rooms.id'), nullable=False)
@@ -240,21 +288,106 @@ class CleaningSchedule(db.Model):
 
 
 class AppNotification(db.Model):
+    """
+    A notification message, shown to the departments of its targets (NotificationTarget).
+
+    Notifications generated by the scheduled jobs carry a key (kind, reservation_id, window_start): a job run
+    finding the notification of its key refreshes it instead of creating another one (see
+    notifications_management.upsert_notifications).
+    """
     __tablename__ = 'notifications'
+    __table_args__ = (
+        # Serves the expiry sweep and the unexpired notification reads
+        db.Index('ix_notifications_expiry_date', 'expiry_date'),
+        db.UniqueConstraint('kind', 'reservation_id', 'window_start', name='uq_notifications_kind_reservation_window'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(255), nullable=False)
     message = db.Column(db.Text, nullable=False)
-    department = db.Column(db.String(255), nullable=False)
     priority = db.Column(db.Integer, nullable=False)
     expiry_date = db.Column(db.DateTime, nullable=False)
-
-    def to_dict(self):
-        return {
+    kind = db.Column(db.String(50), nullable=True)  # e.g., 'arrival', 'departure'; None for manual notifications
+    reservation_id = db.Column(db.Integer, nullable=True)
+    window_start = db.Column(db.DateTime, nullable=True)  # e.g., the arrival or departure date
+    updated_at = db.Column(db.DateTime, nullable=True, default=datetime.now)  # Creation or last refresh
+
+    targets = db.relationship('NotificationTarget', backref='notification', lazy=True,
+                              cascade='all, delete-orphan', passive_deletes=True)
+
+    @property
+    def departments(self):
+        return [target.department for target in self.targets]
+
+    def to_dict(self, department=None):
+        """
+        Args:
+            department (str): The department the notification is read for. If None, the dict lists all the
+                departments of the notification instead.
+        """
+        data = {
             'id': self.id,
             'title': self.title,
             'message': self.message,
-            'department': self.department,
             'priority': self.priority,
             'expiry_date': self.expiry_date.isoformat()
         }
+        if department is not None:
+            data['department'] = department
+        else:
+            data['departments'] = self.departments
+        return data
+
+
+class NotificationTarget(db.Model):
+    __tablename__ = 'notification_targets'
+    __table_args__ = (
+        # Serves the notification reads of a department
+        db.Index('ix_notification_targets_department', 'department', 'notification_id'),
+    )
+
+    notification_id = db.Column(db.Integer, db.ForeignKey('notifications.id', ondelete='CASCADE'),
+                                primary_key=True)
+    department = db.Column(db.String(255), primary_key=True)
+
+
+# Bookkeeping of the scheduled job runs (see scheduled_jobs.py)
+class JobRun(db.Model):
+    __tablename__ = 'job_runs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(100), nullable=False)
+    started_at = db.Column(db.DateTime, nullable=False)
+    finished_at = db.Column(db.DateTime, nullable=False)
+    duration_ms = db.Column(db.Integer, nullable=False)
+    rows_affected = db.Column(db.Integer, nullable=True)
+    status = db.Column(db.String(20), nullable=False)  # 'success' or 'failed'
+    error = db.Column(db.Text, nullable=True)
+    host = db.Column(db.String(255), nullable=True)
+    pid = db.Column(db.Integer, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_job_runs_job_started', 'job_id', 'started_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'job_id': self.job_id,
+            'started_at': self.started_at.isoformat(),
+            'finished_at': self.finished_at.isoformat(),
+            'duration_ms': self.duration_ms,
+            'rows_affected': self.rows_affected,
+            'status': self.status,
+            'error': self.error,
+            'host': self.host,
+            'pid': self.pid
+        }
+
+
+# Bookkeeping of the applied migrations (see migrations/__init__.py)
+class SchemaMigration(db.Model):
+    __tablename__ = 'schema_migrations'
+
+    name = db.Column(db.String(255), primary_key=True)  # The file name without its dialect and extension
+    applied_at = db.Column(db.DateTime, nullable=False)
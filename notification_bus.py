@@ -0,0 +1,199 @@
+# notification_bus.py
+"""
+Publish/subscribe bus delivering new notifications to the server-sent event streams.
+
+Notifications are published once committed (notifications_management) and dispatched to the subscriptions of
+their department. By default the bus is in-process: the streams of a web process see the notifications created
+by that process right away, and the others (e.g. created by the scheduler process) at their next catch-up
+(see notifications_management.notification_events).
+
+With NOTIFICATION_BUS_LISTEN_NOTIFY set on Postgres, notifications are published through
+`pg_notify('app_notifications', ...)` instead, and every process dispatches them to its own subscriptions from a
+LISTEN connection, so all streams see them right away.
+"""
+
+import json
+import queue
+import select
+import threading
+
+from models import db, AppNotification
+
+CHANNEL = 'app_notifications'
+
+
+class Subscription:
+    """
+    The notifications of one stream: a bounded queue, and a flag raised when notifications were dropped (or may
+    have been missed), after which the stream catches up from the database.
+    """
+
+    def __init__(self, department, max_queue_size):
+        self.department = department
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.overflowed = False
+
+    def get(self, timeout):
+        """The next notification (dict), or None after 'timeout' seconds."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class NotificationBus:
+    def __init__(self, max_queue_size=100):
+        self.max_queue_size = max_queue_size
+        self.published = 0
+        self.dropped = 0
+        self.listening = False  # True while a LISTEN/NOTIFY listener brings the notifications of every process
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, department=None):
+        """Subscribe to the notifications of a department (all of them if None)."""
+        subscription = Subscription(department, self.max_queue_size)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def dispatch(self, notifications):
+        """Hand notifications (dicts, as AppNotification.to_dict) to the subscriptions of their department."""
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+
+        for notification in notifications:
+            self.published += 1
+            for subscription in subscriptions:
+                if subscription.department not in (None, notification['department']):
+                    continue
+                try:
+                    subscription.queue.put_nowait(notification)
+                except queue.Full:  # Slow client: it catches up from the database instead
+                    subscription.overflowed = True
+                    self.dropped += 1
+
+    def catch_up(self):
+        """Have every subscription catch up from the database (e.g. after notifications could not be received)."""
+        with self._lock:
+            for subscription in self._subscriptions:
+                subscription.overflowed = True
+
+    def stats(self):
+        return {'subscriptions': len(self._subscriptions), 'published': self.published, 'dropped': self.dropped,
+                'listening': self.listening}
+
+
+bus = NotificationBus()
+
+# LISTEN/NOTIFY transport, when enabled with init_notification_bus()
+listener = None
+
+
+def publish_notifications(notifications):
+    """
+    Publish committed notifications (dicts, as AppNotification.to_dict) to the streams.
+
+    Failures are reported but not raised: the notifications are stored, and the streams catch up from the
+    database anyway.
+    """
+    if not notifications:
+        return
+    try:
+        if listener is not None:
+            with db.engine.begin() as connection:
+                for notification in notifications:
+                    connection.execute(db.text('SELECT pg_notify(:channel, :payload)'), {
+                        'channel': CHANNEL,
+                        'payload': json.dumps({'id': notification['id'], 'department': notification['department']})
+                    })
+        else:
+            bus.dispatch(notifications)
+    except Exception as e:
+        print("Failed to publish notifications:", e)
+
+
+class PostgresNotificationListener:
+    """LISTENs to the notification channel and dispatches what other processes (and this one) publish."""
+
+    def __init__(self, app, poll_timeout=5):
+        self.app = app
+        self.poll_timeout = poll_timeout
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='notification-listener', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                self._listen()
+            except Exception as e:
+                print("Notification listener error, reconnecting:", e)
+                self._stopping.wait(self.poll_timeout)
+
+    def _listen(self):
+        with self.app.app_context():
+            connection = db.engine.raw_connection()
+        try:
+            driver_connection = connection.driver_connection
+            driver_connection.autocommit = True
+            with driver_connection.cursor() as cursor:
+                cursor.execute(f'LISTEN {CHANNEL}')
+            bus.listening = True
+            bus.catch_up()  # For what was published while not listening (e.g. before a reconnection)
+
+            while not self._stopping.is_set():
+                if select.select([driver_connection], [], [], self.poll_timeout) == ([], [], []):
+                    continue
+                driver_connection.poll()
+                targets = []
+                while driver_connection.notifies:
+                    payload = json.loads(driver_connection.notifies.pop(0).payload)
+                    targets.append((payload['id'], payload['department']))
+                if targets:
+                    self._dispatch(targets)
+        finally:
+            bus.listening = False
+            # Discard the connection rather than return it to the pool, in autocommit mode and LISTENing
+            connection.invalidate()
+
+    def _dispatch(self, targets):
+        """Dispatch the notifications of (notification ID, department) pairs."""
+        with self.app.app_context():
+            notifications = {notification.id: notification for notification in
+                             AppNotification.query.filter(AppNotification.id.in_({notification_id for notification_id, _ in targets}))}
+            bus.dispatch([notifications[notification_id].to_dict(department)
+                          for notification_id, department in sorted(targets) if notification_id in notifications])
+
+
+def init_notification_bus(app):
+    """
+    Configure the notification bus for the application.
+
+    Configuration (app.config):
+        NOTIFICATION_BUS_QUEUE_SIZE (int): Notifications buffered per stream. Defaults to 100.
+        NOTIFICATION_BUS_LISTEN_NOTIFY (bool): Use Postgres LISTEN/NOTIFY between processes. Defaults to False.
+    """
+    global listener
+
+    bus.max_queue_size = app.config.get('NOTIFICATION_BUS_QUEUE_SIZE', bus.max_queue_size)
+
+    if not app.config.get('NOTIFICATION_BUS_LISTEN_NOTIFY') or listener is not None:
+        return
+    with app.app_context():
+        if db.engine.dialect.name != 'postgresql':
+            print("NOTIFICATION_BUS_LISTEN_NOTIFY needs Postgres, using the in-process bus")
+            return
+
+    listener = PostgresNotificationListener(app)
+    listener.start()
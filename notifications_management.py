@@ -1,23 +1,122 @@
 from datetime import datetime, timedelta
 
-from flask import Blueprint, jsonify, request, current_app, app
-from flask_jwt_extended import jwt_required, get_jwt_identity
+import hashlib
+import json
+
+from flask import Blueprint, jsonify, request, current_app, app, Response, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt
+from sqlalchemy import delete, func, inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
 
 import logs
-from auth import requires_roles
-from models import Room, Reservation, Guest, Balance, AppNotification, db, User
+from notification_bus import bus, publish_notifications
+from pagination import model_list_response
+from auth import requires_roles, get_current_user
+from models import Room, Reservation, Guest, Balance, AppNotification, NotificationTarget, db
 
 notifications_management_blueprint = Blueprint('notifications_management', __name__)
 
+# The notification department of each user department (JWT 'department' claim). Pending users have none.
+NOTIFICATION_DEPARTMENTS = {
+    'Admin': 'Admin',
+    'Manager': 'Managers',
+    'Reception': 'Receptionists',
+    'Cleaning': 'Cleaning',
+    'Bar': 'Bar'
+}
+
+
+def active_notifications():
+    """
+    Query of the unexpired notifications.
+
+    Expired notifications are only deleted by the periodic sweep (delete_expired_notifications), so the reads
+    filter them out themselves.
+    """
+    return AppNotification.query.filter(AppNotification.expiry_date >= datetime.now())
+
+
+def delete_expired_notifications(now=None, batch_size=5000):
+    """
+    Delete the expired notifications with set-based DELETE statements.
+
+    Args:
+        now (datetime): Notifications expired before this time are deleted. Defaults to the current time.
+        batch_size (int): Maximum number of rows per DELETE (and transaction), so a large backlog does not hold
+            locks for long. None deletes everything in one statement.
+
+    Returns:
+        int: The number of notifications deleted.
+    """
+    now = now or datetime.now()
+    expired = AppNotification.expiry_date < now
+
+    if batch_size is None:
+        expired_ids = db.session.query(AppNotification.id).filter(expired).scalar_subquery()
+        db.session.execute(delete(NotificationTarget).where(NotificationTarget.notification_id.in_(expired_ids)))
+        deleted = AppNotification.query.filter(expired).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+
+    deleted = 0
+    while True:
+        batch = db.session.query(AppNotification.id).filter(expired).limit(batch_size).scalar_subquery()
+        # The targets first: SQLite does not enforce the ON DELETE CASCADE of the foreign key by default
+        db.session.execute(delete(NotificationTarget).where(NotificationTarget.notification_id.in_(batch)))
+        count = db.session.execute(delete(AppNotification).where(AppNotification.id.in_(batch))).rowcount
+        db.session.commit()
+        deleted += count
+        if count < batch_size:
+            return deleted
+
+
+def upgrade_notification_targets():
+    """
+    Move an existing notifications table, with one row per department, to the notification targets: add the
+    key and updated_at columns and the indexes, create the notification_targets table and fill it from the department column,
+    then drop that column.
+
+    Returns:
+        int: The number of targets created.
+    """
+    notification_table = AppNotification.__table__
+    existing = {column['name'] for column in inspect(db.engine).get_columns(notification_table.name)}
+    created = 0
+    with db.engine.begin() as connection:
+        for name in ('kind', 'reservation_id', 'window_start', 'updated_at'):
+            if name not in existing:
+                column_type = notification_table.c[name].type.compile(dialect=db.engine.dialect)
+                connection.execute(text(f'ALTER TABLE notifications ADD COLUMN {name} {column_type}'))
+        connection.execute(text('CREATE UNIQUE INDEX IF NOT EXISTS uq_notifications_kind_reservation_window '
+                                'ON notifications (kind, reservation_id, window_start)'))
+        NotificationTarget.__table__.create(connection, checkfirst=True)
+
+        if 'department' in existing:
+            created = connection.execute(text(
+                'INSERT INTO notification_targets (notification_id, department) '
+                'SELECT id, department FROM notifications'
+            )).rowcount
+            connection.execute(text('DROP INDEX IF EXISTS ix_notifications_department_expiry_priority'))
+            connection.execute(text('ALTER TABLE notifications DROP COLUMN department'))
+    return created
+
 
 @notifications_management_blueprint.route('/get_notifications', methods=['GET'])
 @jwt_required()
 @requires_roles('Admin', 'Manager', 'Bar', 'Reception', 'Pending', 'Cleaning')
 def get_notifications():
+    """
+    Get the unexpired notifications of the caller's department (from the token), by priority.
+
+    Supports If-None-Match: an unchanged list is answered with 304 Not Modified. Also accepts the list
+    parameters of pagination.model_list_response: 'limit' / 'cursor', 'fields', 'sort' (expiry_date),
+    'format=ndjson', and filters on priority and kind.
+    """
     try:
-        # Fetch all notifications
-        notifications = AppNotification.query.all()
-        return jsonify([notification.to_dict() for notification in notifications]), 200
+        department = NOTIFICATION_DEPARTMENTS.get(get_jwt().get('department'))
+        if department is None:
+            return jsonify([]), 200
+        return department_notifications_response(department)
     except Exception as e:
         print(e)
         return jsonify({'error': str(e)}), 500
@@ -28,7 +127,7 @@ def get_notifications():
 @requires_roles('Admin', 'Manager', 'Bar', 'Reception', 'Pending', 'Cleaning')
 def get_notification(notification_id):
     try:
-        notification = AppNotification.query.filter_by(id=notification_id).first()
+        notification = active_notifications().filter(AppNotification.id == notification_id).first()
         if notification:
             return jsonify(notification.to_dict()), 200
         else:
@@ -44,19 +143,169 @@ def get_notification(notification_id):
 @requires_roles('Admin', 'Manager', 'Bar', 'Reception', 'Pending', 'Cleaning')
 def get_notifications_for_department(department):
     try:
-        notifications = AppNotification.query.filter_by(department=department).all()
-        return jsonify([notification.to_dict() for notification in notifications]), 200
+        return department_notifications_response(department)
     except Exception as e:
         print(e)
         return jsonify({'error': str(e)}), 500
 
 
+# Order of the notification lists: highest priority first, then newest first
+NOTIFICATION_KEY_COLUMNS = (AppNotification.priority, AppNotification.id)
+
+
+def department_notifications_query(department):
+    """Query of the unexpired notifications of a department, not ordered (see NOTIFICATION_KEY_COLUMNS)."""
+    return active_notifications().join(AppNotification.targets).filter(NotificationTarget.department == department)
+
+
+def department_notifications_etag(department):
+    """
+    The ETag of the unexpired notifications of a department, from one aggregate query (no row is loaded).
+
+    Notifications are created, deleted or expired, which changes the count or the IDs of the set, or refreshed
+    in place (title, message, priority and expiry date, see upsert_notifications), which sets their updated_at
+    version to the time of the refresh, so changes the latest version of the set.
+    """
+    count, max_id, id_sum, max_updated_at = db.session.query(
+        func.count(AppNotification.id), func.max(AppNotification.id), func.sum(AppNotification.id),
+        func.max(AppNotification.updated_at)
+    ).join(AppNotification.targets).filter(
+        NotificationTarget.department == department, AppNotification.expiry_date >= datetime.now()
+    ).one()
+    return hashlib.sha1(f'{department}|{count}|{max_id}|{id_sum}|{max_updated_at}'.encode()).hexdigest()
+
+
+def department_notifications_response(department):
+    """
+    The list response of a department's unexpired notifications, or 304 if the client's copy is current.
+
+    The ETag covers the whole set, so it also validates the pages and projections of the list (the browsers
+    keep one copy per URL).
+    """
+    etag = department_notifications_etag(department)
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.make_response(model_list_response(
+            AppNotification, department_notifications_query(department),
+            serialize=lambda notification: notification.to_dict(department),
+            key_columns=NOTIFICATION_KEY_COLUMNS,
+            filters=(AppNotification.priority, AppNotification.kind),
+            sorts=(AppNotification.expiry_date,),
+            columns=(AppNotification.id, AppNotification.title, AppNotification.message, AppNotification.priority,
+                     AppNotification.expiry_date),
+            default_order='desc'
+        ))
+        if response.status_code != 200:
+            return response
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@notifications_management_blueprint.route('/stream/department/<string:department>', methods=['GET'])
+@jwt_required()
+@requires_roles('Admin', 'Manager', 'Bar', 'Reception', 'Pending', 'Cleaning')
+def stream_notifications_for_department(department):
+    """
+    Stream the notifications of a department as server-sent events, in place of polling /get_notifications.
+
+    The stream starts with the unexpired notifications of the department, then sends the new ones as they are
+    created. Each event's ID is the notification ID: a client reconnecting with the Last-Event-ID header (as
+    EventSource does), or the 'last_event_id' query parameter, only receives the notifications created since.
+
+    Each open stream holds a worker thread: serve it with a threaded or gevent worker.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify({'error': 'Invalid Last-Event-ID'}), 400
+
+    heartbeat = current_app.config.get('NOTIFICATION_STREAM_HEARTBEAT_SECONDS', 15)
+    return Response(stream_with_context(notification_events(department, last_event_id, heartbeat)),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# Notification IDs below the highest one sent that a stream's database reads look at again: a notification
+# committed after a later one (its transaction started first) still reaches the streams
+STREAM_REREAD_WINDOW = 100
+
+
+def notification_events(department, last_event_id=None, heartbeat=15):
+    """
+    Generate the server-sent events of a department's notifications.
+
+    Args:
+        department (str): The department of the notifications.
+        last_event_id (int): The ID of the last notification the client received. None to start with all the
+            unexpired notifications of the department.
+        heartbeat (float): Seconds without notification after which a keep-alive comment is sent.
+
+    The subscription to the bus is taken before reading the database, so no notification created in between is
+    missed. The IDs are allocated before the commits, so the notifications don't arrive in ID order: the stream
+    remembers the IDs it sent rather than a high-water mark, sends any notification of the bus it hasn't sent,
+    and its database reads start STREAM_REREAD_WINDOW IDs below the highest ID sent. On a reconnection, they
+    don't go below last_event_id, the one ID the client tells: the notifications before it were sent already.
+
+    The database is read again when the subscription dropped notifications (slow client, or a reconnection of
+    the LISTEN/NOTIFY listener), and at each heartbeat for the notifications published by other processes,
+    unless the LISTEN/NOTIFY listener brings them; these reads are ranges of the primary key, not table scans.
+
+    Yields:
+        str: The events, in the text/event-stream format.
+    """
+    subscription = bus.subscribe(department)
+    sent = set()
+    try:
+        yield "retry: 5000\n\n"  # Reconnection delay of the client, in milliseconds
+
+        missed = department_notifications_since(department, last_event_id)
+        while True:
+            for notification in missed:
+                if notification['id'] not in sent:
+                    sent.add(notification['id'])
+                    yield f"id: {notification['id']}\nevent: notification\ndata: {json.dumps(notification)}\n\n"
+            if len(sent) > 2 * STREAM_REREAD_WINDOW:
+                sent = set(sorted(sent)[-STREAM_REREAD_WINDOW:])
+            reread_from = max(sent) - STREAM_REREAD_WINDOW if sent else last_event_id
+            if last_event_id is not None:
+                reread_from = max(reread_from, last_event_id)
+
+            notification = subscription.get(timeout=heartbeat)
+            if subscription.overflowed:
+                subscription.overflowed = False
+                missed = department_notifications_since(department, reread_from)
+            elif notification is not None:
+                missed = [notification]
+            elif bus.listening:
+                missed = []
+                yield ": keep-alive\n\n"
+            else:
+                missed = [notification for notification in department_notifications_since(department, reread_from)
+                          if notification['id'] not in sent]
+                if not missed:
+                    yield ": keep-alive\n\n"
+    finally:
+        bus.unsubscribe(subscription)
+
+
+def department_notifications_since(department, last_id=None):
+    """The unexpired notifications (dicts) of a department created after the notification 'last_id', by ID."""
+    query = active_notifications().join(AppNotification.targets).filter(NotificationTarget.department == department)
+    if last_id is not None:
+        query = query.filter(AppNotification.id > last_id)
+    notifications = [notification.to_dict(department) for notification in query.order_by(AppNotification.id)]
+    db.session.remove()  # Do not hold a connection for the lifetime of the stream
+    return notifications
+
+
 @notifications_management_blueprint.route('/add_notification', methods=['POST'])
 @jwt_required()
 @requires_roles('Admin', 'Manager')
 def create_notification():
-    current_user_email = get_jwt_identity()  # Get the user's email from the token
-    user = User.query.filter_by(email=current_user_email).first()
+    user = get_current_user()  # The user's ID and department, from the token
 
     try:
         data = request.json
@@ -89,17 +338,143 @@ def create_notification_logic(title, message, department, priority, manager_id,
         new_notification = AppNotification(
             title=title,
             message=message,
-            department=department,
             priority=priority,
-            expiry_date=datetime.strptime(expiry_date_str, '%Y-%m-%dT%H:%M:%S')
+            expiry_date=datetime.strptime(expiry_date_str, '%Y-%m-%dT%H:%M:%S'),
+            targets=[NotificationTarget(department=department)]
         )
         db.session.add(new_notification)
         db.session.commit()
+        publish_notifications([new_notification.to_dict(department)])
         log_notification(new_notification, manager_id, "Create Notification")
     except Exception as e:
         print(e)
 
 
+def upsert_notifications(notifications, manager_id):
+    """
+    Create or refresh many notifications, with their targets and audit log entries, in a single transaction.
+
+    Args:
+        notifications (list): One dict per notification, with 'title', 'message', 'departments' (list),
+            'priority' and 'expiry_date' keys, and optionally the 'kind', 'reservation_id' and 'window_start'
+            of the notification.
+        manager_id (int): The ID of the user creating the notifications (0 for the SYSTEM user).
+
+    The notifications with a kind are written by a single INSERT ... ON CONFLICT (kind, reservation_id,
+    window_start) DO UPDATE: one whose key already exists refreshes the existing notification (title, message,
+    priority, expiry date and updated_at version) instead of creating another one, so a job run again on the same
+    events does not insert anything, and a notification deleted meanwhile by the sweeper is simply created again.
+    The other notifications are inserted.
+
+    The targets are then inserted with ON CONFLICT DO NOTHING: a refreshed notification already has its targets,
+    so the notifications whose targets are inserted are the created ones, which get their "Create Notification"
+    log entries in one batch. Everything is committed once.
+
+    Returns:
+        tuple: The numbers of notifications created and refreshed.
+
+    Raises:
+        Exception: Any database error, after the rollback, so that the scheduled jobs record a failed run.
+    """
+    if not notifications:
+        return 0, 0
+
+    insert = postgresql.insert if db.engine.dialect.name == 'postgresql' else sqlite.insert
+    updated_at = datetime.now()
+    try:
+        keyed, unkeyed = {}, []
+        for notification in notifications:
+            values = {
+                'title': notification['title'],
+                'message': notification['message'],
+                'priority': notification['priority'],
+                'expiry_date': notification['expiry_date'].replace(microsecond=0),
+                'updated_at': updated_at
+            }
+            if notification.get('kind'):
+                key = (notification['kind'], notification.get('reservation_id'), notification.get('window_start'))
+                # A duplicate within the batch is skipped: one statement cannot update the same row twice
+                keyed.setdefault(key, ({'kind': key[0], 'reservation_id': key[1], 'window_start': key[2], **values},
+                                       notification['departments']))
+            else:
+                unkeyed.append((AppNotification(**values), notification['departments']))
+
+        written = []  # (notification, departments)
+        if keyed:
+            statement = insert(AppNotification)
+            statement = statement.on_conflict_do_update(
+                index_elements=[AppNotification.kind, AppNotification.reservation_id, AppNotification.window_start],
+                set_={column: statement.excluded[column]
+                      for column in ('title', 'message', 'priority', 'expiry_date', 'updated_at')}
+            ).returning(AppNotification.id, AppNotification.kind, AppNotification.reservation_id,
+                        AppNotification.window_start)
+            rows = db.session.execute(statement, [values for values, _ in keyed.values()])
+            for notification_id, kind, reservation_id, window_start in rows:
+                values, departments = keyed[(kind, reservation_id, window_start)]
+                written.append((AppNotification(id=notification_id, **values), departments))
+
+        if unkeyed:
+            db.session.add_all([new_notification for new_notification, _ in unkeyed])
+            db.session.flush()  # Assigns the notification IDs of the targets and log details
+            written.extend(unkeyed)
+
+        created_ids = set(db.session.execute(
+            insert(NotificationTarget).on_conflict_do_nothing().returning(NotificationTarget.notification_id),
+            [{'notification_id': notification.id, 'department': department}
+             for notification, departments in written for department in departments]
+        ).scalars())
+        created = [(notification, departments) for notification, departments in written
+                   if notification.id in created_ids]
+        if created:
+            db.session.execute(insert(logs.UserActionLog), [
+                logs.log_entry_values(manager_id, "Create Notification",
+                                      notification_log_details(new_notification, departments),
+                                      **notification_log_entity(new_notification, departments))
+                for new_notification, departments in created
+            ])
+
+        published = [new_notification.to_dict(department)  # Before commit expires them
+                     for new_notification, departments in created for department in departments]
+        db.session.commit()
+        publish_notifications(published)
+        return len(created), len(written) - len(created)
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def notification_log_details(notification, departments=None):
+    """
+    Format the logged details of a notification.
+
+    Args:
+        notification (AppNotification): The notification.
+        departments (list): Its departments, if known (saves loading its targets).
+
+    Example of logged details:
+    "ID: 4 |Title: New Notification | Message: This is a new notification | Department: IT, Bar | Priority: 1 | Expiry Date: 2021-01-01 00:00:00"
+    """
+    departments = notification.departments if departments is None else departments
+    return f"ID: {notification.id} |" \
+           f"Title: {notification.title} | " \
+           f"Message: {notification.message} | " \
+           f"Department: {', '.join(departments)} | " \
+           f"Priority: {notification.priority} | " \
+           f"Expiry Date: {notification.expiry_date}"
+
+
+def notification_log_entity(notification, departments=None):
+    """The entity columns of a notification's log entries (see logs.log_entry_entity)."""
+    departments = notification.departments if departments is None else departments
+    return logs.log_entry_entity(
+        entity_type='notification',
+        entity_id=notification.id,
+        reservation_id=notification.reservation_id,
+        payload={'title': notification.title, 'departments': departments, 'kind': notification.kind,
+                 'priority': notification.priority, 'expiry_date': notification.expiry_date}
+    )
+
+
 def log_notification(notification, user_id, action):
     """
     Log notification-related actions and details.
@@ -119,11 +494,6 @@ def log_notification(notification, user_id, action):
     Returns:
         None
     """
-    details = f"ID: {notification.id} |" \
-              f"Title: {notification.title} | " \
-              f"Message: {notification.message} | " \
-              f"Department: {notification.department} | " \
-              f"Priority: {notification.priority} | " \
-              f"Expiry Date: {notification.expiry_date}"
+    details = notification_log_details(notification)
 
-    logs.log_action(user_id, action, details)
+    logs.log_action(user_id, action, details, **notification_log_entity(notification))
@@ -0,0 +1,166 @@
+# occupancy_grid.py
+"""
+Occupancy grid of the front-desk calendar: the rooms × nights matrix of a date window.
+
+Each room's row is run-length encoded: one span per reservation, [first night, nights, reservation ID,
+guest ID, status index], night 0 being the night of the window's start date. Free nights have no span.
+
+The grid is built with one joined query (rooms, the reservations overlapping the window and their guests), and
+cached per window as its serialized JSON. The cached grids are dropped when a transaction writing reservations,
+rooms or guests through the ORM commits in this process; the grids of the other processes expire after
+OCCUPANCY_GRID_CACHE_TTL seconds (30 by default).
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from itertools import chain
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db, Room, Guest, Reservation
+
+STATUSES = ['Pending', 'Checked-in', 'Checked-out']
+
+# Models whose writes change the grids
+GRID_MODELS = (Reservation, Room, Guest)
+
+
+def build_occupancy_grid(start_date, end_date):
+    """
+    Build the occupancy grid of a window.
+
+    Parameters:
+    start_date (datetime.date): The first night of the window.
+    end_date (datetime.date): The day after the last night of the window.
+
+    Returns:
+    dict: The window ('start_date', 'end_date', 'days'), the 'statuses' the spans refer to by index, the
+    'rooms' (each with its 'id', 'room_name' and 'spans') and the names of the 'guests' by ID.
+    """
+    rows = db.session.query(
+        Room.id, Room.room_name, Reservation.id, Reservation.start_date, Reservation.end_date,
+        Reservation.status, Guest.id, Guest.name, Guest.surname
+    ).outerjoin(Reservation, db.and_(
+        Reservation.room_id == Room.id,
+        Reservation.end_date > start_date,
+        Reservation.start_date < end_date
+    )).outerjoin(Guest, Guest.id == Reservation.guest_id).order_by(Room.id, Reservation.start_date)
+
+    days = (end_date - start_date).days
+    rooms = []
+    guests = {}
+    for room_id, room_name, reservation_id, stay_start, stay_end, status, guest_id, name, surname in rows:
+        if not rooms or rooms[-1]['id'] != room_id:
+            rooms.append({'id': room_id, 'room_name': room_name, 'spans': []})
+        if reservation_id is None:
+            continue
+
+        first_night = max((stay_start - start_date).days, 0)
+        last_night = min((stay_end - start_date).days, days)
+        status_index = STATUSES.index(status) if status in STATUSES else 0
+        rooms[-1]['spans'].append([first_night, last_night - first_night, reservation_id, guest_id, status_index])
+        if guest_id is not None:
+            guests[guest_id] = f"{name} {surname}"
+
+    return {
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'days': days,
+        'statuses': STATUSES,
+        'rooms': rooms,
+        'guests': guests
+    }
+
+
+class OccupancyGridCache:
+    """
+    Process-wide LRU cache of the serialized occupancy grids, by window.
+
+    Entries expire after 'ttl' seconds, and are all dropped with clear() when the grid data changes.
+    """
+
+    def __init__(self, max_size=64, ttl=30):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # (start date, end date) -> (expiry time, (JSON, ETag))
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def get(self, window):
+        with self._lock:
+            entry = self._entries.get(window)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(window, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(window)
+            self.hits += 1
+            return entry[1]
+
+    def generation(self):
+        """The current generation: put() ignores the grids built before the latest clear()."""
+        return self._generation
+
+    def put(self, window, grid, generation):
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[window] = (time.monotonic() + self.ttl, grid)
+            self._entries.move_to_end(window)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def stats(self):
+        return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+grid_cache = OccupancyGridCache()
+
+
+def cached_occupancy_grid(start_date, end_date, ttl=None):
+    """
+    The serialized occupancy grid of a window, from the cache or built and cached.
+
+    Returns:
+    tuple: The grid as JSON (str), and its ETag.
+    """
+    if ttl is not None:
+        grid_cache.ttl = ttl
+    window = (start_date, end_date)
+    cached = grid_cache.get(window)
+    if cached is not None:
+        return cached
+
+    generation = grid_cache.generation()
+    body = json.dumps(build_occupancy_grid(start_date, end_date), separators=(',', ':'))
+    cached = (body, hashlib.sha1(body.encode()).hexdigest())
+    grid_cache.put(window, cached, generation)
+    return cached
+
+
+@event.listens_for(Session, 'after_flush')
+def _note_grid_changes(session, flush_context):
+    if any(isinstance(instance, GRID_MODELS) for instance in chain(session.new, session.dirty, session.deleted)):
+        session.info['occupancy_grid_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_grids(session):
+    if session.info.pop('occupancy_grid_changed', False):
+        grid_cache.clear()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_grid_changes(session):
+    session.info.pop('occupancy_grid_changed', None)
@@ -0,0 +1,262 @@
+# pagination.py
+"""
+Keyset pagination and NDJSON streaming for list endpoints.
+
+A list endpoint builds its query and hands it to `list_response`, which reads the request's query parameters:
+- 'limit' and/or 'cursor': return one page, {"items": [...], "next_cursor": "..."}; pass 'next_cursor' back as
+  'cursor' to get the next page (null when there are no more rows).
+- 'format=ndjson': stream every row as one JSON object per line, read from a server-side cursor in batches,
+  so memory use stays flat regardless of the result size ('cursor' can be used to resume a stream).
+- 'order=desc': walk the keys in descending order.
+- none of them: the plain JSON list returned by the endpoints so far.
+
+Pages are addressed by the values of the key columns (e.g. timestamp, id) of the last row, not by offsets,
+so every page costs an index range scan no matter how deep it is.
+
+The list endpoints of a model go through `model_list_response`, which adds on top of them:
+- 'fields=id,start_date': select only these columns.
+- '<column>=value' (comma separated for several values), and '<column>_from' / '<column>_to' (inclusive bounds):
+  filter on the columns the endpoint allows.
+- 'sort=start_date' or 'sort=-start_date' (descending): order by a column the endpoint allows, then by the
+  endpoint's key columns; pagination follows the sort.
+Its rows are selected as columns (with_entities) and serialized like the models' to_dict without loading the
+model instances (see serialization.py), unless the endpoint has its own serializer.
+"""
+
+import base64
+import itertools
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import jsonify, request, Response, stream_with_context
+from sqlalchemy import tuple_
+
+from serialization import RowSerializer, TO_DICT_OVERRIDES, ndjson_line, python_type, serialized_columns
+
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+STREAM_BATCH_SIZE = 1000
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class InvalidListParameter(ValueError):
+    pass
+
+
+def list_response(query, key_columns, serialize, archived=None, descending=None):
+    """
+    Build the response of a list endpoint from its query.
+
+    Args:
+        query (Query): The endpoint's query, filtered but not ordered.
+        key_columns (list): Columns identifying a row in a stable order, unique together (e.g. timestamp, id).
+        serialize (callable): Converts a row of the query to a JSON serializable dict.
+        archived (callable): Optional source of rows kept outside of the query's table, all older (in key order)
+            than the rows of the query. Called with the cursor's key values (or None) and the 'descending' flag,
+            it returns the serialized rows after the cursor, in key order.
+        descending (bool): Walk the keys in descending order. If None, the request's 'order' parameter decides.
+
+    Returns:
+        Flask Response: A JSON list, a page, or an NDJSON stream (see the module documentation).
+    """
+    limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor')
+    stream = request.args.get('format', '').lower() == 'ndjson'
+    if descending is None:
+        descending = request.args.get('order', 'asc').lower() == 'desc'
+
+    query = query.order_by(*[column.desc() if descending else column.asc() for column in key_columns])
+
+    values = None
+    if cursor:
+        try:
+            values = decode_cursor(cursor, key_columns)
+        except InvalidCursor:
+            return jsonify({"error": "Invalid cursor"}), 400
+        key = tuple_(*key_columns)
+        query = query.filter(key < values if descending else key > values)
+
+    if archived is not None:
+        return _list_response_with_archive(query, key_columns, serialize, archived(values, descending),
+                                           limit, cursor, stream, descending)
+
+    if stream:
+        if limit:
+            query = query.limit(limit)
+        return stream_ndjson(query, serialize)
+
+    if limit is None and cursor is None:
+        return jsonify([serialize(row) for row in query]), 200
+
+    limit = min(max(limit or DEFAULT_PAGE_LIMIT, 1), MAX_PAGE_LIMIT)
+    rows = query.limit(limit + 1).all()  # One extra row tells whether there is a next page
+    next_cursor = encode_cursor(rows[limit - 1], key_columns) if len(rows) > limit else None
+
+    return jsonify({'items': [serialize(row) for row in rows[:limit]], 'next_cursor': next_cursor}), 200
+
+
+def model_list_response(model, query=None, serialize=None, key_columns=None, filters=(), sorts=(), columns=None,
+                        default_order='asc'):
+    """
+    Build the response of a list endpoint of a model, with the field selection, filters and sort of the request
+    (see the module documentation) applied to its query.
+
+    Args:
+        model (Model): The listed model.
+        query (Query): The endpoint's query, filtered but not ordered (all the rows of the model by default).
+        serialize (callable): Converts a model instance to a JSON serializable dict. By default, the rows are
+            selected as columns and serialized like the model's to_dict, without loading the instances.
+        key_columns (list): Columns identifying a row in a stable order (the primary key by default).
+        filters (list): Columns the clients can filter on.
+        sorts (list): Non-nullable columns the clients can sort on.
+        columns (list): Columns the clients can select with 'fields' (by default, the columns of the model's
+            to_dict, see serialization.serialized_columns).
+        default_order (str): 'asc' or 'desc', the order without 'order' or 'sort' parameters.
+
+    Returns:
+        Flask Response: A JSON list, a page, or an NDJSON stream, or an error (400) for an invalid parameter.
+    """
+    query = query if query is not None else model.query
+    columns = list(columns or serialized_columns(model))
+    key_columns = list(key_columns or [getattr(model, column.key) for column in model.__mapper__.primary_key])
+    descending = request.args.get('order', default_order).lower() == 'desc'
+
+    try:
+        query = filter_query(query, filters)
+
+        sort = request.args.get('sort')
+        if sort:
+            descending = sort.startswith('-')
+            column = _find_column(sorts, sort.lstrip('-'), 'sort')
+            key_columns = [column] + [key for key in key_columns if key.key != column.key]
+
+        fields = request.args.get('fields')
+        selected = columns if serialize is None else None
+        if fields:
+            selected = [_find_column(columns, name.strip(), 'field') for name in fields.split(',') if name.strip()]
+        if selected is not None:
+            # The key columns follow the selected ones, for the cursors
+            selected_keys = {column.key for column in selected}
+            query = query.with_entities(*selected, *[key for key in key_columns if key.key not in selected_keys])
+            serialize = RowSerializer(selected, TO_DICT_OVERRIDES.get(model.__tablename__))
+    except InvalidListParameter as e:
+        return jsonify({"error": str(e)}), 400
+
+    return list_response(query, key_columns, serialize, descending=descending)
+
+
+def filter_query(query, columns):
+    """
+    Filter a query with the request's '<column>=value', '<column>_from' and '<column>_to' parameters, for the
+    given columns.
+
+    Raises:
+        InvalidListParameter: If a value doesn't match the type of its column.
+    """
+    for column in columns:
+        value = request.args.get(column.key)
+        if value is not None:
+            values = [parse_value(column, item) for item in value.split(',')]
+            query = query.filter(column == values[0] if len(values) == 1 else column.in_(values))
+
+        lower = request.args.get(f'{column.key}_from')
+        if lower is not None:
+            query = query.filter(column >= parse_value(column, lower))
+
+        upper = request.args.get(f'{column.key}_to')
+        if upper is not None:
+            query = query.filter(column <= parse_value(column, upper))
+    return query
+
+
+def parse_value(column, value):
+    """Convert a request parameter to the Python type of a column."""
+    value_type = python_type(column)
+    try:
+        if value_type is datetime:
+            return datetime.fromisoformat(value)
+        if value_type is date:
+            return date.fromisoformat(value)
+        if value_type in (int, float, Decimal):
+            return value_type(value)
+    except (ValueError, ArithmeticError) as e:
+        raise InvalidListParameter(f"Invalid value for {column.key}: {value}") from e
+    return value
+
+
+def _find_column(columns, name, kind):
+    for column in columns:
+        if column.key == name:
+            return column
+    raise InvalidListParameter(f"Unknown {kind}: {name}")
+
+
+def _list_response_with_archive(query, key_columns, serialize, archived_rows, limit, cursor, stream, descending):
+    """list_response over the archived rows followed by the query's rows (the other way around when descending)."""
+    def rows(query):
+        current_rows = (serialize(row) for row in query.yield_per(STREAM_BATCH_SIZE))
+        if descending:
+            return itertools.chain(current_rows, archived_rows)
+        return itertools.chain(archived_rows, current_rows)
+
+    if stream:
+        def generate():
+            for row in itertools.islice(rows(query), limit or None):
+                yield ndjson_line(row)
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    if limit is None and cursor is None:
+        return jsonify(list(rows(query))), 200
+
+    limit = min(max(limit or DEFAULT_PAGE_LIMIT, 1), MAX_PAGE_LIMIT)
+    page = list(itertools.islice(rows(query.limit(limit + 1)), limit + 1))
+    next_cursor = encode_cursor(page[limit - 1], key_columns) if len(page) > limit else None
+
+    return jsonify({'items': page[:limit], 'next_cursor': next_cursor}), 200
+
+
+def stream_ndjson(query, serialize, batch_size=STREAM_BATCH_SIZE):
+    """
+    Stream the rows of a query as newline-delimited JSON.
+
+    The rows are fetched from a server-side cursor, 'batch_size' at a time.
+    """
+    def generate():
+        for row in query.yield_per(batch_size):
+            yield ndjson_line(serialize(row))
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+def encode_cursor(row, key_columns):
+    """Encode the key values of a row (a model instance or a serialized dict) as an opaque cursor string."""
+    values = []
+    for column in key_columns:
+        value = row[column.key] if isinstance(row, dict) else getattr(row, column.key)
+        values.append(value.isoformat() if isinstance(value, (date, datetime)) else value)
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor, key_columns):
+    """Decode a cursor string back to a tuple of key values, typed after the key columns."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != len(key_columns):
+            raise InvalidCursor(cursor)
+
+        decoded = []
+        for column, value in zip(key_columns, values):
+            python_type = column.type.python_type
+            if value is not None and python_type is datetime:
+                value = datetime.fromisoformat(value)
+            elif value is not None and python_type is date:
+                value = date.fromisoformat(value)
+            decoded.append(value)
+        return tuple(decoded)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(cursor) from e
@@ -1,13 +1,22 @@
 import logs
-from datetime import datetime
-
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import get_jwt_identity, jwt_required
-
-from auth import requires_roles
+import availability
+import occupancy_grid
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import click
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required
+from sqlalchemy import case, func, select, literal, Integer, DateTime
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from auth import requires_roles, get_current_user
 from logs import UserActionLog
-from models import db, Reservation, Balance, User, Guest, \
-    ReservationStatusChange  # Import the Reservation model from models.py
+from models import db, Reservation, Balance, Guest, \
+    ReservationStatusChange, ReservationFolio  # Import the Reservation model from models.py
+from pagination import model_list_response
+from serialization import select_dicts
 
 reservations_management_blueprint = Blueprint('reservations_management', __name__)
 
@@ -24,18 +33,25 @@ def add_reservation():  # Tested
 
     :return: JSON response with the newly created reservation.
     """
-    current_user_email = get_jwt_identity()  # Get the user's email from the token
-    user = User.query.filter_by(email=current_user_email).first()
+    user = get_current_user()  # The user's ID and department, from the token
     #user = User.query.get(6)  # TODO: Remove this line (debugging only)
 
     if not user:
         return jsonify({"msg": "User not found"}), 404
 
     data = request.get_json()
+    try:
+        start_date = availability.parse_date(data.get('start_date'))
+        end_date = availability.parse_date(data.get('end_date'))
+    except ValueError:
+        return jsonify({"error": "Invalid dates"}), 400
+    if not start_date or not end_date or start_date >= end_date:
+        return jsonify({"error": "The end date must be after the start date"}), 400
+
     new_reservation = Reservation(
         channel_manager_id=data.get('channel_manager_id'),  # TODO: Implement later
-        start_date=data.get('start_date'),  # Start date of the reservation
-        end_date=data.get('end_date'),  # End date of the reservation
+        start_date=start_date,  # Start date of the reservation
+        end_date=end_date,  # End date of the reservation
         room_id=data.get('room_id'),  # ID of the reserved room
         guest_id=data.get('guest_id'),  # ID of the guest making the reservation
         due_amount=data.get('due_amount')  # Due amount for the reservation
@@ -47,6 +63,11 @@ def add_reservation():  # Tested
         log_reservation(new_reservation, user.id, "Reservation Add")
         add_reservation_status_change_internal(new_reservation.id, 'Pending', user.id)
         return jsonify(new_reservation.to_dict()), 201
+    except IntegrityError as e:
+        db.session.rollback()
+        if availability.is_overlap_error(e):  # Checked by the database within the INSERT
+            return jsonify({"error": "The room is already booked for these dates"}), 409
+        return jsonify({"error": str(e)}), 500
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
@@ -62,12 +83,12 @@ def delete_reservation(reservation_id):  # Tested
     :param reservation_id: The ID of the reservation to delete.
     :return: JSON response with a success or error message.
     """
-    current_user_email = get_jwt_identity()  # Get the user's email from the token
-    user = User.query.filter_by(email=current_user_email).first()
+    user = get_current_user()  # The user's ID and department, from the token
 
     reservation = Reservation.query.get(reservation_id)
     if reservation:
         try:
+            ReservationFolio.query.filter_by(reservation_id=reservation_id).delete()
             db.session.delete(reservation)
             db.session.commit()
             log_reservation(reservation, user.id, "Reservation Delete")
@@ -93,17 +114,24 @@ def modify_reservation(reservation_id):  # Not Used
     :param reservation_id: The ID of the reservation to modify.
     :return: JSON response with a success or error message.
     """
-    current_user_email = get_jwt_identity()  # Get the user's email from the token
-    user = User.query.filter_by(email=current_user_email).first()
+    user = get_current_user()  # The user's ID and department, from the token
 
     reservation = Reservation.query.get(reservation_id)
     if not reservation:
         return jsonify({"msg": "Reservation not found"}), 404
 
     data = request.get_json()
+    try:
+        start_date = availability.parse_date(data.get('start_date', reservation.start_date))
+        end_date = availability.parse_date(data.get('end_date', reservation.end_date))
+    except ValueError:
+        return jsonify({"error": "Invalid dates"}), 400
+    if start_date >= end_date:
+        return jsonify({"error": "The end date must be after the start date"}), 400
+
     reservation.channel_manager_id = data.get('channel_manager_id', reservation.channel_manager_id)
-    reservation.start_date = data.get('start_date', reservation.start_date)
-    reservation.end_date = data.get('end_date', reservation.end_date)
+    reservation.start_date = start_date
+    reservation.end_date = end_date
     reservation.room_id = data.get('room_id', reservation.room_id)
     reservation.guest_id = data.get('guest_id', reservation.guest_id)
     reservation.due_amount = data.get('due_amount', reservation.due_amount)
@@ -112,6 +140,11 @@ def modify_reservation(reservation_id):  # Not Used
         db.session.commit()
         log_reservation(reservation, user.id, "Reservation Modify")
         return jsonify({"msg": "Reservation updated successfully"}), 200
+    except IntegrityError as e:
+        db.session.rollback()
+        if availability.is_overlap_error(e):  # Checked by the database within the UPDATE
+            return jsonify({"error": "The room is already booked for these dates"}), 409
+        return jsonify({"error": str(e)}), 500
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
@@ -127,8 +160,7 @@ def change_reservation_status(reservation_id):  # Tested
     :param reservation_id: The ID of the reservation to modify.
     :return: JSON response with a success or error message.
     """
-    current_user_email = get_jwt_identity()  # Get the user's email from the token
-    user = User.query.filter_by(email=current_user_email).first()
+    user = get_current_user()  # The user's ID and department, from the token
 
     reservation = Reservation.query.get(reservation_id)
     if not reservation:
@@ -185,17 +217,29 @@ def add_reservation_status_change_internal(reservation_id, new_status, user_id):
 @jwt_required()
 @requires_roles('Admin', 'Manager', 'Reception')
 def get_all_reservation_status_changes():  # Tested
-    changes = ReservationStatusChange.query.all()
-    return jsonify([change.to_dict() for change in changes]), 200
+    """
+    Endpoint to list the reservation status changes.
+
+    Accepts the list parameters of pagination.model_list_response: 'limit' / 'cursor', 'fields',
+    'format=ndjson', and filters on reservation_id, status, user_id and timestamp. The list is in ID order
+    (no 'sort': the timestamp column is nullable, which the keyset cursor can't page through).
+
+    :return: JSON response with the status changes.
+    """
+    return model_list_response(
+        ReservationStatusChange,
+        filters=(ReservationStatusChange.reservation_id, ReservationStatusChange.status,
+                 ReservationStatusChange.user_id, ReservationStatusChange.timestamp)
+    )
 
 
 @reservations_management_blueprint.route('/get_reservation_status_changes/<int:reservation_id>', methods=['GET'])
 @jwt_required()
 @requires_roles('Admin', 'Manager', 'Reception')
 def get_reservation_status_change_by_reservation(reservation_id):  # Tested
-    change = ReservationStatusChange.query.filter_by(reservation_id=reservation_id).all()
-    if change:
-        return jsonify([c.to_dict() for c in change]), 200
+    changes = select_dicts(ReservationStatusChange, ReservationStatusChange.reservation_id == reservation_id)
+    if changes:
+        return jsonify(changes), 200
     else:
         return jsonify({"error": "Status change not found"}), 404
 
@@ -225,10 +269,18 @@ def get_reservations():  # TESTED
     """
     Endpoint to get all reservations.
 
+    Accepts the list parameters of pagination.model_list_response: 'limit' / 'cursor', 'fields', 'sort'
+    (start_date, end_date), 'format=ndjson', and filters on room_id, guest_id, status, start_date and end_date
+    (e.g. 'end_date_from=2024-06-01&start_date_to=2024-06-30').
+
     :return: JSON response with a list of all reservations and a success or error message.
     """
-    reservations = Reservation.query.all()
-    return jsonify([reservation.to_dict() for reservation in reservations]), 200
+    return model_list_response(
+        Reservation,
+        filters=(Reservation.room_id, Reservation.guest_id, Reservation.status, Reservation.start_date,
+                 Reservation.end_date),
+        sorts=(Reservation.start_date, Reservation.end_date)
+    )
 
 
 @reservations_management_blueprint.route('/get_guest_reservations/<int:guest_id>', methods=['GET'])
@@ -242,8 +294,7 @@ def get_guest_reservations(guest_id):  # TESTED
     :param guest_id: The ID of the guest to get reservations for.
     :return: JSON response with a list of all reservations for the guest and a success or error message.
     """
-    reservations = Reservation.query.filter_by(guest_id=guest_id)
-    return jsonify([reservation.to_dict() for reservation in reservations]), 200
+    return jsonify(select_dicts(Reservation, Reservation.guest_id == guest_id)), 200
 
 
 # get reservations intersecting with a given date range
@@ -260,8 +311,8 @@ def get_reservations_by_date_range():  # TESTED
 
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
-    reservations = Reservation.query.filter(Reservation.start_date <= end_date, Reservation.end_date >= start_date)
-    return jsonify([reservation.to_dict() for reservation in reservations]), 200
+    reservations = select_dicts(Reservation, Reservation.start_date <= end_date, Reservation.end_date >= start_date)
+    return jsonify(reservations), 200
 
 
 @reservations_management_blueprint.route('/get_reservations_by_room_and_date_range', methods=['GET'])
@@ -282,13 +333,78 @@ def get_reservations_by_room_and_date_range():
     except ValueError:
         return jsonify({"error": "Invalid room_id"}), 400
 
-    reservations = Reservation.query.filter(
+    reservations = select_dicts(
+        Reservation,
         Reservation.start_date <= end_date,
         Reservation.end_date >= start_date,
         Reservation.room_id == room_id
-    ).all()
+    )
 
-    return jsonify([reservation.to_dict() for reservation in reservations]), 200
+    return jsonify(reservations), 200
+
+
+@reservations_management_blueprint.route('/availability', methods=['GET'])
+@jwt_required()
+@requires_roles('Admin', 'Manager', 'Reception')
+def get_availability():
+    """
+    Endpoint to get the rooms free for a stay, for the whole hotel.
+
+    Query parameters: 'start_date' (arrival) and 'end_date' (departure, the room may be booked from that day),
+    and optionally 'min_guests'.
+
+    :return: JSON response with the free rooms.
+    """
+    try:
+        start_date = availability.parse_date(request.args.get('start_date'))
+        end_date = availability.parse_date(request.args.get('end_date'))
+    except ValueError:
+        return jsonify({"error": "Invalid dates"}), 400
+    if not start_date or not end_date or start_date >= end_date:
+        return jsonify({"error": "The end date must be after the start date"}), 400
+
+    rooms = availability.free_rooms(start_date, end_date, request.args.get('min_guests', type=int))
+    return jsonify({
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'rooms': [room.to_dict() for room in rooms]
+    }), 200
+
+
+@reservations_management_blueprint.route('/occupancy_grid', methods=['GET'])
+@jwt_required()
+@requires_roles('Admin', 'Manager', 'Reception', 'Cleaning', 'Bar')
+def get_occupancy_grid():
+    """
+    Endpoint to get the occupancy grid of the calendar: the reservations of every room over a window, as
+    run-length encoded spans (see occupancy_grid.py).
+
+    Query parameters: 'start_date', and 'end_date' or 'days' (30 by default, at most 366).
+    Supports If-None-Match: an unchanged grid is answered with 304 Not Modified.
+
+    :return: JSON response with the grid.
+    """
+    try:
+        start_date = availability.parse_date(request.args.get('start_date'))
+        end_date = availability.parse_date(request.args.get('end_date'))
+    except ValueError:
+        return jsonify({"error": "Invalid dates"}), 400
+    if not start_date:
+        return jsonify({"error": "Missing start_date"}), 400
+    if not end_date:
+        end_date = start_date + timedelta(days=request.args.get('days', 30, type=int))
+    if not 0 < (end_date - start_date).days <= 366:
+        return jsonify({"error": "The window must be 1 to 366 days long"}), 400
+
+    body, etag = occupancy_grid.cached_occupancy_grid(
+        start_date, end_date, current_app.config.get('OCCUPANCY_GRID_CACHE_TTL'))
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 
 # Calculate the unpaid amount for a given reservation (Restaurant only)
@@ -301,28 +417,231 @@ def calculate_unpaid_amount(reservation_id):
     :param reservation_id: The ID of the reservation to calculate the unpaid amount for.
     :return: JSON response with the unpaid amount and a success or error message.
     """
-    balance_entries = Balance.query.filter_by(reservation_id=reservation_id).all()
+    unpaid_amount = calculate_unpaid_amount_internal(reservation_id)
+    return jsonify({'unpaid_amount': str(unpaid_amount)}), 200
 
-    total_charges = sum(entry.amount for entry in balance_entries if entry.menu_item_id > 0)
-    total_payments = sum(entry.amount for entry in balance_entries if entry.menu_item_id in [0, -1])
 
-    unpaid_amount = total_charges + total_payments  # Payments are negative amounts
-    return jsonify({'unpaid_amount': str(unpaid_amount)}), 200
+# Calculate the unpaid amounts for many reservations at once (Restaurant only)
+@reservations_management_blueprint.route('/calculate_unpaid_amounts', methods=['POST'])
+@jwt_required()
+@requires_roles('Admin', 'Manager', 'Reception', 'Bar')
+def calculate_unpaid_amounts():
+    """
+    Endpoint to calculate the unpaid amounts for a list of reservations (Restaurant only)
+
+    Expects a JSON body like {"reservation_ids": [1, 2, 3]}.
+
+    :return: JSON response mapping each reservation ID to its unpaid amount.
+    """
+    reservation_ids = (request.get_json() or {}).get('reservation_ids', [])
+
+    # The totals are keyed by ID: a string ID would miss its folio and answer a wrong zero
+    if not isinstance(reservation_ids, list) or \
+            not all(isinstance(reservation_id, int) and not isinstance(reservation_id, bool)
+                    for reservation_id in reservation_ids):
+        return jsonify({"error": "reservation_ids must be a list of integers"}), 400
+
+    totals = calculate_balance_totals(reservation_ids)
+    return jsonify({str(reservation_id): str(total['unpaid_amount'])
+                    for reservation_id, total in totals.items()}), 200
 
 
 def calculate_unpaid_amount_internal(reservation_id):
     """
-    Endpoint to calculate the unpaid amount for a given reservation (Restaurant only)
+    Function to calculate the unpaid amount for a given reservation (Restaurant only)
     :param reservation_id: The ID of the reservation to calculate the unpaid amount for.
-    :return: JSON response with the unpaid amount and a success or error message.
+    :return: The unpaid amount (Decimal).
+    """
+    return calculate_balance_totals([reservation_id])[reservation_id]['unpaid_amount']
+
+
+def calculate_balance_totals(reservation_ids):
+    """
+    Function to calculate the charges, payments and unpaid amounts of many reservations (Restaurant only)
+
+    The totals are read from the reservation folios (one row per reservation, kept up to date by the balance
+    routes, see update_reservation_folio). Reservations without a folio are aggregated from their balance
+    entries with one GROUP BY query.
+
+    :param reservation_ids: The IDs of the reservations to calculate the totals for.
+    :return: Dictionary mapping each reservation ID to its 'total_charges', 'total_payments' and 'unpaid_amount'.
+             Reservations without balance entries get zero totals.
+    """
+    totals = {}
+    reservation_ids = set(reservation_ids)
+
+    if not reservation_ids:
+        return totals
+
+    folios = ReservationFolio.query.filter(ReservationFolio.reservation_id.in_(reservation_ids))
+    for folio in folios:
+        totals[folio.reservation_id] = {
+            'total_charges': folio.total_charges,
+            'total_payments': folio.total_payments,
+            'unpaid_amount': folio.unpaid_amount
+        }
+
+    missing_ids = reservation_ids - set(totals)
+    if missing_ids:
+        totals.update(aggregate_balance_totals(missing_ids))
+
+    return totals
+
+
+def aggregate_balance_totals(reservation_ids=None):
     """
-    balance_entries = Balance.query.filter_by(reservation_id=reservation_id).all()
+    Function to aggregate the charges, payments and unpaid amounts of reservations from their balance entries.
+
+    The totals are aggregated by the database with one GROUP BY reservation_id query.
+    Charges are entries for menu items (menu_item_id > 0), payments are cash (0) or card (-1) entries
+    and are stored as negative amounts.
+
+    :param reservation_ids: The IDs of the reservations to aggregate, or None for every reservation with entries.
+    :return: Dictionary mapping each reservation ID to its 'total_charges', 'total_payments' and 'unpaid_amount'.
+             Requested reservations without balance entries get zero totals.
+    """
+    totals = {reservation_id: {'total_charges': Decimal('0'),
+                               'total_payments': Decimal('0'),
+                               'unpaid_amount': Decimal('0')}
+              for reservation_id in reservation_ids or []}
+
+    rows = db.session.query(
+        Balance.reservation_id,
+        func.coalesce(func.sum(case((Balance.menu_item_id > 0, Balance.amount), else_=0)), 0),
+        func.coalesce(func.sum(case((Balance.menu_item_id.in_([0, -1]), Balance.amount), else_=0)), 0)
+    )
+    if reservation_ids is not None:
+        if not totals:
+            return totals
+        rows = rows.filter(Balance.reservation_id.in_(list(totals)))
+
+    for reservation_id, total_charges, total_payments in rows.group_by(Balance.reservation_id):
+        total_charges = Decimal(str(total_charges))
+        total_payments = Decimal(str(total_payments))
+        totals[reservation_id] = {
+            'total_charges': total_charges,
+            'total_payments': total_payments,
+            'unpaid_amount': total_charges + total_payments  # Payments are negative amounts
+        }
+
+    return totals
+
+
+def update_reservation_folio(reservation_id, menu_item_id, amount):
+    """
+    Function to apply a balance entry to the folio of its reservation, in the current transaction.
+
+    Call it after the balance change has been flushed, with the entry's amount when it is added and with the
+    opposite amount when it is removed. The change is applied with a single INSERT ... SELECT ... ON CONFLICT DO
+    UPDATE: a missing folio is inserted from the aggregate of the reservation's balance entries (which already
+    include the change), an existing one gets the change added. The folio is then right however it was first
+    created, and concurrent entries of a reservation without a folio can't both insert it.
+
+    :param reservation_id: The ID of the reservation of the balance entry.
+    :param menu_item_id: The menu item of the entry (> 0 for a charge, 0 or -1 for a payment).
+    :param amount: The amount to add to the folio.
+    :return: None
+    """
+    menu_item_id = int(menu_item_id)
+    amount = Decimal(str(amount))
+    charge = amount if menu_item_id > 0 else Decimal('0')
+    payment = amount if menu_item_id in (0, -1) else Decimal('0')
+
+    if not charge and not payment:
+        return
+
+    # The totals of the entries, as in aggregate_balance_totals (one row, zeros without entries)
+    total_charges = func.coalesce(func.sum(case((Balance.menu_item_id > 0, Balance.amount), else_=0)), 0)
+    total_payments = func.coalesce(func.sum(case((Balance.menu_item_id.in_([0, -1]), Balance.amount), else_=0)), 0)
+    aggregate = select(
+        literal(reservation_id, Integer), total_charges, total_payments, total_charges + total_payments,
+        literal(datetime.utcnow(), DateTime)
+    ).where(Balance.reservation_id == reservation_id)
+
+    insert = postgresql.insert if db.engine.dialect.name == 'postgresql' else sqlite.insert
+    statement = insert(ReservationFolio).from_select(
+        ['reservation_id', 'total_charges', 'total_payments', 'unpaid_amount', 'updated_at'], aggregate
+    )
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=[ReservationFolio.reservation_id],
+        set_={'total_charges': ReservationFolio.total_charges + charge,
+              'total_payments': ReservationFolio.total_payments + payment,
+              'unpaid_amount': ReservationFolio.unpaid_amount + charge + payment,
+              'updated_at': statement.excluded.updated_at}
+    ))
+
+
+def rebuild_reservation_folios(verify_only=False):
+    """
+    Function to recompute every reservation folio from the balance entries and report the drift.
+
+    :param verify_only: If True, only report the drift without fixing the folios.
+    :return: List of the drifted folios, each a dict with 'reservation_id', 'stored' and 'actual' totals
+             ('stored' is None for a missing folio).
+    """
+    actual_totals = aggregate_balance_totals()
+    folios = {folio.reservation_id: folio for folio in ReservationFolio.query.all()}
+    zero = {'total_charges': Decimal('0'), 'total_payments': Decimal('0'), 'unpaid_amount': Decimal('0')}
+
+    drift = []
+    for reservation_id in sorted(set(actual_totals) | set(folios)):
+        actual = actual_totals.get(reservation_id, zero)
+        folio = folios.get(reservation_id)
+        stored = {key: getattr(folio, key) for key in zero} if folio else None
+
+        if stored == actual or (stored is None and actual == zero):
+            continue
+
+        drift.append({
+            'reservation_id': reservation_id,
+            'stored': {key: str(value) for key, value in stored.items()} if stored else None,
+            'actual': {key: str(value) for key, value in actual.items()}
+        })
+
+        if not verify_only:
+            if folio:
+                for key, value in actual.items():
+                    setattr(folio, key, value)
+            else:
+                db.session.add(ReservationFolio(reservation_id=reservation_id, **actual))
+
+    if verify_only:
+        db.session.rollback()
+    else:
+        db.session.commit()
+
+    return drift
+
+
+@reservations_management_blueprint.route('/rebuild_folios', methods=['POST'])
+@jwt_required()
+@requires_roles('Admin')
+def rebuild_folios():
+    """
+    Endpoint to recompute the reservation folios from the balance entries.
+
+    Pass '?verify_only=true' to only report the drift.
+
+    :return: JSON response with the number of drifted folios and their stored and actual totals.
+    """
+    verify_only = request.args.get('verify_only', 'false').lower() in ('1', 'true', 'yes')
+
+    try:
+        drift = rebuild_reservation_folios(verify_only)
+        return jsonify({'drifted': len(drift), 'fixed': not verify_only, 'folios': drift}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
 
-    total_charges = sum(entry.amount for entry in balance_entries if entry.menu_item_id > 0)
-    total_payments = sum(entry.amount for entry in balance_entries if entry.menu_item_id in [0, -1])
 
-    unpaid_amount = total_charges + total_payments  # Payments are negative amounts
-    return unpaid_amount
+@reservations_management_blueprint.cli.command('rebuild-folios')
+@click.option('--verify-only', is_flag=True, help='Only report the drift, do not fix the folios.')
+def rebuild_folios_command(verify_only):
+    """Recompute the reservation folios from the balance entries and report the drift."""
+    drift = rebuild_reservation_folios(verify_only)
+    for folio in drift:
+        click.echo(f"Reservation {folio['reservation_id']}: stored {folio['stored']} | actual {folio['actual']}")
+    click.echo(f"{len(drift)} drifted folio(s)" + ("" if verify_only else " fixed"))
 
 
 def log_reservation(reservation, user_id, action):
@@ -334,12 +653,16 @@ def log_reservation(reservation, user_id, action):
     :param action: The action to log.
     :return: None
     """
-    guest = Guest.query.get(reservation.guest_id)
+    guest = db.session.get(Guest, reservation.guest_id)  # Usually loaded already, by the route
     details = f"Reservation Id: {reservation.id}" \
               f" | Room: {reservation.room_id}" \
-              f" | Guest: {guest.name} {guest.surname}" \
+              f" | Guest: {f'{guest.name} {guest.surname}' if guest else reservation.guest_id}" \
               f" | From: {reservation.start_date}" \
               f" | To: {reservation.end_date}" \
               f" | Status: {reservation.status}" \
               f" | Due Amount: {reservation.due_amount}"
-    logs.log_action(user_id, action, details)
+    logs.log_action(user_id, action, details,
+                    entity_type='reservation', entity_id=reservation.id, reservation_id=reservation.id,
+                    room_id=reservation.room_id, guest_id=reservation.guest_id,
+                    payload={'start_date': reservation.start_date, 'end_date': reservation.end_date,
+                             'status': reservation.status, 'due_amount': reservation.due_amount})
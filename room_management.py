@@ -5,6 +5,7 @@ from flask_jwt_extended import jwt_required
 
 from auth import requires_roles
 from models import db, Room, RoomCleaningStatus  # Import the necessary models
+from pagination import model_list_response
 
 room_management_blueprint = Blueprint('room_management', __name__)
 
@@ -48,8 +49,8 @@ def create_room():
 @jwt_required()
 @requires_roles('Admin', 'Manager', 'Bar', 'Reception', 'Cleaning')
 def get_rooms():  # TESTED: OK
-    rooms = Room.query.all()
-    return jsonify([room.to_dict() for room in rooms]), 200
+    # Paginated, projected and filtered on request; see pagination.model_list_response
+    return model_list_response(Room, filters=(Room.max_guests, Room.number_of_beds))
 
 
 @room_management_blueprint.route('/get_room/<int:room_id>', methods=['GET'])
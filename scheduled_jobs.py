@@ -0,0 +1,458 @@
+# scheduled_jobs.py
+"""
+Background jobs of the application (notifications, cleaning schedule, audit log archiving), run by APScheduler.
+
+The scheduler is opt-in: it runs in a process started with `flask run-scheduler`, or in the web processes
+themselves when PMS_RUN_SCHEDULER is set. Either way, only one process runs the jobs: the leader elected by
+SchedulerLeadership. The others stand by and take over if the leader goes away.
+Every run is recorded in the job_runs table (JobRun).
+"""
+
+import os
+import socket
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+
+import click
+from apscheduler.schedulers.base import STATE_PAUSED
+from flask import current_app
+from flask.cli import with_appcontext
+from flask_apscheduler import APScheduler
+from sqlalchemy import text
+
+import log_archive
+from cleaning_management import schedule_cleaning_internal
+from instrumentation import count_queries
+from models import db, Reservation, Guest, Room, CleaningSchedule, CleaningAction, JobRun
+import notifications_management
+from notifications_management import upsert_notifications
+from reservations_management import calculate_balance_totals
+
+scheduler = APScheduler()
+
+# Advisory lock key of the scheduler leadership on Postgres ('PMS' + 'SCHD')
+DEFAULT_LOCK_KEY = 0x504D53_53434844
+
+# Leadership of this process (see SchedulerLeadership), once start_scheduler was called
+leadership = None
+
+# Lifetime of the arrival and departure notifications: they run every 30 minutes, and their notifications outlive
+# the next run by a margin, so that it refreshes them (see upsert_notifications) before the sweeper deletes them
+NOTIFICATION_LIFETIME = timedelta(minutes=35)
+
+
+def recorded_job(job_id):
+    """
+    Record each run of the decorated job in the job_runs table: start, duration, rows affected (the job's return
+    value) and outcome. A failing job is recorded with its error instead of propagating it to APScheduler.
+    """
+    def decorator(job):
+        @wraps(job)
+        def wrapper():
+            started_at = datetime.now()
+            started = time.perf_counter()
+            rows_affected, status, error = None, 'success', None
+            try:
+                rows_affected = job()
+            except Exception as e:
+                status, error = 'failed', f"{type(e).__name__}: {e}"
+                print(f"Job {job_id} failed:", error)
+            duration_ms = int((time.perf_counter() - started) * 1000)
+
+            with scheduler.app.app_context():
+                try:
+                    db.session.add(JobRun(
+                        job_id=job_id, started_at=started_at, finished_at=datetime.now(), duration_ms=duration_ms,
+                        rows_affected=rows_affected, status=status, error=error,
+                        host=socket.gethostname(), pid=os.getpid()
+                    ))
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Could not record the run of job {job_id}:", e)
+            return rows_affected
+
+        return wrapper
+
+    return decorator
+
+
+@recorded_job('delete_expired')
+def delete_expired_notifications():  # Tested-
+    print("Deleting expired notifications...")
+    with scheduler.app.app_context():
+        return notifications_management.delete_expired_notifications()
+
+
+@recorded_job('check_departures')
+def check_departures_create_notifications():  # Tested
+    print("Checking for Departures...")
+    with scheduler.app.app_context():
+        now = datetime.now()
+        expiry_date = now + NOTIFICATION_LIFETIME
+
+        # Upcoming departures with their room and guest, in one query
+        departures = db.session.query(
+            Reservation.id, Reservation.end_date, Room.room_name, Guest.name, Guest.surname
+        ).join(Room, Room.id == Reservation.room_id).join(Guest, Guest.id == Reservation.guest_id).filter(
+            Reservation.end_date >= now,
+            Reservation.end_date <= now + timedelta(hours=24),
+            db.or_(Reservation.status.is_(None), Reservation.status != 'Checked-out')
+        ).all()
+
+        # Unpaid amounts of all departing reservations, in one query
+        balance_totals = calculate_balance_totals([reservation_id for reservation_id, _, _, _, _ in departures])
+
+        notifications = []
+        for reservation_id, end_date, room_name, guest_name, guest_surname in departures:
+            unpaid_amount = balance_totals[reservation_id]['unpaid_amount']
+            if unpaid_amount <= 0:
+                notifications.append({
+                    'title': "Expected Departure",
+                    'message': f"Room: {room_name} | Guest: {guest_name} {guest_surname}",
+                    'departments': ['Admin', 'Managers', 'Receptionists', 'Cleaning'],
+                    'priority': 3,
+                    'expiry_date': expiry_date,
+                    'kind': 'departure',
+                    'reservation_id': reservation_id,
+                    'window_start': notification_window(end_date)
+                })
+            else:
+                notifications.append({
+                    'title': "UNPAID DEPARTURE",
+                    'message': f"Room: {room_name} | Guest: {guest_name} {guest_surname} | Due: {unpaid_amount}€",
+                    'departments': ['Admin', 'Managers', 'Receptionists', 'Bar'],
+                    'priority': -1,
+                    'expiry_date': expiry_date,
+                    'kind': 'unpaid_departure',
+                    'reservation_id': reservation_id,
+                    'window_start': notification_window(end_date)
+                })
+
+        # Created, or refreshed if notified by a previous run (SYSTEM user)
+        created, refreshed = upsert_notifications(notifications, manager_id=0)
+        print(f"Departures check: {len(departures)} departures, {created} notifications created, "
+              f"{refreshed} refreshed")
+        return created + refreshed
+
+
+@recorded_job('check_arrivals')
+def check_arrivals_create_notifications():
+    print("Checking for Arrivals...")
+    with scheduler.app.app_context():
+        with count_queries(db.engine) as stats:
+            now = datetime.now()
+            expiry_date = now + NOTIFICATION_LIFETIME
+
+            # Upcoming arrivals with their room and guest, in one query
+            arrivals = db.session.query(
+                Reservation.id, Reservation.start_date, Reservation.room_id, Room.room_name, Guest.name, Guest.surname
+            ).join(Room, Room.id == Reservation.room_id).join(Guest, Guest.id == Reservation.guest_id).filter(
+                Reservation.start_date >= now,
+                Reservation.start_date <= now + timedelta(hours=24)
+            ).all()
+
+            # Today's pending cleaning tasks of these rooms, with their action names, in one query
+            pending_actions = {}
+            if arrivals:
+                pending_cleaning = db.session.query(CleaningSchedule.room_id, CleaningAction.action_name).join(
+                    CleaningAction, CleaningAction.id == CleaningSchedule.action_id
+                ).filter(
+                    CleaningSchedule.room_id.in_({arrival.room_id for arrival in arrivals}),
+                    CleaningSchedule.scheduled_date == now.date(),
+                    CleaningSchedule.status == 'pending'
+                ).order_by(CleaningSchedule.room_id, CleaningSchedule.id)
+                for room_id, action_name in pending_cleaning:
+                    pending_actions.setdefault(room_id, []).append(action_name)
+
+            notifications = []
+            for reservation_id, start_date, room_id, room_name, guest_name, guest_surname in arrivals:
+                # Create arrival notifications
+                notifications.append({
+                    'title': "ARRIVAL",
+                    'message': f"Expected Arrival - Room: {room_name} | Guest: {guest_name} {guest_surname}",
+                    'departments': ['Admin', 'Managers', 'Receptionists'],
+                    'priority': 2,
+                    'expiry_date': expiry_date,
+                    'kind': 'arrival',
+                    'reservation_id': reservation_id,
+                    'window_start': notification_window(start_date)
+                })
+
+                # Create cleaning reminder notifications if there are pending cleaning tasks
+                if room_id in pending_actions:
+                    notifications.append({
+                        'title': "REQUIRED PRE-ARRIVAL CLEANING",
+                        'message': f"Room: {room_name} | Pending Actions: {', '.join(pending_actions[room_id])}",
+                        'departments': ['Admin', 'Managers', 'Cleaning'],
+                        'priority': 1,
+                        'expiry_date': expiry_date,
+                        'kind': 'pre_arrival_cleaning',
+                        'reservation_id': reservation_id,
+                        'window_start': notification_window(now.date())  # The pending tasks are today's
+                    })
+
+            # Created, or refreshed if notified by a previous run, in a single transaction (SYSTEM user)
+            created, refreshed = upsert_notifications(notifications, manager_id=0)
+
+        print(f"Arrivals check: {len(arrivals)} arrivals, {created} notifications created, {refreshed} refreshed, "
+              f"{stats.queries} queries, {stats.elapsed * 1000:.1f} ms")
+        return created + refreshed
+
+
+def notification_window(day):
+    """The window_start of the notifications about the events of a day (see AppNotification)."""
+    return datetime.combine(day, datetime.min.time())
+
+
+# Schedule cleaning for today, every 24h
+@recorded_job('schedule_cleaning')
+def schedule_cleaning_for_today():  # Tested
+    with scheduler.app.app_context():
+        print("Scheduling cleaning for today...")
+        return schedule_cleaning_internal()
+
+
+# Move the audit log entries older than the retention period to the archive files
+@recorded_job('archive_audit_log')
+def archive_audit_log():
+    with scheduler.app.app_context():
+        print("Archiving old audit log entries...")
+        archived = log_archive.archive_old_logs()
+        print(f"Audit log archive: {archived} entries archived")
+        return archived
+
+
+def register_jobs():
+    # Delete expired notifications every minute
+    scheduler.add_job(  # TESTED
+        id='delete_expired',
+        func=delete_expired_notifications,
+        trigger='cron',
+        second='0'
+    )
+
+    # Check for upcoming departures for the next 24 hours every 30 minutes (see NOTIFICATION_LIFETIME)
+    scheduler.add_job(  # TESTED
+        id='check_departures',
+        func=check_departures_create_notifications,
+        trigger='cron',
+        minute='0, 30'
+    )
+
+    # Check for upcoming arrivals for the next 24 hours every 30 minutes (see NOTIFICATION_LIFETIME)
+    scheduler.add_job(  # TESTED
+        id='check_arrivals',
+        func=check_arrivals_create_notifications,
+        trigger='cron',
+        minute='0, 30'
+    )
+
+    # Schedule cleaning for today, every 24h at 3:00 AM
+    scheduler.add_job(
+        id='schedule_cleaning',
+        func=schedule_cleaning_for_today,
+        trigger='cron',
+        hour='3',
+        minute='0',
+    )
+
+    # Archive the old audit log entries, every 24h at 4:00 AM
+    scheduler.add_job(
+        id='archive_audit_log',
+        func=archive_audit_log,
+        trigger='cron',
+        hour='4',
+        minute='0',
+    )
+
+
+class SchedulerLeadership:
+    """
+    Election of the one process running the scheduled jobs.
+
+    On Postgres, the leader holds a session-level advisory lock (SCHEDULER_LOCK_KEY) on a dedicated connection:
+    the lock is shared by every host using the database, and released by the server when the leader dies.
+    Otherwise (single host, SQLite), the leader holds an exclusive lock on SCHEDULER_LOCK_FILE.
+
+    A monitor thread checks every SCHEDULER_LEADER_CHECK_SECONDS that the leader still holds the lock (pausing
+    the jobs if it was lost), and lets the standby processes try to take over.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.lock_key = app.config.get('SCHEDULER_LOCK_KEY', DEFAULT_LOCK_KEY)
+        self.lock_file = app.config.get('SCHEDULER_LOCK_FILE',
+                                        os.path.join(tempfile.gettempdir(), 'pms_scheduler.lock'))
+        self.check_interval = app.config.get('SCHEDULER_LEADER_CHECK_SECONDS', 30)
+        self.is_leader = False
+        self._connection = None  # Postgres connection holding the advisory lock
+        self._lock_handle = None  # Open lock file
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def uses_advisory_lock(self):
+        with self.app.app_context():
+            return db.engine.dialect.name == 'postgresql'
+
+    def try_acquire(self):
+        """Try to take the leadership, without waiting. Returns True if this process is the leader."""
+        if self.is_leader:
+            return True
+        if self.uses_advisory_lock():
+            self.is_leader = self._try_advisory_lock()
+        else:
+            self.is_leader = self._try_file_lock()
+        return self.is_leader
+
+    def still_held(self):
+        """Check that the leadership was not lost (e.g. the connection holding the advisory lock dropped)."""
+        if not self.is_leader or self._connection is None:
+            return self.is_leader
+        try:
+            self._connection.execute(text('SELECT 1'))
+            return True
+        except Exception as e:
+            print("Scheduler leadership lost:", e)
+            self.release()
+            return False
+
+    def release(self):
+        self.is_leader = False
+        if self._connection is not None:
+            try:
+                # close() only returns the connection to the pool, whose session would keep the lock
+                self._connection.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': self.lock_key})
+            except Exception:
+                pass
+            try:
+                # Discard the DBAPI connection rather than pooling it: ends the session even if the unlock failed
+                self._connection.invalidate()
+                self._connection.close()
+            except Exception:
+                pass
+            self._connection = None
+        if self._lock_handle is not None:
+            self._lock_handle.close()
+            self._lock_handle = None
+
+    def start(self, on_elected, on_lost):
+        """Monitor the leadership in a background thread, calling on_elected / on_lost on each change."""
+        def run():
+            while not self._stopping.wait(self.check_interval):
+                if self.is_leader and not self.still_held():
+                    on_lost()
+                elif not self.is_leader and self.try_acquire():
+                    on_elected()
+
+        self._thread = threading.Thread(target=run, name='scheduler-leadership', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        self.release()
+
+    def _try_advisory_lock(self):
+        with self.app.app_context():
+            connection = db.engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+        try:
+            acquired = connection.execute(text('SELECT pg_try_advisory_lock(:key)'), {'key': self.lock_key}).scalar()
+        except Exception as e:
+            print("Could not try the scheduler lock:", e)
+            acquired = False
+        if acquired:
+            self._connection = connection
+        else:
+            connection.close()
+        return bool(acquired)
+
+    def _try_file_lock(self):
+        try:
+            import fcntl
+        except ImportError:  # Not on POSIX: no lock, a single process is expected to run the scheduler
+            return True
+
+        handle = open(self.lock_file, 'a')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self._lock_handle = handle  # Held until released or the process exits
+        return True
+
+
+def start_scheduler(app):
+    """
+    Run the background jobs in this process if it is elected leader, or stand by to take over from the leader.
+
+    Returns:
+        bool: True if this process is the leader.
+    """
+    global leadership
+
+    if leadership is not None:
+        return leadership.is_leader
+
+    scheduler.init_app(app)
+    register_jobs()
+
+    def on_elected():
+        if scheduler.state == STATE_PAUSED:
+            scheduler.resume()
+        else:
+            scheduler.start()
+        print(f"Scheduler started (leader: {socket.gethostname()} pid {os.getpid()})")
+
+    def on_lost():
+        scheduler.pause()
+        print("Scheduler paused, leadership lost")
+
+    leadership = SchedulerLeadership(app)
+    if leadership.try_acquire():
+        on_elected()
+    else:
+        print("Scheduler standing by, another process is the leader")
+    leadership.start(on_elected, on_lost)
+    return leadership.is_leader
+
+
+def stop_scheduler():
+    """Stop the jobs (if leader) and give up the leadership."""
+    global leadership
+
+    if leadership is None:
+        return
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+    leadership.stop()
+    leadership = None
+
+
+@click.command('run-scheduler')
+@with_appcontext
+def run_scheduler_command():
+    """Run the background jobs in this process (as leader, or standing by), until interrupted."""
+    start_scheduler(current_app._get_current_object())
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        stop_scheduler()
+
+
+@click.command('job-runs')
+@with_appcontext
+@click.option('--job', 'job_id', default=None, help='Only the runs of this job')
+@click.option('--limit', default=20, help='Number of runs to show')
+def job_runs_command(job_id, limit):
+    """Show the last recorded runs of the scheduled jobs."""
+    query = JobRun.query
+    if job_id:
+        query = query.filter_by(job_id=job_id)
+    for run in query.order_by(JobRun.started_at.desc()).limit(limit):
+        click.echo(f"{run.started_at:%Y-%m-%d %H:%M:%S} | {run.job_id} | {run.status} | {run.duration_ms} ms | "
+                   f"rows: {run.rows_affected} | {run.host} pid {run.pid}" + (f" | {run.error}" if run.error else ""))
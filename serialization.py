@@ -0,0 +1,196 @@
+# serialization.py
+"""
+Serialization of the read endpoints without ORM hydration.
+
+The read paths select the columns of a model (Core select(), or Query.with_entities) and serialize the row
+tuples with a serializer compiled once per model and set of columns (RowSerializer): each dict is built with
+zip(), then only the columns that need it are converted, with a converter chosen from the column type when the
+serializer is compiled (dates and datetimes to ISO strings, decimals to strings). The dicts are the same as the
+ones of the models' to_dict methods, whose few deviations from these conversions are listed in TO_DICT_OVERRIDES.
+
+The responses are encoded with orjson when it is installed (see init_json_provider), otherwise with the
+standard json module of Flask's default provider.
+"""
+
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import select
+
+from models import db
+
+try:
+    import orjson
+except ImportError:  # Optional: the standard json module is used without it
+    orjson = None
+
+# Conversions of the to_dict methods that differ from the ones by column type, by table and column
+TO_DICT_OVERRIDES = {
+    'reservations': {'due_amount': str, 'user_id': str},
+}
+
+# Columns the to_dict methods leave out, by table
+EXCLUDED_COLUMNS = {
+    'users': {'password_hash'},
+}
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+def _decimal_string(value):
+    return str(value) if value is not None else None
+
+
+def python_type(column):
+    """The Python type of a column's values, or None if its type doesn't tell."""
+    try:
+        return column.type.python_type
+    except NotImplementedError:
+        return None
+
+
+def column_converter(column, overrides=None):
+    """
+    The converter of a column's values to JSON serializable values, or None if they need none.
+
+    Args:
+        column: The column (or model attribute).
+        overrides (dict): Converters by column key, used in place of the one of the column type.
+    """
+    if overrides and column.key in overrides:
+        return overrides[column.key]
+    value_type = python_type(column)
+    if value_type in (date, datetime):
+        return _isoformat
+    if value_type is Decimal:
+        return _decimal_string
+    return None
+
+
+class RowSerializer:
+    """
+    Serializer of the rows selected from a list of columns, to dicts keyed by the column keys.
+
+    The rows are tuples (or Row objects) whose first values are the ones of the columns, in order; the values
+    after them (e.g. pagination keys) are ignored.
+    """
+
+    def __init__(self, columns, overrides=None):
+        self.columns = tuple(columns)
+        self.keys = tuple(column.key for column in self.columns)
+        self.converters = tuple((column.key, converter) for column in self.columns
+                                for converter in [column_converter(column, overrides)] if converter is not None)
+
+    def __call__(self, row):
+        data = dict(zip(self.keys, row))
+        for key, convert in self.converters:
+            data[key] = convert(data[key])
+        return data
+
+    def serialize_rows(self, rows):
+        """Serialize an iterable of rows to a list of dicts."""
+        keys = self.keys
+        converters = self.converters
+        serialized = []
+        for row in rows:
+            data = dict(zip(keys, row))
+            for key, convert in converters:
+                data[key] = convert(data[key])
+            serialized.append(data)
+        return serialized
+
+
+def serialized_columns(model):
+    """The columns of a model that its to_dict serializes, as model attributes."""
+    excluded = EXCLUDED_COLUMNS.get(model.__tablename__, ())
+    return [getattr(model, column.key) for column in model.__table__.columns if column.key not in excluded]
+
+
+@lru_cache(maxsize=None)
+def _model_serializer(model, fields):
+    columns = serialized_columns(model)
+    if fields is not None:
+        by_key = {column.key: column for column in columns}
+        columns = [by_key[field] for field in fields]
+    return RowSerializer(columns, TO_DICT_OVERRIDES.get(model.__tablename__))
+
+
+def model_serializer(model, fields=None):
+    """
+    The compiled serializer of a model's rows, like its to_dict.
+
+    Args:
+        model (Model): The model.
+        fields (list): Keys of the serialized columns, in order. Defaults to every column of the to_dict.
+
+    Raises:
+        KeyError: If a field isn't a serialized column of the model.
+    """
+    return _model_serializer(model, tuple(fields) if fields is not None else None)
+
+
+def select_dicts(model, *criteria, order_by=(), fields=None):
+    """
+    Select the rows of a model matching the criteria with a Core SELECT of its columns, and serialize them
+    like its to_dict, without loading the model instances.
+
+    Args:
+        model (Model): The model.
+        *criteria: WHERE clauses.
+        order_by (tuple): ORDER BY clauses.
+        fields (list): Keys of the columns to select (see model_serializer).
+
+    Returns:
+        list: The serialized rows.
+    """
+    serializer = model_serializer(model, fields)
+    statement = select(*serializer.columns).where(*criteria).order_by(*order_by)
+    return serializer.serialize_rows(db.session.execute(statement))
+
+
+def ndjson_line(data):
+    """One line of an NDJSON stream, as bytes (values JSON can't encode are written as strings)."""
+    if orjson is not None:
+        return orjson.dumps(data, default=str, option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_NON_STR_KEYS)
+    return (json.dumps(data, default=str) + '\n').encode()
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider encoding with orjson.
+
+    The values orjson doesn't encode natively (decimals), or differently from Flask (dates, as HTTP dates, and
+    dataclasses), go through the default provider's conversions, so the responses are the same apart from the
+    non-ASCII characters, written as UTF-8 rather than escaped.
+    """
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=kwargs.get('default', self.default), option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+def init_json_provider(app):
+    """
+    Install the orjson provider as the application's JSON provider, if orjson is installed.
+
+    Configuration (app.config):
+        JSON_PROVIDER (str): 'orjson' or 'stdlib' (Flask's default provider). Defaults to 'orjson'.
+    """
+    if app.config.get('JSON_PROVIDER', 'orjson') != 'orjson':
+        return
+    if orjson is None:
+        print("orjson is not installed, using the standard JSON provider")
+        return
+    app.json = OrjsonProvider(app)
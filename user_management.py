@@ -6,6 +6,7 @@ from sqlalchemy.exc import SQLAlchemyError
 import auth
 import logs
 from models import db, User, Department  # Import the necessary models
+from pagination import model_list_response
 
 user_management_blueprint = Blueprint('users', __name__)
 
@@ -36,8 +37,7 @@ def create_user_logic(data):
         Tuple containing a JSON response message and status code.
 
     """
-    current_user_email = get_jwt_identity()  # Get the user's email from the token
-    user_who_created = User.query.filter_by(email=current_user_email).first()
+    user_who_created = auth.get_current_user()  # The user's ID and department, from the token
 
     name = data.get('name')
     surname = data.get('surname')
@@ -94,8 +94,7 @@ def modify_user(user_id):  # Tested
           'email', and 'department'. If these fields are not provided in the JSON data, the
           existing user data will be used for those fields.
     """
-    current_user_email = get_jwt_identity()  # Get the user's email from the token
-    user_who_changed = User.query.filter_by(email=current_user_email).first()
+    user_who_changed = auth.get_current_user()  # The user's ID and department, from the token
 
     user = User.query.get(user_id)
 
@@ -123,6 +122,7 @@ def modify_user(user_id):  # Tested
     if department and not Department.query.filter_by(department_name=department).first():
         return jsonify({"msg": "Invalid department"}), 400
 
+    previous_email = user.email
     user.name = name
     user.surname = surname
     user.phone = phone
@@ -131,6 +131,7 @@ def modify_user(user_id):  # Tested
 
     try:
         db.session.commit()
+        auth.invalidate_user_identity(previous_email, user.email)
         log_user(user, user_who_changed.id, "Modify User")
         return jsonify({"msg": "User updated successfully"}), 200
     except Exception as e:
@@ -182,6 +183,7 @@ def change_password():
 
     try:
         db.session.commit()
+        auth.invalidate_user_identity(user.email)
         log_user(user, user.id, "Change UserPassword")
         return jsonify({"msg": "Password updated successfully"}), 200
     except SQLAlchemyError as e:
@@ -241,6 +243,7 @@ def change_password_manager(user_id):  # Tested
 
     try:
         db.session.commit()
+        auth.invalidate_user_identity(user.email)
         log_user(user, user_id, "Change UserPassword by Manager")
         return jsonify({"msg": "Password updated successfully"}), 200
     except SQLAlchemyError as e:
@@ -266,8 +269,7 @@ def change_department(user_id):  # TESTED: OK
           It checks if the 'department' exists in the database and then updates
           the user's department.
     """
-    current_user_email = get_jwt_identity()  # Get the user's email from the token
-    manager = User.query.filter_by(email=current_user_email).first()
+    manager = auth.get_current_user()  # The user's ID and department, from the token
 
     user = User.query.get(user_id)
     if not user:
@@ -284,6 +286,7 @@ def change_department(user_id):  # TESTED: OK
 
     try:
         db.session.commit()
+        auth.invalidate_user_identity(user.email)
         log_user(user, manager.id, "Change UserDepartment")
         return jsonify({"msg": "Department updated successfully"}), 200
     except SQLAlchemyError as e:
@@ -347,23 +350,20 @@ def get_user_by_email_logic(email):
     return user
 
 
-# Function to get all users using separate function get_users_logic
+# Function to get all users, through the shared list layer (pagination.model_list_response)
 @user_management_blueprint.route('/get_users', methods=['GET'])
 @jwt_required()
 def get_users():
     """
-    Get a list of all departments.
+    Get a list of all users.
+
+    Accepts the list parameters of pagination.model_list_response: 'limit' / 'cursor', 'fields', 'sort'
+    (surname, name), 'format=ndjson', and a filter on department.
 
     Returns:
-        JSON response with a list of departments and status code.
+        JSON response with a list of users and status code.
     """
-    users = get_users_logic()
-    return jsonify([user.to_dict() for user in users]), 200
-
-
-def get_users_logic():
-    users = User.query.all()
-    return users
+    return model_list_response(User, filters=(User.department,), sorts=(User.surname, User.name))
 
 
 # Function to get all users by department using separate function get_users_by_department_logic
@@ -430,4 +430,5 @@ def log_user(user, user_id, action):
               f"Email: {user.email} | " \
               f"Department: {user.department}"
 
-    logs.log_action(user_id, action, details)
+    logs.log_action(user_id, action, details, entity_type='user', entity_id=user.id,
+                    payload={'department': user.department})